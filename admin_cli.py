@@ -0,0 +1,466 @@
+# admin_cli.py – Headless batch jobs over the app databases (no Streamlit import)
+# Usage: python admin_cli.py [--users-db users.db] [--words-db words.db] <command> [options]
+import argparse
+import csv
+import datetime as dt
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from core import (ARCHIVE_DIR, BACKUP_DIR, DB_U, DB_W, EXPORT_DIR, IST, QUIZ_LOG_ARCHIVE, QUIZ_LOG_HOT_DAYS,
+                  TRACE_FILE, BackupManager, HistoryExporter, MaintenanceScheduler, QuizLogTiering,
+                  StreakRepair, create_managers)
+from tracing import flame_summary, read_spans
+from workload import read_calls, replay
+
+
+class Progress:
+    """Throttled single-line progress report on stderr"""
+    def __init__(self, label: str, total: Optional[int] = None, interval: float = 1.0):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, done: int, note: str = "", force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        elapsed = now - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        of_total = f"/{self.total:,}" if self.total else ""
+        sys.stderr.write(f"\r{self.label}: {done:,}{of_total} ({rate:,.0f}/s) {note}".rstrip() + " ")
+        sys.stderr.flush()
+
+    def finish(self, done: int, note: str = ""):
+        self.update(done, note, force=True)
+        sys.stderr.write("\n")
+
+
+@contextmanager
+def timed(label: str):
+    started = time.perf_counter()
+    print(f"{label} ...")
+    yield
+    print(f"{label} done in {time.perf_counter() - started:.2f}s")
+
+
+def percentiles(samples: List[float]) -> str:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return (f"mean {sum(ordered) / len(ordered) * 1000:.2f}ms, p50 {pick(0.50):.2f}ms, "
+            f"p95 {pick(0.95):.2f}ms, max {ordered[-1] * 1000:.2f}ms")
+
+
+def read_word_rows(path: pathlib.Path) -> Iterator[Dict]:
+    """CSV with a header (word, definition, pronunciation, etymology, example1, example2) or one word per line"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield {'word': line.strip()}
+
+
+def cmd_import_words(managers: Dict, args):
+    progress = Progress("import")
+    seen = 0
+
+    def report(rows_read: int, inserted: int):
+        nonlocal seen
+        seen = rows_read
+        progress.update(rows_read, f"{inserted:,} new")
+
+    with timed(f"Importing words from {args.file}"):
+        inserted = managers['word'].import_words(read_word_rows(args.file), added_by=args.added_by,
+                                                 batch_size=args.batch_size, progress=report)
+        progress.finish(seen, f"{inserted:,} new")
+    if inserted and not args.skip_neighbors:
+        cmd_neighbors(managers, args)
+
+
+def cmd_rebuild(managers: Dict, args):
+    targets = ["daily-stats", "word-stats", "challenges", "percentiles"] if args.target == "all" else [args.target]
+    if "daily-stats" in targets:
+        with timed("Rebuilding daily_user_stats from quiz_log"):
+            print(f"{managers['analytics'].rebuild_daily_stats():,} rows")
+    if "word-stats" in targets:
+        with timed("Recomputing word_stats from answer events"):
+            try:
+                print(f"{managers['word_stats'].recompute(args.archive_dir):,} words")
+            except Exception as e:
+                sys.exit(f"Recomputing word_stats failed: {e}")
+    if "challenges" in targets:
+        gamification = managers['gamification']
+        with timed(f"Pre-generating challenges and re-evaluating the last {args.days} days"):
+            print(f"{gamification.pregenerate_challenges():,} challenges generated")
+            today = dt.datetime.now(IST).date()
+            progress = Progress("evaluate", total=args.days)
+            completed = 0
+            for offset in range(args.days):
+                completed += gamification.evaluate_challenge_completions(str(today - dt.timedelta(days=offset)))
+                progress.update(offset + 1, f"{completed:,} completions")
+            progress.finish(args.days, f"{completed:,} completions")
+    if "percentiles" in targets:
+        with timed("Rebuilding percentile sketches from users"):
+            print(f"{managers['percentiles'].rebuild():,} learners")
+        for metric, summary in managers['percentiles'].quantiles().items():
+            print(f"  {metric}: " + ", ".join(f"{key}={value:,.1f}" if isinstance(value, float) else f"{key}={value}"
+                                             for key, value in summary.items()))
+
+
+def cmd_repair_streaks(managers: Dict, args):
+    today = dt.datetime.now(IST).date()
+    with timed("Recomputing streaks from daily_user_stats and study_sessions" + (" (dry run)" if args.dry_run else "")):
+        report = StreakRepair(managers['db']).repair(today, dry_run=args.dry_run)
+    print(f"{report['users']:,} users: {report['quiz_drift']:,} quiz streaks drifted "
+          f"({report['overstated']:,} overstated, max {report['max_quiz_drift']} days), "
+          f"{report['study_drift']:,} study streaks drifted")
+    if not args.dry_run:
+        print(f"{report['users_updated']:,} users rows and {report['streaks_updated']:,} user_streaks rows written")
+    for row in report['worst']:
+        print(f"  {row['username']}: streak {row['streak']} -> {row['computed']}, "
+              f"study {row['study_streak']} -> {row['study_computed']}")
+
+
+def cmd_backfill_achievements(managers: Dict, args):
+    usernames = [username for username, in managers['db'].conn_u.execute(
+        "SELECT username FROM users ORDER BY username")]
+    progress = Progress("achievements", total=len(usernames))
+    awarded = 0
+    with timed(f"Backfilling achievements for {len(usernames):,} users"):
+        for done, username in enumerate(usernames, 1):
+            awarded += len(managers['gamification'].award_achievements(username))
+            progress.update(done, f"{awarded:,} awarded")
+        progress.finish(len(usernames), f"{awarded:,} awarded")
+
+
+def cmd_calibrate(managers: Dict, args):
+    with timed(f"Calibrating {args.model} model"):
+        try:
+            summary = managers['calibration'].calibrate(args.model, args.epochs, args.chunk_size, log=print)
+        except Exception as e:
+            sys.exit(f"Calibration failed: {e}")
+    print(summary)
+
+
+def cmd_neighbors(managers: Dict, args):
+    with timed("Building semantic neighbour index"):
+        count = managers['neighbors'].build(block_size=args.block_size, log=print)
+    print(f"{count:,} words indexed")
+
+
+def cmd_archive_events(managers: Dict, args):
+    with timed(f"Archiving answer events older than {args.keep_months} months"):
+        print(f"{managers['quiz'].event_log.archive_months(args.keep_months):,} events archived")
+
+
+def cmd_tier_quiz_log(managers: Dict, args):
+    tiering = QuizLogTiering(managers['db'], args.horizon_days, args.batch_size)
+    print(f"before: {tiering.stats()}")
+    with timed(f"Moving quiz_log rows older than {args.horizon_days} days to the cold tier"):
+        moved = tiering.archive(log=print if args.verbose else None)
+    print(f"{moved:,} rows moved")
+    print(f"after:  {tiering.stats()}")
+
+
+def cmd_maintain(managers: Dict, args):
+    db = managers['db']
+    for name, conn in (("users.db", db.conn_u), ("words.db", db.conn_w)):
+        with timed(f"Maintaining {name}"):
+            if args.reindex:
+                conn.execute("REINDEX")
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+            conn.commit()
+            if args.vacuum:
+                conn.execute("VACUUM")
+            if args.check:
+                print(f"integrity_check: {conn.execute('PRAGMA integrity_check').fetchone()[0]}")
+
+
+def cmd_maintenance(managers: Dict, args):
+    scheduler = managers['maintenance']
+    if args.history:
+        for run in reversed(scheduler.last_runs(args.history)):
+            print(f"{run['started_at'][:19]}  {run['job']:<16} {run['status']:<6} "
+                  f"{run['duration_ms']:>9,.0f}ms  {run['detail']}")
+        return
+    if args.daemon:
+        print("Running nightly maintenance after each IST midnight; Ctrl+C to stop")
+        scheduler.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+        return
+    with timed("Running maintenance jobs"):
+        scheduler.run(args.jobs, force=args.force, log=print)
+
+
+def cmd_backup(managers: Dict, args):
+    backups = BackupManager(args.users_db, args.words_db, args.dir, keep=args.keep, pages=args.pages)
+    if args.list:
+        for snapshot in backups.snapshots():
+            print(f"{snapshot['stamp']}  {snapshot['bytes'] / 1e6:10,.1f} MB")
+    elif args.verify:
+        with timed(f"Verifying snapshot {args.verify}"):
+            print("ok" if backups.verify(args.verify) else "FAILED")
+    elif args.restore:
+        if not args.yes:
+            sys.exit(f"Restoring {args.restore} overwrites {args.users_db} and {args.words_db}; pass --yes")
+        with timed(f"Restoring snapshot {args.restore}"):
+            backups.restore(args.restore, log=print)
+    else:
+        with timed("Backing up"):
+            print(f"snapshot {backups.backup(log=print)}")
+
+
+def cmd_export(managers: Dict, args):
+    exporter = HistoryExporter(args.users_db, args.out, args.format, args.batch_size)
+    with timed(f"Exporting history to {args.out} ({args.format})"):
+        exported = exporter.export(args.tables, full=args.full, log=print)
+    print(f"{sum(exported.values()):,} rows exported")
+
+
+def cmd_bench(managers: Dict, args):
+    quiz = managers['quiz']
+    username = args.username
+    for quiz_type in args.types:
+        samples = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            quiz.get_quiz_words(quiz_type, args.length, username, track_usage=False)
+            samples.append(time.perf_counter() - started)
+        print(f"get_quiz_words({quiz_type}, {args.length}): {percentiles(samples)}")
+    vocabulary = managers['vocabulary'].current
+    words = vocabulary.sample_words(min(args.iterations, len(vocabulary)))
+    if words:
+        word_manager = managers['word']
+        for label in ("cold", "warm"):
+            if label == "cold":
+                word_manager.detail_cache.clear()
+            samples = []
+            for word in words:
+                started = time.perf_counter()
+                word_manager.get_word_details(word)
+                samples.append(time.perf_counter() - started)
+            print(f"get_word_details ({label} cache): {percentiles(samples)}")
+
+
+def cmd_traces(managers: Dict, args):
+    pages = flame_summary(read_spans(args.file))
+    if not pages:
+        print(f"No spans in {args.file}")
+        return
+    folded = []
+    for page, summary in sorted(pages.items(), key=lambda item: -item[1]['reruns']):
+        reruns = summary['reruns']
+        page_ms = sum(summary['durations']) or 1.0
+        print(f"\n{page}: {reruns:,} reruns, {percentiles([ms / 1000 for ms in summary['durations']])}")
+        print(f"  {'ms/rerun':>9} {'self':>8} {'share':>6} {'calls':>6} {'db':>6}  span")
+        paths = summary['paths']
+        # Depth-first, heaviest sibling first
+        order = sorted(paths, key=lambda path: tuple((-paths.get(path[:depth + 1], {'ms': 0})['ms'], path[depth])
+                                                     for depth in range(len(path))))
+        for path in order:
+            entry = paths[path]
+            share = entry['ms'] / page_ms
+            folded.append((";".join((page,) + path[1:]), entry['self_ms']))
+            if share < args.min_share:
+                continue
+            print(f"  {entry['ms'] / reruns:9.2f} {entry['self_ms'] / reruns:8.2f} {share:6.1%} "
+                  f"{entry['calls'] / reruns:6.1f} {entry['db'] / reruns:6.1f}  {'  ' * (len(path) - 1)}{path[-1]}")
+    if args.folded:
+        with open(args.folded, "w", encoding="utf-8") as f:
+            for stack, self_ms in folded:
+                f.write(f"{stack} {round(self_ms * 1000)}\n")
+        print(f"\nFolded stacks (self microseconds) written to {args.folded}")
+
+
+class UnpooledQuizzes:
+    """Stands in for QuizPoolService during replay: every request is a synchronous build, so the
+    seeded RNG is consumed in call order rather than by producer threads"""
+    def __init__(self, quiz):
+        self.quiz = quiz
+
+    def get(self, quiz_type: str, length: int, username: str = None) -> List[Dict]:
+        return self.quiz.get_quiz_words(quiz_type, length, username)
+
+    def touch(self, username: str):
+        pass
+
+    def invalidate_user(self, username: str):
+        pass
+
+
+def copy_databases(args, workdir: pathlib.Path) -> Dict[str, pathlib.Path]:
+    """Copy the live databases (or extract a backup snapshot) into workdir for a replay"""
+    if args.from_backup:
+        copies = BackupManager(args.users_db, args.words_db, args.backup_dir).extract(args.from_backup, workdir)
+    else:
+        copies = {}
+        for name, source in (('users', args.users_db), ('words', args.words_db),
+                             ('quiz_log_archive', ARCHIVE_DIR / QUIZ_LOG_ARCHIVE)):
+            if not source.exists():
+                continue
+            copies[name] = workdir / f"{name}.db"
+            src, dst = sqlite3.connect(source), sqlite3.connect(copies[name])
+            try:
+                src.backup(dst)
+            finally:
+                src.close()
+                dst.close()
+    archive_dir = workdir / "archive"
+    archive_dir.mkdir()
+    if 'quiz_log_archive' in copies:
+        copies['quiz_log_archive'].rename(archive_dir / QUIZ_LOG_ARCHIVE)
+    return {'users': workdir / "users.db", 'words': workdir / "words.db", 'archive': archive_dir}
+
+
+def cmd_replay(managers: Dict, args):
+    with tempfile.TemporaryDirectory() as workdir:
+        with timed("Copying databases"):
+            copies = copy_databases(args, pathlib.Path(workdir))
+        replayed = create_managers(copies['users'], copies['words'], start_services=False,
+                                   archive_dir=copies['archive'], seed=args.seed)
+        targets = {type(manager).__name__: manager for manager in replayed.values()}
+        targets['QuizPoolService'] = UnpooledQuizzes(replayed['quiz'])
+        progress = Progress("replay")
+        result = replay(read_calls(args.captures), targets, progress.update)
+        progress.finish(result['calls'])
+        replayed['db'].close_connections()
+    seconds = result['seconds']
+    print(f"Replayed {result['calls']:,} calls ({result['skipped']:,} skipped) in {seconds:.2f}s: "
+          f"{result['calls'] / seconds if seconds else 0:,.0f} calls/s (seed {args.seed})")
+    for key, samples in sorted(result['samples'].items(), key=lambda item: -sum(item[1])):
+        captured = sorted(result['captured'][key])
+        errors = result['errors'].get(key, 0)
+        print(f"  {key}: n={len(samples):,} {percentiles(samples)}"
+              f" | captured p50 {captured[len(captured) // 2] * 1000:.2f}ms"
+              + (f" | {errors:,} errors" if errors else ""))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Batch jobs for the vocab quiz databases")
+    parser.add_argument("--users-db", type=pathlib.Path, default=DB_U)
+    parser.add_argument("--words-db", type=pathlib.Path, default=DB_W)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import-words", help="Bulk import words from a CSV or word list")
+    command.add_argument("file", type=pathlib.Path)
+    command.add_argument("--added-by", default="admin")
+    command.add_argument("--batch-size", type=int, default=500)
+    command.add_argument("--skip-neighbors", action="store_true", help="Do not rebuild the neighbour index")
+    command.add_argument("--block-size", type=int, default=512)
+    command.set_defaults(handler=cmd_import_words)
+
+    command = commands.add_parser("rebuild", help="Rebuild derived tables")
+    command.add_argument("target", choices=["daily-stats", "word-stats", "challenges", "percentiles", "all"])
+    command.add_argument("--days", type=int, default=7, help="Challenge days to re-evaluate")
+    command.add_argument("--archive-dir", type=pathlib.Path, default=ARCHIVE_DIR)
+    command.set_defaults(handler=cmd_rebuild)
+
+    command = commands.add_parser("repair-streaks", help="Recompute quiz and study streaks and report drift")
+    command.add_argument("--dry-run", action="store_true", help="Only report the drift")
+    command.set_defaults(handler=cmd_repair_streaks)
+
+    command = commands.add_parser("backfill-achievements", help="Award achievements every user qualifies for")
+    command.set_defaults(handler=cmd_backfill_achievements)
+
+    command = commands.add_parser("calibrate", help="Fit IRT word difficulty and user ability")
+    command.add_argument("--model", choices=["rasch", "2pl"], default="rasch")
+    command.add_argument("--epochs", type=int, default=25)
+    command.add_argument("--chunk-size", type=int, default=250_000)
+    command.set_defaults(handler=cmd_calibrate)
+
+    command = commands.add_parser("neighbors", help="Rebuild the semantic neighbour index")
+    command.add_argument("--block-size", type=int, default=512)
+    command.set_defaults(handler=cmd_neighbors)
+
+    command = commands.add_parser("archive-events", help="Move old answer events to monthly archives")
+    command.add_argument("--keep-months", type=int, default=3)
+    command.set_defaults(handler=cmd_archive_events)
+
+    command = commands.add_parser("tier-quiz-log", help="Fold old quiz_log rows into rollups and archive them")
+    command.add_argument("--horizon-days", type=int, default=QUIZ_LOG_HOT_DAYS)
+    command.add_argument("--batch-size", type=int, default=2000)
+    command.add_argument("--verbose", action="store_true", help="Report every archived date")
+    command.set_defaults(handler=cmd_tier_quiz_log)
+
+    command = commands.add_parser("maintain", help="ANALYZE / optimize (and optionally REINDEX, VACUUM)")
+    command.add_argument("--reindex", action="store_true")
+    command.add_argument("--vacuum", action="store_true",
+                         help="Full VACUUM; also converts older files to incremental auto-vacuum")
+    command.add_argument("--check", action="store_true", help="Run PRAGMA integrity_check")
+    command.set_defaults(handler=cmd_maintain)
+
+    command = commands.add_parser("maintenance", help="Run the nightly maintenance jobs")
+    command.add_argument("--jobs", nargs="+", choices=MaintenanceScheduler.JOBS, default=None)
+    command.add_argument("--force", action="store_true", help="Run jobs that already succeeded today")
+    command.add_argument("--daemon", action="store_true", help="Keep running after every IST midnight")
+    command.add_argument("--history", type=int, nargs="?", const=20, default=0,
+                         help="Show the most recent runs instead")
+    command.set_defaults(handler=cmd_maintenance)
+
+    command = commands.add_parser("backup", help="Snapshot, list, verify or restore backups")
+    command.add_argument("--dir", type=pathlib.Path, default=BACKUP_DIR)
+    command.add_argument("--keep", type=int, default=14, help="Snapshots to retain")
+    command.add_argument("--pages", type=int, default=256, help="Pages copied per backup step")
+    action = command.add_mutually_exclusive_group()
+    action.add_argument("--list", action="store_true")
+    action.add_argument("--verify", metavar="STAMP")
+    action.add_argument("--restore", metavar="STAMP")
+    command.add_argument("--yes", action="store_true", help="Confirm a restore")
+    command.set_defaults(handler=cmd_backup)
+
+    command = commands.add_parser("export", help="Stream history tables to partitioned Parquet/Arrow files")
+    command.add_argument("--out", type=pathlib.Path, default=EXPORT_DIR)
+    command.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    command.add_argument("--tables", nargs="+", choices=list(HistoryExporter.TABLES), default=None)
+    command.add_argument("--full", action="store_true", help="Ignore watermarks and export everything")
+    command.add_argument("--batch-size", type=int, default=50_000)
+    command.set_defaults(handler=cmd_export)
+
+    command = commands.add_parser("bench", help="Time quiz generation and word lookups")
+    command.add_argument("--types", nargs="+", default=["random", "review", "spaced"])
+    command.add_argument("--length", type=int, default=10)
+    command.add_argument("--iterations", type=int, default=50)
+    command.add_argument("--username", default=None)
+    command.set_defaults(handler=cmd_bench)
+
+    command = commands.add_parser("traces", help="Summarize rerun span traces per page (flame-style)")
+    command.add_argument("--file", type=pathlib.Path, default=pathlib.Path(TRACE_FILE or "traces/spans.jsonl"))
+    command.add_argument("--min-share", type=float, default=0.01, help="Hide spans below this share of page time")
+    command.add_argument("--folded", type=pathlib.Path, default=None,
+                         help="Also write folded stacks for flamegraph.pl / speedscope")
+    command.set_defaults(handler=cmd_traces)
+
+    command = commands.add_parser("replay", help="Re-run captured manager calls against a copy of the databases")
+    command.add_argument("captures", type=pathlib.Path, nargs="+", help="calls-<date>.jsonl capture files")
+    command.add_argument("--seed", type=int, default=0, help="Seed for the replayed managers' RNG")
+    command.add_argument("--from-backup", metavar="STAMP", default=None,
+                         help="Replay against a backup snapshot instead of the live databases")
+    command.add_argument("--backup-dir", type=pathlib.Path, default=BACKUP_DIR)
+    command.set_defaults(handler=cmd_replay)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    started = time.perf_counter()
+    managers = create_managers(args.users_db, args.words_db, start_services=False)
+    args.handler(managers, args)
+    print(f"Total: {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
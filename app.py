@@ -1,20 +1,20 @@
 # app.py – Enhanced Streamlit vocab-quiz app with comprehensive improvements
 import streamlit as st
-import sqlite3
-import pathlib
-import datetime as dt
-import pytz
 import time
-import random
+import secrets
 import pandas as pd
-from PyDictionary import PyDictionary
-import bcrypt
 import logging
 import json
-from typing import Optional, List, Tuple, Dict
+import hashlib
+import threading
+from typing import Optional, List, Tuple, Dict, Callable
 import plotly.express as px
 import plotly.graph_objects as go
-from collections import defaultdict
+from collections import OrderedDict
+from core import (PAGE_RERUN_SECONDS, CompactQuiz, CompactReview, SessionSlot, create_managers,
+                  register_cache_metrics)
+from tracing import annotate, trace_rerun, traced
+from workload import capture_rerun
 
 # ---------- CONFIG ----------
 st.set_page_config(page_title="📚 Vocab Quiz", page_icon="📚", layout="wide")
@@ -157,907 +157,85 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ---------- CONSTANTS ----------
-DB_U = pathlib.Path("users.db")
-DB_W = pathlib.Path("words.db")
-IST = pytz.timezone("Asia/Kolkata")
-TODAY_IST = dt.datetime.now(IST).date()
-
 # ---------- LOGGING SETUP ----------
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# ---------- DATABASE MANAGER ----------
-class DatabaseManager:
-    def __init__(self):
-        self.conn_u = self.init_user_db()
-        self.conn_w = self.init_word_db()
-        self.dictionary = PyDictionary()
-
-    def init_user_db(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(DB_U, check_same_thread=False)
-        c = conn.cursor()
-        # Enhanced users table
-        c.execute("""CREATE TABLE IF NOT EXISTS users(
-            username TEXT PRIMARY KEY,
-            pwd_hash TEXT NOT NULL,
-            streak INTEGER DEFAULT 0,
-            total_q INTEGER DEFAULT 0,
-            correct INTEGER DEFAULT 0,
-            time_spent REAL DEFAULT 0,
-            last_quiz_date TEXT,
-            points INTEGER DEFAULT 0,
-            level INTEGER DEFAULT 1,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            last_login TEXT DEFAULT CURRENT_TIMESTAMP,
-            study_streak INTEGER DEFAULT 0,
-            last_study_date TEXT,
-            total_study_time REAL DEFAULT 0
-        )""")
-        # Enhanced quiz log
-        c.execute("""CREATE TABLE IF NOT EXISTS quiz_log(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            date TEXT NOT NULL,
-            quiz_type TEXT NOT NULL,
-            length INTEGER NOT NULL,
-            correct INTEGER NOT NULL,
-            time_spent REAL NOT NULL,
-            accuracy REAL,
-            points_earned INTEGER DEFAULT 0,
-            FOREIGN KEY (username) REFERENCES users(username)
-        )""")
-        # Word-user relationship with spaced repetition data
-        c.execute("""CREATE TABLE IF NOT EXISTS word_user(
-            username TEXT NOT NULL,
-            word TEXT NOT NULL,
-            status TEXT NOT NULL,
-            date TEXT NOT NULL,
-            attempts INTEGER DEFAULT 1,
-            last_seen TEXT DEFAULT CURRENT_TIMESTAMP,
-            next_review TEXT,
-            ease_factor REAL DEFAULT 2.5,
-            interval_days INTEGER DEFAULT 1,
-            repetitions INTEGER DEFAULT 0,
-            PRIMARY KEY(username, word),
-            FOREIGN KEY (username) REFERENCES users(username)
-        )""")
-        # Social features
-        c.execute("""CREATE TABLE IF NOT EXISTS follows(
-            follower TEXT NOT NULL,
-            following TEXT NOT NULL,
-            date_followed TEXT DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY(follower, following),
-            FOREIGN KEY (follower) REFERENCES users(username),
-            FOREIGN KEY (following) REFERENCES users(username)
-        )""")
-        # Enhanced achievements
-        c.execute("""CREATE TABLE IF NOT EXISTS user_achievements(
-            username TEXT NOT NULL,
-            achievement TEXT NOT NULL,
-            date_earned TEXT NOT NULL,
-            points_earned INTEGER DEFAULT 0,
-            PRIMARY KEY(username, achievement),
-            FOREIGN KEY (username) REFERENCES users(username)
-        )""")
-        # Daily challenges
-        c.execute("""CREATE TABLE IF NOT EXISTS daily_challenges(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            challenge_type TEXT NOT NULL,
-            target_value INTEGER NOT NULL,
-            reward_points INTEGER DEFAULT 50,
-            description TEXT
-        )""")
-        # Challenge completions
-        c.execute("""CREATE TABLE IF NOT EXISTS challenge_completions(
-            username TEXT NOT NULL,
-            challenge_id INTEGER NOT NULL,
-            completed_date TEXT NOT NULL,
-            points_earned INTEGER DEFAULT 0,
-            PRIMARY KEY(username, challenge_id),
-            FOREIGN KEY (username) REFERENCES users(username),
-            FOREIGN KEY (challenge_id) REFERENCES daily_challenges(id)
-        )""")
-        # Study sessions
-        c.execute("""CREATE TABLE IF NOT EXISTS study_sessions(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            session_type TEXT NOT NULL,
-            start_time TEXT NOT NULL,
-            end_time TEXT,
-            duration REAL,
-            cards_reviewed INTEGER DEFAULT 0,
-            FOREIGN KEY (username) REFERENCES users(username)
-        )""")
-        conn.commit()
-        return conn
-
-    def init_word_db(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(DB_W, check_same_thread=False)
-        c = conn.cursor()
-        # Enhanced words table
-        c.execute("""CREATE TABLE IF NOT EXISTS words(
-            word TEXT PRIMARY KEY,
-            definition TEXT NOT NULL,
-            pronunciation TEXT,
-            etymology TEXT,
-            example1 TEXT,
-            example2 TEXT,
-            added_by TEXT DEFAULT 'system',
-            date_added TEXT DEFAULT CURRENT_TIMESTAMP,
-            usage_count INTEGER DEFAULT 0,
-            last_used TEXT
-        )""")
-        # Enhanced suggestions
-        c.execute("""CREATE TABLE IF NOT EXISTS suggestions(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            word TEXT NOT NULL,
-            username TEXT NOT NULL,
-            date TEXT NOT NULL,
-            status TEXT DEFAULT 'pending',
-            reviewed_by TEXT,
-            reviewed_date TEXT,
-            notes TEXT
-        )""")
-        conn.commit()
-        return conn
-
-    def close_connections(self):
-        """Properly close database connections"""
-        try:
-            self.conn_u.close()
-            self.conn_w.close()
-        except Exception as e:
-            logger.error(f"Error closing connections: {e}")
-
-# ---------- AUTHENTICATION MANAGER ----------
-class AuthManager:
-    def __init__(self, db_manager: DatabaseManager):
-        self.db = db_manager
-        self.ensure_default_users()
-
-    @staticmethod
-    def hash_password(password: str) -> str:
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# ---------- FIGURE CACHE ----------
+class FigureCache:
+    """
+    Process-wide LRU cache of serialized Plotly figures.
+    Keys are (username, chart type, params), where params carry a digest of the
+    rows the chart is drawn from, so any write to those rows misses the cache.
+    """
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
     @staticmethod
-    def verify_password(password: str, hashed: str) -> bool:
-        try:
-            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-        except Exception as e:
-            logger.error(f"Password verification error: {e}")
-            return False
-
-    def ensure_default_users(self):
-        try:
-            # Create demo user
-            demo_exists = self.db.conn_u.execute("SELECT 1 FROM users WHERE username='demo'").fetchone()
-            if not demo_exists:
-                demo_hash = self.hash_password("demo")
-                self.db.conn_u.execute(
-                    "INSERT INTO users(username, pwd_hash) VALUES(?, ?)", 
-                    ("demo", demo_hash)
-                )
-            # Create admin user
-            admin_exists = self.db.conn_u.execute("SELECT 1 FROM users WHERE username='admin'").fetchone()
-            if not admin_exists:
-                admin_hash = self.hash_password("admin@123")
-                self.db.conn_u.execute(
-                    "INSERT INTO users(username, pwd_hash) VALUES(?, ?)", 
-                    ("admin", admin_hash)
-                )
-            self.db.conn_u.commit()
-        except Exception as e:
-            logger.error(f"Error creating default users: {e}")
-
-    def authenticate(self, username: str, password: str) -> bool:
-        try:
-            user = self.db.conn_u.execute(
-                "SELECT pwd_hash FROM users WHERE username=?", 
-                (username,)
-            ).fetchone()
-            if user and self.verify_password(password, user[0]):
-                # Update last login
-                self.db.conn_u.execute(
-                    "UPDATE users SET last_login=? WHERE username=?",
-                    (str(dt.datetime.now(IST)), username)
-                )
-                self.db.conn_u.commit()
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"Authentication error: {e}")
-            return False
-
-    def register(self, username: str, password: str) -> Tuple[bool, str]:
-        try:
-            if not username or not password:
-                return False, "Username and password are required"
-            if len(username) < 3:
-                return False, "Username must be at least 3 characters"
-            if len(password) < 4:
-                return False, "Password must be at least 4 characters"
-            # Check for invalid characters
-            if not username.replace("_", "").replace("-", "").isalnum():
-                return False, "Username can only contain letters, numbers, hyphens, and underscores"
-            existing = self.db.conn_u.execute(
-                "SELECT 1 FROM users WHERE username=?", 
-                (username,)
-            ).fetchone()
-            if existing:
-                return False, "Username already taken"
-            pwd_hash = self.hash_password(password)
-            self.db.conn_u.execute(
-                "INSERT INTO users(username, pwd_hash) VALUES(?, ?)",
-                (username, pwd_hash)
-            )
-            self.db.conn_u.commit()
-            return True, "Account created successfully"
-        except Exception as e:
-            logger.error(f"Registration error: {e}")
-            return False, "Registration failed"
-
-# ---------- WORD MANAGER ----------
-class WordManager:
-    def __init__(self, db_manager: DatabaseManager):
-        self.db = db_manager
-
-    def add_word(self, word: str, added_by: str = "admin") -> str:
-        word = word.lower().strip()
-        if not word or len(word) < 2:
-            return "Invalid word"
-        if self.db.conn_w.execute("SELECT 1 FROM words WHERE word=?", (word,)).fetchone():
-            return "Word already exists"
-        try:
-            # Get word information with better error handling
-            definition_text = "No definition available"
-            pronunciation = ""
-            examples = []
-            try:
-                meanings = self.db.dictionary.meaning(word)
-                if meanings:
-                    definition_parts = []
-                    for part_of_speech, definitions in meanings.items():
-                        for definition in definitions[:2]:  # Limit to 2 definitions per part
-                            definition_parts.append(f"{part_of_speech}: {definition}")
-                    definition_text = "; ".join(definition_parts)
-            except Exception as e:
-                logger.warning(f"Failed to get definition for '{word}': {e}")
-            try:
-                pronunciation = self.db.dictionary.phonetic(word) or ""
-            except Exception as e:
-                logger.warning(f"Failed to get pronunciation for '{word}': {e}")
-            try:
-                sentences = self.db.dictionary.sentence(word)
-                if sentences:
-                    examples = sentences[:2]
-            except Exception as e:
-                logger.warning(f"Failed to get examples for '{word}': {e}")
-            # Insert word
-            self.db.conn_w.execute("""
-                INSERT INTO words(word, definition, pronunciation, etymology, example1, example2, added_by, date_added)
-                VALUES(?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                word, definition_text, pronunciation, "",
-                examples[0] if examples else "",
-                examples[1] if len(examples) > 1 else "",
-                added_by, str(TODAY_IST)
-            ))
-            self.db.conn_w.commit()
-            return "Word added successfully"
-        except Exception as e:
-            logger.error(f"Error adding word '{word}': {e}")
-            return f"Error adding word: {str(e)}"
+    def digest(rows) -> str:
+        """Stable fingerprint of chart input rows, used as a cache-key param"""
+        return hashlib.blake2b(repr(rows).encode(), digest_size=16).hexdigest()
 
-    def get_word_details(self, word: str) -> Optional[Dict]:
-        try:
-            result = self.db.conn_w.execute("""
-                SELECT word, definition, pronunciation, example1, example2, etymology
-                FROM words WHERE word=?
-            """, (word,)).fetchone()
-            if result:
-                return {
-                    'word': result[0],
-                    'definition': result[1],
-                    'pronunciation': result[2],
-                    'example1': result[3],
-                    'example2': result[4],
-                    'etymology': result[5]
-                }
-            return None
-        except Exception as e:
-            logger.error(f"Error getting word details for '{word}': {e}")
-            return None
-
-    def update_word_usage(self, word: str):
-        """Update word usage statistics"""
-        try:
-            self.db.conn_w.execute("""
-                UPDATE words 
-                SET usage_count = usage_count + 1, last_used = ?
-                WHERE word = ?
-            """, (str(TODAY_IST), word))
-            self.db.conn_w.commit()
-        except Exception as e:
-            logger.error(f"Error updating word usage for '{word}': {e}")
-
-# ---------- SPACED REPETITION SYSTEM ----------
-class SpacedRepetitionManager:
-    def __init__(self, db_manager: DatabaseManager):
-        self.db = db_manager
-
-    def calculate_next_review(self, ease_factor: float, interval_days: int, repetitions: int, quality: int) -> Tuple[int, float, int]:
+    def get_or_build(self, username: str, charts: List[str],
+                     builder: Callable[[], Dict[str, Optional[go.Figure]]],
+                     *params) -> Dict[str, Optional[dict]]:
         """
-        Calculate next review interval using SM-2 algorithm
-        quality: 0-5 (0=total blackout, 5=perfect response)
+        Return figure specs for `charts`, calling `builder` only on a miss.
+        The builder returns {chart: figure or None}; None is cached as "no data".
         """
-        repetitions += 1
-        if quality < 3:
-            # Reset if quality is poor
-            repetitions = 0
-            interval_days = 1
-        else:
-            if repetitions <= 2:
-                interval_days = 1 if repetitions == 1 else 6
-            else:
-                interval_days = int(interval_days * ease_factor)
-        # Update ease factor
-        ease_factor = ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
-        ease_factor = max(1.3, ease_factor)  # Minimum ease factor
-        return interval_days, ease_factor, repetitions
-
-    def update_word_memory(self, username: str, word: str, quality: int):
-        """Update spaced repetition data for a word"""
-        try:
-            # Get current data
-            result = self.db.conn_u.execute("""
-                SELECT ease_factor, interval_days, repetitions
-                FROM word_user
-                WHERE username = ? AND word = ?
-            """, (username, word)).fetchone()
-            if result:
-                ease_factor, interval_days, repetitions = result
-            else:
-                ease_factor, interval_days, repetitions = 2.5, 1, 0
-            # Calculate next review
-            new_interval, new_ease, new_repetitions = self.calculate_next_review(
-                ease_factor, interval_days, repetitions, quality
-            )
-            # Calculate next review date
-            next_review_date = TODAY_IST + dt.timedelta(days=new_interval)
-            # Update database
-            self.db.conn_u.execute("""
-                UPDATE word_user
-                SET ease_factor = ?, interval_days = ?, repetitions = ?, 
-                    next_review = ?, last_seen = ?
-                WHERE username = ? AND word = ?
-            """, (new_ease, new_interval, new_repetitions, 
-                  str(next_review_date), str(TODAY_IST), username, word))
-            self.db.conn_u.commit()
-        except Exception as e:
-            logger.error(f"Error updating word memory: {e}")
-
-    def get_due_words(self, username: str, limit: int = 20) -> List[str]:
-        """Get words due for review"""
-        try:
-            result = self.db.conn_u.execute("""
-                SELECT word FROM word_user
-                WHERE username = ? AND status = 'known'
-                AND (next_review IS NULL OR next_review <= ?)
-                ORDER BY last_seen ASC
-                LIMIT ?
-            """, (username, str(TODAY_IST), limit)).fetchall()
-            return [word for word, in result]
-        except Exception as e:
-            logger.error(f"Error getting due words: {e}")
-            return []
-
-# ---------- GAMIFICATION MANAGER ----------
-class GamificationManager:
-    def __init__(self, db_manager: DatabaseManager):
-        self.db = db_manager
-        self.achievements_config = {
-            # Points-based achievements
-            "🥉 First Century": {"type": "points", "threshold": 100, "points": 50},
-            "🥈 Half Millennium": {"type": "points", "threshold": 500, "points": 100},
-            "🥇 Millennium Master": {"type": "points", "threshold": 1000, "points": 200},
-            "💎 Point Collector": {"type": "points", "threshold": 2000, "points": 300},
-            "🚀 Sky High": {"type": "points", "threshold": 5000, "points": 500},
-            # Streak achievements
-            "🔥 Week Streak": {"type": "streak", "threshold": 7, "points": 70},
-            "⭐ Monthly Master": {"type": "streak", "threshold": 30, "points": 300},
-            "👑 Century Streak": {"type": "streak", "threshold": 100, "points": 1000},
-            # Knowledge achievements
-            "📚 Vocabulary Builder": {"type": "known", "threshold": 50, "points": 100},
-            "🎓 Word Scholar": {"type": "known", "threshold": 200, "points": 300},
-            "🧠 Lexicon Legend": {"type": "known", "threshold": 500, "points": 500},
-            "📖 Dictionary Master": {"type": "known", "threshold": 1000, "points": 1000},
-            # Quiz achievements
-            "🎯 Perfect Score": {"type": "perfect_quiz", "threshold": 1, "points": 50},
-            "⚡ Speed Demon": {"type": "fast_quiz", "threshold": 1, "points": 30},
-            "📊 Quiz Master": {"type": "total_quizzes", "threshold": 50, "points": 200},
-            "🏃 Marathon Runner": {"type": "total_quizzes", "threshold": 100, "points": 400},
-            # Study achievements
-            "📝 Dedicated Learner": {"type": "study_time", "threshold": 3600, "points": 150},  # 1 hour
-            "⏰ Time Master": {"type": "study_time", "threshold": 18000, "points": 500},  # 5 hours
-            # Social achievements
-            "👥 Social Butterfly": {"type": "followers", "threshold": 5, "points": 100},
-            "🌟 Influencer": {"type": "followers", "threshold": 20, "points": 300},
-        }
-
-    def calculate_level(self, points: int) -> int:
-        return min(int(points / 100) + 1, 50)
-
-    def get_level_progress(self, points: int) -> Tuple[int, int, float]:
-        level = self.calculate_level(points)
-        next_threshold = level * 100
-        current_progress = points % 100 if points % 100 != 0 else 100
-        progress_ratio = current_progress / 100
-        return level, next_threshold, progress_ratio
-
-    def award_achievements(self, username: str) -> List[str]:
-        try:
-            # Get comprehensive user stats
-            user_stats = self.db.conn_u.execute("""
-                SELECT points, streak, correct, total_q, total_study_time
-                FROM users WHERE username=?
-            """, (username,)).fetchone()
-            if not user_stats:
-                return []
-            points, streak, known_words, total_quizzes, study_time = user_stats
-            # Get followers count
-            followers_count = len(self.db.conn_u.execute(
-                "SELECT follower FROM follows WHERE following=?", 
-                (username,)
-            ).fetchall())
-            # Get existing achievements
-            existing = {ach for ach, in self.db.conn_u.execute(
-                "SELECT achievement FROM user_achievements WHERE username=?", 
-                (username,)
-            ).fetchall()}
-            new_achievements = []
-            for achievement, config in self.achievements_config.items():
-                if achievement in existing:
-                    continue
-                should_award = False
-                if config["type"] == "points" and points >= config["threshold"]:
-                    should_award = True
-                elif config["type"] == "streak" and streak >= config["threshold"]:
-                    should_award = True
-                elif config["type"] == "known" and known_words >= config["threshold"]:
-                    should_award = True
-                elif config["type"] == "total_quizzes" and total_quizzes >= config["threshold"]:
-                    should_award = True
-                elif config["type"] == "study_time" and study_time >= config["threshold"]:
-                    should_award = True
-                elif config["type"] == "followers" and followers_count >= config["threshold"]:
-                    should_award = True
-                if should_award:
-                    self.db.conn_u.execute("""
-                        INSERT INTO user_achievements(username, achievement, date_earned, points_earned)
-                        VALUES(?, ?, ?, ?)
-                    """, (username, achievement, str(TODAY_IST), config["points"]))
-                    # Add bonus points
-                    self.db.conn_u.execute(
-                        "UPDATE users SET points = points + ? WHERE username = ?",
-                        (config["points"], username)
-                    )
-                    new_achievements.append(achievement)
-            if new_achievements:
-                self.db.conn_u.commit()
-            return new_achievements
-        except Exception as e:
-            logger.error(f"Error awarding achievements: {e}")
-            return []
-
-    def create_daily_challenge(self) -> bool:
-        """Create daily challenge if it doesn't exist for today"""
-        try:
-            existing = self.db.conn_u.execute(
-                "SELECT 1 FROM daily_challenges WHERE date=?",
-                (str(TODAY_IST),)
-            ).fetchone()
-            if existing:
-                return False
-            # Create a random challenge
-            challenges = [
-                {"type": "quiz_words", "target": 20, "reward": 100, "desc": "Complete a 20-word quiz"},
-                {"type": "perfect_quiz", "target": 1, "reward": 150, "desc": "Get 100% on any quiz"},
-                {"type": "study_time", "target": 1800, "reward": 80, "desc": "Study for 30 minutes"},
-                {"type": "learn_new", "target": 10, "reward": 120, "desc": "Learn 10 new words"},
-            ]
-            challenge = random.choice(challenges)
-            self.db.conn_u.execute("""
-                INSERT INTO daily_challenges(date, challenge_type, target_value, reward_points, description)
-                VALUES(?, ?, ?, ?, ?)
-            """, (str(TODAY_IST), challenge["type"], challenge["target"], 
-                  challenge["reward"], challenge["desc"]))
-            self.db.conn_u.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Error creating daily challenge: {e}")
-            return False
-
-    def get_daily_challenge(self) -> Optional[Dict]:
-        """Get today's challenge"""
-        try:
-            result = self.db.conn_u.execute("""
-                SELECT id, challenge_type, target_value, reward_points, description
-                FROM daily_challenges WHERE date=?
-            """, (str(TODAY_IST),)).fetchone()
-            if result:
-                return {
-                    'id': result[0],
-                    'type': result[1],
-                    'target': result[2],
-                    'reward': result[3],
-                    'description': result[4]
-                }
-            return None
-        except Exception as e:
-            logger.error(f"Error getting daily challenge: {e}")
-            return None
+        keys = {chart: (username, chart, params) for chart in charts}
+        with self._lock:
+            cached = {}
+            for chart, key in keys.items():
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    cached[chart] = self._entries[key]
+            if len(cached) == len(charts):
+                self.hits += 1
+                return {chart: json.loads(fig_json) for chart, fig_json in cached.items()}
+            self.misses += 1
+        built = {chart: (fig.to_json() if fig is not None else "null")
+                 for chart, fig in builder().items()}
+        with self._lock:
+            for chart, fig_json in built.items():
+                self._put(keys[chart], fig_json)
+        return {chart: json.loads(built[chart]) for chart in charts}
 
-    def check_challenge_completion(self, username: str) -> Optional[str]:
-        """Check if user completed today's challenge"""
-        try:
-            challenge = self.get_daily_challenge()
-            if not challenge:
-                return None
-            # Check if already completed
-            completed = self.db.conn_u.execute("""
-                SELECT 1 FROM challenge_completions 
-                WHERE username=? AND challenge_id=?
-            """, (username, challenge['id'])).fetchone()
-            if completed:
-                return None
-            # Check completion based on challenge type
-            completed_now = False
-            if challenge['type'] == 'quiz_words':
-                # Check if user completed enough quiz words today
-                total_today = self.db.conn_u.execute("""
-                    SELECT SUM(length) FROM quiz_log 
-                    WHERE username=? AND date=?
-                """, (username, str(TODAY_IST))).fetchone()[0] or 0
-                if total_today >= challenge['target']:
-                    completed_now = True
-            elif challenge['type'] == 'perfect_quiz':
-                # Check for perfect quiz today
-                perfect_quiz = self.db.conn_u.execute("""
-                    SELECT 1 FROM quiz_log 
-                    WHERE username=? AND date=? AND accuracy=100
-                    LIMIT 1
-                """, (username, str(TODAY_IST))).fetchone()
-                if perfect_quiz:
-                    completed_now = True
-            elif challenge['type'] == 'study_time':
-                # Check study time today
-                study_time_today = self.db.conn_u.execute("""
-                    SELECT SUM(duration) FROM study_sessions 
-                    WHERE username=? AND DATE(start_time)=?
-                """, (username, str(TODAY_IST))).fetchone()[0] or 0
-                if study_time_today >= challenge['target']:
-                    completed_now = True
-            elif challenge['type'] == 'learn_new':
-                # Check new words learned today
-                new_words_today = self.db.conn_u.execute("""
-                    SELECT COUNT(*) FROM word_user 
-                    WHERE username=? AND date=? AND status='known'
-                """, (username, str(TODAY_IST))).fetchone()[0] or 0
-                if new_words_today >= challenge['target']:
-                    completed_now = True
-            if completed_now:
-                # Mark as completed and award points
-                self.db.conn_u.execute("""
-                    INSERT INTO challenge_completions(username, challenge_id, completed_date, points_earned)
-                    VALUES(?, ?, ?, ?)
-                """, (username, challenge['id'], str(TODAY_IST), challenge['reward']))
-                self.db.conn_u.execute("""
-                    UPDATE users SET points = points + ? WHERE username = ?
-                """, (challenge['reward'], username))
-                self.db.conn_u.commit()
-                return f"🎉 Challenge completed! Earned {challenge['reward']} points!"
-            return None
-        except Exception as e:
-            logger.error(f"Error checking challenge completion: {e}")
-            return None
+    def _put(self, key: Tuple, fig_json: str):
+        if len(fig_json) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        self._entries[key] = fig_json
+        self._size += len(fig_json)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
 
-# ---------- QUIZ MANAGER ----------
-class QuizManager:
-    def __init__(self, db_manager: DatabaseManager, word_manager: WordManager):
-        self.db = db_manager
-        self.word_manager = word_manager
-
-    def get_quiz_words(self, quiz_type: str, length: int, username: str = None) -> List[Dict]:
-        """Get words for quiz based on type"""
-        try:
-            if quiz_type == "random":
-                # Get random words
-                words = self.db.conn_w.execute("""
-                    SELECT word FROM words ORDER BY RANDOM() LIMIT ?
-                """, (length,)).fetchall()
-            elif quiz_type == "review" and username:
-                # Get words user got wrong
-                words = self.db.conn_u.execute("""
-                    SELECT DISTINCT word FROM word_user 
-                    WHERE username=? AND status='wrong'
-                    ORDER BY RANDOM() LIMIT ?
-                """, (username, length)).fetchall()
-                if len(words) < length:
-                    # Fill with random words if not enough review words
-                    remaining = length - len(words)
-                    extra_words = self.db.conn_w.execute("""
-                        SELECT word FROM words WHERE word NOT IN (
-                            SELECT word FROM word_user WHERE username=?
-                        ) ORDER BY RANDOM() LIMIT ?
-                    """, (username, remaining)).fetchall()
-                    words.extend(extra_words)
-            elif quiz_type == "spaced" and username:
-                # Get words due for spaced repetition
-                sr_manager = SpacedRepetitionManager(self.db)
-                due_words = sr_manager.get_due_words(username, length)
-                words = [(word,) for word in due_words]
-                if len(words) < length:
-                    # Fill with random words
-                    remaining = length - len(words)
-                    extra_words = self.db.conn_w.execute("""
-                        SELECT word FROM words ORDER BY RANDOM() LIMIT ?
-                    """, (remaining,)).fetchall()
-                    words.extend(extra_words)
-            else:
-                # Default to random
-                words = self.db.conn_w.execute("""
-                    SELECT word FROM words ORDER BY RANDOM() LIMIT ?
-                """, (length,)).fetchall()
-            # Get word details and create quiz questions
-            quiz_words = []
-            for word, in words[:length]:
-                word_details = self.word_manager.get_word_details(word)
-                if word_details:
-                    # Generate multiple choice options
-                    correct_def = word_details['definition']
-                    # Get 3 wrong definitions
-                    wrong_defs = self.db.conn_w.execute("""
-                        SELECT definition FROM words 
-                        WHERE word != ? AND definition != ?
-                        ORDER BY RANDOM() LIMIT 3
-                    """, (word, correct_def)).fetchall()
-                    options = [correct_def] + [def_text for def_text, in wrong_defs]
-                    random.shuffle(options)
-                    quiz_words.append({
-                        'word': word,
-                        'definition': correct_def,
-                        'options': options,
-                        'correct_index': options.index(correct_def),
-                        'pronunciation': word_details.get('pronunciation', ''),
-                        'examples': [word_details.get('example1', ''), word_details.get('example2', '')]
-                    })
-                    # Update word usage
-                    self.word_manager.update_word_usage(word)
-            return quiz_words
-        except Exception as e:
-            logger.error(f"Error getting quiz words: {e}")
-            return []
-
-    def save_quiz_result(self, username: str, quiz_type: str, length: int, 
-                        correct: int, time_spent: float, words_attempted: List[Dict]):
-        """Save quiz results to database"""
-        try:
-            accuracy = (correct / length * 100) if length > 0 else 0
-            points_earned = self.calculate_quiz_points(correct, length, time_spent, accuracy)
-            # Save quiz log
-            self.db.conn_u.execute("""
-                INSERT INTO quiz_log(username, date, quiz_type, length, correct, 
-                                   time_spent, accuracy, points_earned)
-                VALUES(?, ?, ?, ?, ?, ?, ?, ?)
-            """, (username, str(TODAY_IST), quiz_type, length, correct, 
-                  time_spent, accuracy, points_earned))
-            # Update user stats
-            self.db.conn_u.execute("""
-                UPDATE users 
-                SET total_q = total_q + ?, correct = correct + ?, 
-                    time_spent = time_spent + ?, points = points + ?,
-                    last_quiz_date = ?
-                WHERE username = ?
-            """, (length, correct, time_spent, points_earned, str(TODAY_IST), username))
-            # Update streak
-            self.update_streak(username)
-            # Save individual word results
-            for word_data in words_attempted:
-                word = word_data['word']
-                is_correct = word_data['is_correct']
-                status = 'known' if is_correct else 'wrong'
-                # Insert or update word-user relationship
-                self.db.conn_u.execute("""
-                    INSERT OR REPLACE INTO word_user(username, word, status, date, attempts, last_seen)
-                    VALUES(?, ?, ?, ?, 
-                           COALESCE((SELECT attempts FROM word_user WHERE username=? AND word=?), 0) + 1,
-                           ?)
-                """, (username, word, status, str(TODAY_IST), username, word, str(TODAY_IST)))
-                # Update spaced repetition if applicable
-                if quiz_type == "spaced":
-                    sr_manager = SpacedRepetitionManager(self.db)
-                    quality = 5 if is_correct else 2
-                    sr_manager.update_word_memory(username, word, quality)
-            self.db.conn_u.commit()
-            return points_earned
-        except Exception as e:
-            logger.error(f"Error saving quiz result: {e}")
-            return 0
-
-    def calculate_quiz_points(self, correct: int, total: int, time_spent: float, accuracy: float) -> int:
-        """Calculate points earned from quiz"""
-        base_points = correct * 10
-        # Accuracy bonus
-        if accuracy == 100:
-            base_points += 50  # Perfect score bonus
-        elif accuracy >= 80:
-            base_points += 20  # High accuracy bonus
-        # Speed bonus (if completed quickly)
-        if time_spent < total * 5:  # Less than 5 seconds per question
-            base_points += 25
-        return max(base_points, 0)
-
-    def update_streak(self, username: str):
-        """Update user's quiz streak"""
-        try:
-            # Get last quiz date
-            last_quiz = self.db.conn_u.execute(
-                "SELECT last_quiz_date FROM users WHERE username=?",
-                (username,)
-            ).fetchone()
-            if last_quiz and last_quiz[0]:
-                last_date = dt.datetime.strptime(last_quiz[0], '%Y-%m-%d').date()
-                days_diff = (TODAY_IST - last_date).days
-                if days_diff == 0:
-                    # Same day, no change to streak
-                    return
-                elif days_diff == 1:
-                    # Consecutive day, increment streak
-                    self.db.conn_u.execute(
-                        "UPDATE users SET streak = streak + 1 WHERE username = ?",
-                        (username,)
-                    )
-                else:
-                    # Streak broken, reset to 1
-                    self.db.conn_u.execute(
-                        "UPDATE users SET streak = 1 WHERE username = ?",
-                        (username,)
-                    )
-            else:
-                # First quiz, set streak to 1
-                self.db.conn_u.execute(
-                    "UPDATE users SET streak = 1 WHERE username = ?",
-                    (username,)
-                )
-            self.db.conn_u.commit()
-        except Exception as e:
-            logger.error(f"Error updating streak: {e}")
-
-# ---------- ANALYTICS MANAGER ----------
-class AnalyticsManager:
-    def __init__(self, db_manager: DatabaseManager):
-        self.db = db_manager
-
-    def get_user_stats(self, username: str) -> Dict:
-        """Get comprehensive user statistics"""
-        try:
-            # Basic stats
-            user_data = self.db.conn_u.execute("""
-                SELECT points, streak, total_q, correct, time_spent, 
-                       total_study_time, study_streak, created_at
-                FROM users WHERE username=?
-            """, (username,)).fetchone()
-            if not user_data:
-                return {}
-            points, streak, total_q, correct, time_spent, study_time, study_streak, created_at = user_data
-            # Calculate derived stats
-            accuracy = (correct / total_q * 100) if total_q > 0 else 0
-            avg_time_per_q = time_spent / total_q if total_q > 0 else 0
-            # Get level info
-            gam_manager = GamificationManager(self.db)
-            level, next_threshold, progress = gam_manager.get_level_progress(points)
-            # Get achievements
-            achievements = self.db.conn_u.execute("""
-                SELECT achievement, date_earned FROM user_achievements 
-                WHERE username=? ORDER BY date_earned DESC
-            """, (username,)).fetchall()
-            # Get quiz history (last 30 days)
-            thirty_days_ago = (TODAY_IST - dt.timedelta(days=30)).strftime('%Y-%m-%d')
-            quiz_history = self.db.conn_u.execute("""
-                SELECT date, accuracy, points_earned FROM quiz_log 
-                WHERE username=? AND date >= ?
-                ORDER BY date DESC
-            """, (username, thirty_days_ago)).fetchall()
-            # Get word stats
-            known_words = self.db.conn_u.execute("""
-                SELECT COUNT(*) FROM word_user 
-                WHERE username=? AND status='known'
-            """, (username,)).fetchone()[0]
-            wrong_words = self.db.conn_u.execute("""
-                SELECT COUNT(*) FROM word_user 
-                WHERE username=? AND status='wrong'
-            """, (username,)).fetchone()[0]
-            # Get followers/following
-            followers = len(self.db.conn_u.execute(
-                "SELECT follower FROM follows WHERE following=?", (username,)
-            ).fetchall())
-            following = len(self.db.conn_u.execute(
-                "SELECT following FROM follows WHERE follower=?", (username,)
-            ).fetchall())
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
             return {
-                'points': points,
-                'level': level,
-                'progress_to_next': progress,
-                'streak': streak,
-                'study_streak': study_streak,
-                'total_quizzes': total_q,
-                'correct_answers': correct,
-                'accuracy': round(accuracy, 1),
-                'time_spent': time_spent,
-                'study_time': study_time or 0,
-                'avg_time_per_question': round(avg_time_per_q, 1),
-                'known_words': known_words,
-                'wrong_words': wrong_words,
-                'achievements': achievements,
-                'quiz_history': quiz_history,
-                'followers': followers,
-                'following': following,
-                'member_since': created_at
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0
             }
-        except Exception as e:
-            logger.error(f"Error getting user stats: {e}")
-            return {}
-
-    def get_leaderboard(self, limit: int = 10) -> List[Dict]:
-        """Get leaderboard data"""
-        try:
-            users = self.db.conn_u.execute("""
-                SELECT username, points, streak, total_q, correct
-                FROM users 
-                ORDER BY points DESC, streak DESC
-                LIMIT ?
-            """, (limit,)).fetchall()
-            leaderboard = []
-            for i, (username, points, streak, total_q, correct) in enumerate(users, 1):
-                accuracy = (correct / total_q * 100) if total_q > 0 else 0
-                level = GamificationManager(self.db).calculate_level(points)
-                leaderboard.append({
-                    'rank': i,
-                    'username': username,
-                    'points': points,
-                    'level': level,
-                    'streak': streak,
-                    'accuracy': round(accuracy, 1),
-                    'total_quizzes': total_q
-                })
-            return leaderboard
-        except Exception as e:
-            logger.error(f"Error getting leaderboard: {e}")
-            return []
 
 # ---------- INITIALIZE MANAGERS ----------
 @st.cache_resource
 def initialize_managers():
     """Initialize all managers with caching"""
     try:
-        db_manager = DatabaseManager()
-        auth_manager = AuthManager(db_manager)
-        word_manager = WordManager(db_manager)
-        quiz_manager = QuizManager(db_manager, word_manager)
-        gamification_manager = GamificationManager(db_manager)
-        analytics_manager = AnalyticsManager(db_manager)
-        sr_manager = SpacedRepetitionManager(db_manager)
-        return {
-            'db': db_manager,
-            'auth': auth_manager,
-            'word': word_manager,
-            'quiz': quiz_manager,
-            'gamification': gamification_manager,
-            'analytics': analytics_manager,
-            'spaced_repetition': sr_manager
-        }
+        managers = create_managers()
+        managers['figures'] = FigureCache()
+        register_cache_metrics("figures", managers['figures'].stats)
+        return managers
     except Exception as e:
         logger.error(f"Error initializing managers: {e}")
         st.error("Failed to initialize application. Please refresh the page.")
@@ -1067,17 +245,17 @@ def initialize_managers():
 managers = initialize_managers()
 
 # ---------- UI HELPER FUNCTIONS ----------
+@traced()
 def show_word_of_the_day():
     """Display word of the day"""
     try:
-        # Get a random word for today (seeded by date for consistency)
-        random.seed(str(TODAY_IST))
-        word_data = managers['db'].conn_w.execute("""
-            SELECT word, definition, pronunciation, example1 
-            FROM words ORDER BY RANDOM() LIMIT 1
-        """).fetchone()
-        if word_data:
-            word, definition, pronunciation, example = word_data
+        # Today's word is pinned in words.db; its details come from the word detail cache
+        word = managers['word'].word_of_the_day()
+        details = managers['word'].get_word_details(word) if word else None
+        if details:
+            definition = details['definition']
+            pronunciation = details['pronunciation']
+            example = details['example1']
             st.markdown(f"""
             <div class="wod-container">
                 <h2 style="color: white; margin: 0 0 10px 0;">📚 Word of the Day</h2>
@@ -1090,6 +268,7 @@ def show_word_of_the_day():
     except Exception as e:
         logger.error(f"Error showing word of the day: {e}")
 
+@traced()
 def show_achievements_section(username: str):
     """Display user achievements"""
     try:
@@ -1115,18 +294,13 @@ def show_achievements_section(username: str):
     except Exception as e:
         logger.error(f"Error showing achievements: {e}")
 
+@traced()
 def show_daily_challenge(username: str):
     """Display daily challenge"""
     try:
-        # Create challenge if it doesn't exist
-        managers['gamification'].create_daily_challenge()
-        challenge = managers['gamification'].get_daily_challenge()
+        challenge = managers['gamification'].get_challenge_status(username)
         if challenge:
-            # Check if completed
-            completed = managers['db'].conn_u.execute("""
-                SELECT 1 FROM challenge_completions 
-                WHERE username=? AND challenge_id=?
-            """, (username, challenge['id'])).fetchone()
+            completed = challenge['completed']
             status_icon = "✅" if completed else "⏳"
             status_text = "Completed!" if completed else "In Progress"
             col1, col2 = st.columns([3, 1])
@@ -1137,10 +311,8 @@ def show_daily_challenge(username: str):
                 """)
             with col2:
                 st.markdown(f"**{status_icon} {status_text}**")
-            # Check completion
-            completion_msg = managers['gamification'].check_challenge_completion(username)
-            if completion_msg:
-                st.success(completion_msg)
+            if not completed:
+                st.progress(min(challenge['progress'] / challenge['target'], 1.0))
     except Exception as e:
         logger.error(f"Error showing daily challenge: {e}")
 
@@ -1170,18 +342,19 @@ def main():
         st.session_state.logged_in = False
     if 'username' not in st.session_state:
         st.session_state.username = ""
-    if 'quiz_active' not in st.session_state:
-        st.session_state.quiz_active = False
-    if 'quiz_data' not in st.session_state:
-        st.session_state.quiz_data = {}
 
     # Show login/register if not logged in
     if not st.session_state.logged_in:
-        show_auth_page()
+        annotate(page="auth")
+        with PAGE_RERUN_SECONDS.time(page="auth"):
+            show_auth_page()
         return
 
     # Main app content
     username = st.session_state.username
+    managers['quiz_pool'].touch(username)
+    # Marks this session active so its quiz/review state isn't evicted as idle
+    current_session()
     
     # Sidebar navigation
     with st.sidebar:
@@ -1224,28 +397,32 @@ def main():
                 st.metric("Study Time", f"{user_stats['study_time']//3600:.0f}h")
         st.markdown("---")
         if st.button("🚪 Logout", use_container_width=True):
+            managers['sessions'].drop(st.session_state.session_id)
             st.session_state.logged_in = False
             st.session_state.username = ""
             st.rerun()
 
     # Main content based on selected page
-    if page == "🏠 Dashboard":
-        show_dashboard(username)
-    elif page == "📝 Take Quiz":
-        show_quiz_page(username)
-    elif page == "🔄 Spaced Repetition":
-        show_spaced_repetition(username)
-    elif page == "📊 Flashcards":
-        show_flashcards(username)
-    elif page == "📈 Analytics":
-        show_analytics(username)
-    elif page == "🏆 Leaderboard":
-        show_leaderboard()
-    elif page == "➕ Add Words":
-        show_add_words(username)
-    elif page == "⚙️ Settings":
-        show_settings(username)
+    annotate(page=page)
+    with PAGE_RERUN_SECONDS.time(page=page):
+        if page == "🏠 Dashboard":
+            show_dashboard(username)
+        elif page == "📝 Take Quiz":
+            show_quiz_page(username)
+        elif page == "🔄 Spaced Repetition":
+            show_spaced_repetition(username)
+        elif page == "📊 Flashcards":
+            show_flashcards(username)
+        elif page == "📈 Analytics":
+            show_analytics(username)
+        elif page == "🏆 Leaderboard":
+            show_leaderboard(username)
+        elif page == "➕ Add Words":
+            show_add_words(username)
+        elif page == "⚙️ Settings":
+            show_settings(username)
 
+@traced()
 def show_auth_page():
     """Show login/register page"""
     st.markdown("# 📚 Vocabulary Quiz App")
@@ -1295,6 +472,7 @@ def show_auth_page():
                     else:
                         st.error(f"❌ {message}")
 
+@traced()
 def show_dashboard(username: str):
     """Show main dashboard"""
     st.markdown("# 🏠 Dashboard")
@@ -1334,16 +512,7 @@ def show_dashboard(username: str):
     col1, col2, col3 = st.columns(3)
     with col1:
         if st.button("🎯 Quick Quiz (10 words)", use_container_width=True):
-            st.session_state.quiz_active = True
-            st.session_state.quiz_data = {
-                'type': 'random',
-                'length': 10,
-                'words': managers['quiz'].get_quiz_words('random', 10, username),
-                'current': 0,
-                'score': 0,
-                'start_time': time.time(),
-                'answers': []
-            }
+            current_session().quiz = build_quiz_data('random', 10, username)
             st.rerun()
     with col2:
         if st.button("🔄 Review Wrong Words", use_container_width=True):
@@ -1351,16 +520,7 @@ def show_dashboard(username: str):
                 SELECT COUNT(*) FROM word_user WHERE username=? AND status='wrong'
             """, (username,)).fetchone()[0]
             if wrong_count > 0:
-                st.session_state.quiz_active = True
-                st.session_state.quiz_data = {
-                    'type': 'review',
-                    'length': min(wrong_count, 15),
-                    'words': managers['quiz'].get_quiz_words('review', min(wrong_count, 15), username),
-                    'current': 0,
-                    'score': 0,
-                    'start_time': time.time(),
-                    'answers': []
-                }
+                current_session().quiz = build_quiz_data('review', min(wrong_count, 15), username)
                 st.rerun()
             else:
                 st.info("No words to review! Take some quizzes first.")
@@ -1369,53 +529,68 @@ def show_dashboard(username: str):
             st.session_state.current_page = "Flashcards"
             st.rerun()
 
+def current_session() -> SessionSlot:
+    """Server-side quiz/review/flashcard state of this browser session"""
+    return managers['sessions'].slot(st.session_state.session_id, st.session_state.username)
+
+def build_quiz_data(quiz_type: str, length: int, username: str) -> Optional[CompactQuiz]:
+    """Create the session state for a new quiz, or None if no questions could be generated"""
+    adaptive_state = None
+    if quiz_type == "adaptive":
+        quiz_words, adaptive_state = managers['quiz'].start_adaptive_quiz(username)
+    else:
+        quiz_words = managers['quiz_pool'].get(quiz_type, length, username)
+    quiz = CompactQuiz(managers['word'].vocabulary.current, quiz_type, length, quiz_words, adaptive_state)
+    return quiz if len(quiz) else None
+
+@traced()
 def show_quiz_page(username: str):
     """Handle the quiz functionality"""
-    if not st.session_state.quiz_active:
+    session = current_session()
+    if session.quiz is None:
         st.markdown("# 📝 Take a Quiz")
         st.markdown("### Choose your quiz settings")
         with st.form("quiz_settings"):
             col1, col2 = st.columns(2)
             with col1:
-                quiz_type = st.selectbox("Quiz Type", ["Random Words", "Review Mistakes", "Spaced Repetition"])
+                quiz_type = st.selectbox("Quiz Type", ["Random Words", "Review Mistakes", "Spaced Repetition", "Adaptive"])
             with col2:
                 quiz_length = st.slider("Number of Questions", 5, 50, 10)
             start_quiz = st.form_submit_button("🚀 Start Quiz")
             if start_quiz:
-                type_map = {"Random Words": "random", "Review Mistakes": "review", "Spaced Repetition": "spaced"}
+                type_map = {"Random Words": "random", "Review Mistakes": "review", "Spaced Repetition": "spaced",
+                            "Adaptive": "adaptive"}
                 selected_type = type_map[quiz_type]
-                quiz_words = managers['quiz'].get_quiz_words(selected_type, quiz_length, username)
-                if quiz_words:
-                    st.session_state.quiz_active = True
-                    st.session_state.quiz_data = {
-                        'type': selected_type,
-                        'length': len(quiz_words),
-                        'words': quiz_words,
-                        'current': 0,
-                        'score': 0,
-                        'start_time': time.time(),
-                        'answers': []
-                    }
+                quiz = build_quiz_data(selected_type, quiz_length, username)
+                if quiz:
+                    session.quiz = quiz
                     st.rerun()
                 else:
                     st.error("Could not generate quiz. Please try again.")
     else:
         # Active quiz
-        quiz_data = st.session_state.quiz_data
-        current_q = quiz_data['current']
-        if current_q < quiz_data['length']:
-            word_data = quiz_data['words'][current_q]
+        quiz = session.quiz
+        current_q = quiz.current
+        if current_q < quiz.length:
+            word_data = quiz.question(current_q)
+            # Examples come from the shared word detail cache rather than the session
+            details = managers['word'].get_word_details(word_data['word']) or {}
+            examples = [details.get('example1', ''), details.get('example2', '')]
             st.markdown(f"# 📝 Quiz in Progress")
-            st.markdown(f"### Question {current_q + 1} of {quiz_data['length']}")
+            st.markdown(f"### Question {current_q + 1} of {quiz.length}")
             st.markdown(f"**Word:** {word_data['word'].title()}")
             if word_data['pronunciation']:
                 st.markdown(f"*Pronunciation:* {word_data['pronunciation']}")
             # Display examples if available
-            if any(word_data['examples']):
+            if any(examples):
                 with st.expander("💡 Examples"):
-                    for example in word_data['examples']:
+                    for example in examples:
                         if example:
                             st.markdown(f"- {example}")
+            # Start the response timer the first time this question is shown
+            if quiz.timer_question != current_q:
+                quiz.timer_question = current_q
+                quiz.question_start = time.time()
             # Quiz options
             user_choice = st.radio("Choose the correct definition:", word_data['options'], index=None)
             # Navigation buttons
@@ -1423,42 +598,47 @@ def show_quiz_page(username: str):
             with col1:
                 if st.button("⬅️ Previous" if current_q > 0 else "🏠 Home", use_container_width=True):
                     if current_q > 0:
-                        st.session_state.quiz_data['current'] -= 1
+                        quiz.current -= 1
                     else:
-                        st.session_state.quiz_active = False
-                        st.session_state.quiz_data = {}
+                        session.quiz = None
                     st.rerun()
             with col2:
-                next_button = st.button("➡️ Next" if current_q < quiz_data['length'] - 1 else "🏁 Finish Quiz", use_container_width=True)
+                next_button = st.button("➡️ Next" if current_q < quiz.length - 1 else "🏁 Finish Quiz", use_container_width=True)
                 if next_button:
                     if user_choice is not None:
-                        is_correct = (word_data['options'].index(user_choice) == word_data['correct_index'])
-                        st.session_state.quiz_data['answers'].append({
-                            'word': word_data['word'],
-                            'chosen': user_choice,
-                            'correct': word_data['definition'],
-                            'is_correct': is_correct
-                        })
-                        if is_correct:
-                            st.session_state.quiz_data['score'] += 1
-                        st.session_state.quiz_data['current'] += 1
+                        chosen_index = word_data['options'].index(user_choice)
+                        is_correct = quiz.answer(current_q, chosen_index,
+                                                 int((time.time() - quiz.question_start) * 1000))
+                        quiz.current += 1
+                        # Adaptive quizzes pick the next word from the answer just given
+                        if quiz.adaptive is not None and len(quiz) <= current_q + 1 < quiz.length:
+                            next_question = managers['quiz'].next_adaptive_question(quiz.adaptive, is_correct)
+                            if not (next_question and quiz.append(next_question)):
+                                quiz.length = len(quiz)
                         st.rerun()
                     else:
                         st.warning("Please select an answer before proceeding.")
         else:
             # Quiz finished
-            end_time = time.time()
-            time_spent = end_time - quiz_data['start_time']
-            correct = quiz_data['score']
-            total = quiz_data['length']
+            correct = quiz.score
+            total = quiz.length
             accuracy = (correct / total) * 100
-            points_earned = managers['quiz'].save_quiz_result(
-                username, quiz_data['type'], total, correct, time_spent, quiz_data['answers']
-            )
+            answers = quiz.answers()
+            # Save once; later reruns of the results screen reuse the outcome
+            if quiz.points_earned is None:
+                quiz.time_spent = time.time() - quiz.start_time
+                quiz.points_earned, quiz.challenge_message = managers['quiz'].save_quiz_result(
+                    username, quiz.quiz_type, total, correct, quiz.time_spent, answers
+                )
+                managers['quiz_pool'].invalidate_user(username)
+            time_spent = quiz.time_spent
+            points_earned = quiz.points_earned
             st.markdown("# 🎉 Quiz Completed!")
             st.markdown(f"### 🏆 Your Score: {correct}/{total} ({accuracy:.1f}%)")
             st.markdown(f"**⏱️ Time Spent:** {time_spent:.1f} seconds")
             st.markdown(f"**💎 Points Earned:** {points_earned}")
+            if quiz.challenge_message:
+                st.success(quiz.challenge_message)
             # Award achievements
             new_achievements = managers['gamification'].award_achievements(username)
             if new_achievements:
@@ -1466,7 +646,7 @@ def show_quiz_page(username: str):
                 for ach in new_achievements:
                     st.success(f"🎉 New Achievement: **{ach}**!")
             # Show incorrect answers
-            incorrect_answers = [ans for ans in quiz_data['answers'] if not ans['is_correct']]
+            incorrect_answers = [ans for ans in answers if not ans['is_correct']]
             if incorrect_answers:
                 st.markdown("### ❌ Review Incorrect Answers")
                 for ans in incorrect_answers:
@@ -1475,34 +655,31 @@ def show_quiz_page(username: str):
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("🏠 Back to Dashboard", use_container_width=True):
-                    st.session_state.quiz_active = False
-                    st.session_state.quiz_data = {}
+                    session.quiz = None
                     st.rerun()
             with col2:
                 if st.button("🔄 Retake Quiz", use_container_width=True):
                     # Retake with same settings
-                    quiz_words = managers['quiz'].get_quiz_words(quiz_data['type'], quiz_data['length'], username)
-                    if quiz_words:
-                        st.session_state.quiz_data = {
-                            'type': quiz_data['type'],
-                            'length': len(quiz_words),
-                            'words': quiz_words,
-                            'current': 0,
-                            'score': 0,
-                            'start_time': time.time(),
-                            'answers': []
-                        }
+                    new_quiz = build_quiz_data(quiz.quiz_type, quiz.length, username)
+                    if new_quiz:
+                        session.quiz = new_quiz
                         st.rerun()
                     else:
                         st.error("Could not generate quiz. Please try again.")
 
+@traced()
 def show_spaced_repetition(username: str):
     """Show spaced repetition study session"""
     st.markdown("# 🔄 Spaced Repetition")
     st.markdown("Review words you've learned based on optimal timing for long-term memory.")
-    # Get due words
-    due_words = managers['spaced_repetition'].get_due_words(username, 20)
-    if not due_words:
+    # Get due words once per session; reruns render cards from the word detail cache
+    session = current_session()
+    if session.review is None:
+        session.review = CompactReview(managers['word'].vocabulary.current,
+                                       managers['spaced_repetition'].get_due_words(username, 20))
+    review = session.review
+    if not len(review):
+        session.review = None
         st.info("No words are due for review right now. Great job keeping up!")
         st.markdown("You can:")
         if st.button("📚 Study Flashcards"):
@@ -1512,14 +689,11 @@ def show_spaced_repetition(username: str):
             st.session_state.current_page = "Take Quiz"
             st.rerun()
         return
-    st.markdown(f"### You have {len(due_words)} words to review")
+    st.markdown(f"### You have {len(review)} words to review")
     # Simple flashcard review for spaced repetition
-    if 'sr_index' not in st.session_state:
-        st.session_state.sr_index = 0
-        st.session_state.sr_reviews = []
-    index = st.session_state.sr_index
-    if index < len(due_words):
-        word = due_words[index]
+    index = review.index
+    if index < len(review):
+        word = review.word(index)
         word_details = managers['word'].get_word_details(word)
         if word_details:
             st.markdown(f"""
@@ -1538,42 +712,52 @@ def show_spaced_repetition(username: str):
             quality_map = {0: "Again", 2: "Hard", 3: "Good", 5: "Easy"}
             for quality, label in quality_map.items():
                 if st.button(label, key=f"sr_{quality}", use_container_width=True):
-                    st.session_state.sr_reviews.append((word, quality))
-                    st.session_state.sr_index += 1
+                    review.rate(quality)
                     st.rerun()
         else:
             st.error("Error loading word details.")
     else:
         # Finished review
         st.success("🎉 You've finished reviewing all due words!")
-        # Save spaced repetition results
-        for word, quality in st.session_state.sr_reviews:
-            managers['spaced_repetition'].update_word_memory(username, word, quality)
-        st.markdown(f"Reviewed {len(st.session_state.sr_reviews)} words.")
+        # Save spaced repetition results (once per session)
+        if not review.saved:
+            for word, quality in review.reviews():
+                managers['spaced_repetition'].update_word_memory(username, word, quality)
+            managers['spaced_repetition'].log_study_session(
+                username, 'spaced', review.start_time, len(review.qualities)
+            )
+            managers['quiz_pool'].invalidate_user(username)
+            review.saved = True
+        st.markdown(f"Reviewed {len(review.qualities)} words.")
         if st.button("🔄 Review Again"):
-            st.session_state.sr_index = 0
-            st.session_state.sr_reviews = []
+            session.review = None
             st.rerun()
         if st.button("🏠 Back to Dashboard"):
-            del st.session_state.sr_index
-            del st.session_state.sr_reviews
+            session.review = None
             st.rerun()
 
+@traced()
 def show_flashcards(username: str):
     """Display flashcards for learning words"""
     st.markdown("# 📊 Flashcards")
-    # Get a batch of words (e.g., 10 random or due words)
-    # For simplicity, we'll use random words. Could be enhanced to use spaced repetition.
-    words_data = managers['db'].conn_w.execute(
-        "SELECT word, definition, pronunciation, example1 FROM words ORDER BY RANDOM() LIMIT 15"
-    ).fetchall()
-    if not words_data:
+    # Pick a deck of random words once per session; cards are rendered from the word detail cache
+    session = current_session()
+    if session.deck is None:
+        session.deck = managers['word'].vocabulary.current.sample_words(15, rng=managers['rng'])
+        st.session_state.pop('flashcard_index', None)
+    deck = session.deck
+    if not deck:
+        session.deck = None
         st.info("No words available to study. Please add some words first.")
         return
     if 'flashcard_index' not in st.session_state:
         st.session_state.flashcard_index = 0
+        st.session_state.flashcard_start_time = time.time()
     index = st.session_state.flashcard_index
-    word_data = words_data[index]
+    details = managers['word'].get_word_details(deck[index]) or {}
+    word_data = (deck[index], details.get('definition', ''), details.get('pronunciation', ''),
+                 details.get('example1', ''))
+    words_data = deck
     st.markdown(f"""
     <div class="flashcard" onclick="this.querySelector('.back').style.display='block'">
         <div class="front">
@@ -1595,10 +779,11 @@ def show_flashcards(username: str):
                 st.session_state.flashcard_index -= 1
             else:
                 del st.session_state.flashcard_index
+                session.deck = None
             st.rerun()
     with col2:
         if st.button("🔄 Shuffle", use_container_width=True):
-            random.shuffle(words_data) # This won't persist due to page rerun, but gives idea
+            managers['rng'].shuffle(deck)
             st.session_state.flashcard_index = 0
             st.rerun()
     with col3:
@@ -1607,9 +792,43 @@ def show_flashcards(username: str):
                 st.session_state.flashcard_index += 1
             else:
                 del st.session_state.flashcard_index
+                session.deck = None
+                managers['spaced_repetition'].log_study_session(
+                    username, 'flashcards', st.session_state.flashcard_start_time, len(words_data)
+                )
                 st.success("🎉 Finished flashcard session!")
             st.rerun()
 
+def build_history_figures(daily_stats: List[Tuple]) -> Dict[str, Optional[go.Figure]]:
+    """Build the quiz history charts from the daily rollup rows"""
+    if not daily_stats:
+        return {'accuracy_trend': None, 'points_per_day': None, 'calendar': None}
+    df_history = pd.DataFrame(daily_stats, columns=[
+        'Date', 'Quizzes', 'Questions', 'Correct', 'Time', 'Points', 'New Known'
+    ])
+    df_history['Date'] = pd.to_datetime(df_history['Date'])
+    df_history['Accuracy'] = (df_history['Correct'] * 100 / df_history['Questions'].where(df_history['Questions'] > 0)).round(1)
+    fig_acc = px.line(df_history, x='Date', y='Accuracy', title='Accuracy Trend')
+    fig_pts = px.bar(df_history, x='Date', y='Points', title='Points Earned Per Day')
+    # Calendar heatmap: one column per week, one row per weekday
+    df_history['Week'] = df_history['Date'].dt.to_period('W').dt.start_time
+    df_history['Weekday'] = df_history['Date'].dt.day_name().str[:3]
+    heatmap = df_history.pivot_table(index='Weekday', columns='Week', values='Questions', aggfunc='sum')
+    heatmap = heatmap.reindex(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])
+    fig_cal = go.Figure(data=go.Heatmap(
+        z=heatmap.values, x=heatmap.columns, y=heatmap.index,
+        colorscale='Purples', hoverongaps=False
+    ))
+    fig_cal.update_layout(title_text='Questions Answered Per Day')
+    return {'accuracy_trend': fig_acc, 'points_per_day': fig_pts, 'calendar': fig_cal}
+
+def build_word_mastery_figure(known: int, wrong: int) -> go.Figure:
+    """Build the known vs. mistakes pie chart"""
+    fig_words = go.Figure(data=[go.Pie(labels=['Known', 'Mistakes'], values=[known, wrong], hole=.3)])
+    fig_words.update_layout(title_text='Word Mastery')
+    return fig_words
+
+@traced()
 def show_analytics(username: str):
     """Display user analytics and progress"""
     st.markdown("# 📈 Your Analytics")
@@ -1623,15 +842,28 @@ def show_analytics(username: str):
     col2.metric("Points", user_stats['points'])
     col3.metric("Streak", f"{user_stats['streak']} days")
     col4.metric("Accuracy", f"{user_stats['accuracy']}%")
+    # Percentile badges from the shared sketches (no sort over users)
+    if user_stats['total_quizzes'] > 0:
+        ranks = managers['percentiles'].percentiles(user_stats)
+        if ranks:
+            st.markdown("### 🏅 How You Compare")
+            labels = {'points': "Points", 'accuracy': "Accuracy", 'known_words': "Words Known"}
+            for col, (metric, share) in zip(st.columns(len(ranks)), ranks.items()):
+                col.metric(labels[metric], f"Better than {share:.0f}%", help="Share of other learners you are ahead of")
     # Progress chart
-    if user_stats['quiz_history']:
-        df_history = pd.DataFrame(user_stats['quiz_history'], columns=['Date', 'Accuracy', 'Points'])
-        df_history['Date'] = pd.to_datetime(df_history['Date'])
-        st.markdown("### 📅 Quiz Performance Over Time")
-        fig_acc = px.line(df_history, x='Date', y='Accuracy', title='Accuracy Trend')
-        st.plotly_chart(fig_acc, use_container_width=True)
-        fig_pts = px.bar(df_history, x='Date', y='Points', title='Points Earned Per Day')
-        st.plotly_chart(fig_pts, use_container_width=True)
+    st.markdown("### 📅 Quiz Performance Over Time")
+    range_map = {"Last 30 days": 30, "Last 90 days": 90, "Last 365 days": 365}
+    range_label = st.selectbox("Range", list(range_map.keys()))
+    days = range_map[range_label]
+    history_charts = ['accuracy_trend', 'points_per_day', 'calendar']
+    # The rollup rows are cheap to read; keying on them catches every writer (saves, repairs, restores, reconciles)
+    daily_stats = managers['analytics'].get_daily_stats(username, days)
+    history_figs = managers['figures'].get_or_build(
+        username, history_charts, lambda: build_history_figures(daily_stats), days, FigureCache.digest(daily_stats)
+    )
+    if history_figs['accuracy_trend'] is not None:
+        for chart in history_charts:
+            st.plotly_chart(history_figs[chart], use_container_width=True)
     else:
         st.info("No quiz history yet. Take a quiz to see your progress!")
     # Word knowledge
@@ -1639,11 +871,31 @@ def show_analytics(username: str):
     known = user_stats['known_words']
     wrong = user_stats['wrong_words']
     if known + wrong > 0:
-        fig_words = go.Figure(data=[go.Pie(labels=['Known', 'Mistakes'], values=[known, wrong], hole=.3)])
-        fig_words.update_layout(title_text='Word Mastery')
-        st.plotly_chart(fig_words, use_container_width=True)
+        word_figs = managers['figures'].get_or_build(
+            username, ['word_mastery'], lambda: {'word_mastery': build_word_mastery_figure(known, wrong)},
+            known, wrong
+        )
+        st.plotly_chart(word_figs['word_mastery'], use_container_width=True)
     else:
         st.info("No words studied yet.")
+    # Mistakes ranked by how hard they are for everyone
+    if wrong > 0:
+        st.markdown("### 🧩 Your Trickiest Words")
+        wrong_words = [word for word, in managers['db'].conn_u.execute(
+            "SELECT word FROM word_user WHERE username=? AND status='wrong'", (username,)
+        ).fetchall()]
+        word_stats = managers['word_stats']
+        trickiest = sorted(wrong_words, key=word_stats.difficulty, reverse=True)[:10]
+        rows = []
+        for word in trickiest:
+            attempts, correct_answers, _ = word_stats.get(word)
+            rows.append({
+                'Word': word,
+                'Global Accuracy': f"{correct_answers / attempts * 100:.0f}%" if attempts else "–",
+                'Attempts (all users)': attempts
+            })
+        df_tricky = pd.DataFrame(rows)
+        st.dataframe(df_tricky, use_container_width=True)
     # Achievements
     st.markdown("### 🏆 Achievements")
     if user_stats['achievements']:
@@ -1652,16 +904,79 @@ def show_analytics(username: str):
     else:
         st.info("No achievements yet. Keep learning to unlock them!")
 
-def show_leaderboard():
-    """Display the user leaderboard"""
+@traced()
+def show_leaderboard(username: str):
+    """Display the global and friends leaderboards with the friends' activity feed"""
     st.markdown("# 🏆 Leaderboard")
-    leaderboard_data = managers['analytics'].get_leaderboard(10)
-    if leaderboard_data:
-        df_lb = pd.DataFrame(leaderboard_data)
-        st.dataframe(df_lb[['rank', 'username', 'level', 'points', 'streak', 'accuracy']], use_container_width=True)
+    tab1, tab2, tab3 = st.tabs(["🌍 Everyone", "👥 Friends", "🏅 League"])
+    with tab1:
+        leaderboard_data = managers['analytics'].get_leaderboard(10)
+        if leaderboard_data:
+            df_lb = pd.DataFrame(leaderboard_data)
+            st.dataframe(df_lb[['rank', 'username', 'level', 'points', 'streak', 'accuracy']], use_container_width=True)
+        else:
+            st.info("No leaderboard data available.")
+    with tab2:
+        show_friends(username)
+    with tab3:
+        show_league(username)
+
+@traced()
+def show_league(username: str):
+    """This week's league division, read from the nightly standings snapshot"""
+    league = managers['leagues'].standings(username)
+    if not league:
+        st.info("Take a quiz this week and you'll be placed in a league when the next week starts!")
+        return
+    if league['last_week']:
+        result = league['last_week']
+        messages = {'promoted': "⬆️ You were promoted", 'demoted': "⬇️ You were demoted",
+                    'stayed': "➡️ You stayed"}
+        st.caption(f"{messages[result['outcome']]} last week ({result['tier']} league).")
+    st.markdown(f"### {league['tier']} League · Division {league['division']}")
+    st.caption(f"Week of {league['week']} · standings as of {league['computed_at'][:16]}"
+               + (" (final)" if league['final'] else ""))
+    zones = {'promoted': "⬆️ Promotion", 'demoted': "⬇️ Demotion", 'stayed': ""}
+    df_league = pd.DataFrame([{
+        'Rank': row['rank'],
+        'Learner': row['username'] + (" (you)" if row['username'] == username else ""),
+        'Weekly Points': row['points'],
+        'Zone': zones[row['outcome']]
+    } for row in league['rows']])
+    st.dataframe(df_league, use_container_width=True, hide_index=True)
+
+@traced()
+def show_friends(username: str):
+    """Friends leaderboard, follow management and the activity feed"""
+    social = managers['social']
+    with st.form("follow_form", clear_on_submit=True):
+        to_follow = st.text_input("Follow a learner by username")
+        if st.form_submit_button("➕ Follow") and to_follow:
+            st.info(social.follow(username, to_follow.strip()))
+    following = social.following(username)
+    if not following:
+        st.info("You're not following anyone yet. Follow friends to compare progress!")
+        return
+    friends_data = managers['analytics'].get_friends_leaderboard(username, 50)
+    if friends_data:
+        df_friends = pd.DataFrame(friends_data)
+        st.dataframe(df_friends[['rank', 'username', 'level', 'points', 'streak', 'accuracy']],
+                     use_container_width=True)
+    to_unfollow = st.selectbox("Following", following)
+    if st.button("➖ Unfollow"):
+        social.unfollow(username, to_unfollow)
+        st.rerun()
+    st.markdown("### 📰 Recent Activity")
+    feed = social.feed(username, 20)
+    if feed:
+        icons = {'quiz': "📝", 'achievement': "🏅"}
+        for item in feed:
+            st.markdown(f"- {icons.get(item['kind'], '•')} **{item['actor']}** {item['detail']}"
+                        f" _({item['created_at'][:16]})_")
     else:
-        st.info("No leaderboard data available.")
+        st.info("No recent activity from the people you follow.")
 
+@traced()
 def show_add_words(username: str):
     """Allow users to suggest new words"""
     st.markdown("# ➕ Suggest New Words")
@@ -1675,6 +990,7 @@ def show_add_words(username: str):
                 # For now, we'll just try to add it directly
                 result = managers['word'].add_word(new_word, username)
                 if "successfully" in result:
+                    managers['calibration'].invalidate_index()
                     st.success(result)
                 else:
                     st.warning(result)
@@ -1692,6 +1008,7 @@ def show_add_words(username: str):
     else:
         st.info("You haven't suggested any words yet.")
 
+@traced()
 def show_settings(username: str):
     """User settings page"""
     st.markdown("# ⚙️ Settings")
@@ -1729,9 +1046,31 @@ def show_settings(username: str):
                     st.success("Password changed successfully!")
                 else:
                     st.error("Current password is incorrect.")
+    if username == "admin":
+        show_session_memory()
+
+@traced()
+def show_session_memory():
+    """Admin view of server-side session state, per session and per key"""
+    st.markdown("### 🧠 Session Memory")
+    sessions = managers['sessions']
+    usage = sessions.usage()
+    stats = sessions.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Sessions", stats['sessions'])
+    col2.metric("State", f"{sum(stats['bytes'].values()) / 1024:.1f} KB")
+    col3.metric("Evicted (idle)", stats['evicted'])
+    if usage:
+        st.dataframe(pd.DataFrame(usage), use_container_width=True, hide_index=True)
+    if st.button("🧹 Evict idle sessions now"):
+        st.success(f"Evicted {sessions.evict_idle()} idle sessions.")
 
 if __name__ == "__main__":
-    main()
+    # Keys this browser session's server-side state and its captured manager calls
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = secrets.token_hex(16)
+    with trace_rerun(), capture_rerun(st.session_state.session_id):
+        main()
     # Ensure connections are closed properly on app exit
     # Note: Streamlit doesn't have a direct 'on_exit' hook that's reliable for this.
     # Connections are typically managed per request/thread and closed by the DB.
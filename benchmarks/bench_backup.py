@@ -0,0 +1,99 @@
+# bench_backup.py – Live read/write latency while an online backup runs
+# Usage: python benchmarks/bench_backup.py [--size-mb 2048] [--pages 256] [--pause 0.005]
+import argparse
+import pathlib
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from core import BackupManager, DatabaseManager  # noqa: E402
+
+
+def fill(path: pathlib.Path, size_mb: int) -> int:
+    """Grow a WAL database to roughly size_mb with answer-event-like rows"""
+    conn = sqlite3.connect(path)
+    DatabaseManager.configure_connection(conn)
+    conn.execute("CREATE TABLE IF NOT EXISTS events(id INTEGER PRIMARY KEY, user_id INTEGER, word_id INTEGER,"
+                 " is_correct INTEGER, payload TEXT)")
+    payload = "x" * 200
+    rows = 0
+    while path.stat().st_size < size_mb * 1024 * 1024:
+        conn.executemany("INSERT INTO events(user_id, word_id, is_correct, payload) VALUES(?, ?, ?, ?)",
+                         ((random.randrange(10_000), random.randrange(5_000), random.randrange(2), payload)
+                          for _ in range(100_000)))
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        rows += 100_000
+    conn.close()
+    return rows
+
+
+def live_session(path: pathlib.Path, rows: int, stop: threading.Event, samples: list):
+    """One point read plus one small committed write per iteration, like a quiz answer"""
+    conn = sqlite3.connect(path, timeout=30)
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute("SELECT user_id, word_id FROM events WHERE id = ?", (random.randrange(1, rows),)).fetchone()
+        conn.execute("INSERT INTO events(user_id, word_id, is_correct, payload) VALUES(1, 1, 1, '')")
+        conn.commit()
+        samples.append(time.perf_counter() - started)
+        time.sleep(0.002)
+    conn.close()
+
+
+def summary(samples: list) -> str:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return (f"n={len(ordered):,} p50 {pick(0.50):.2f}ms p95 {pick(0.95):.2f}ms "
+            f"p99 {pick(0.99):.2f}ms max {ordered[-1] * 1000:.2f}ms")
+
+
+def measure(path: pathlib.Path, rows: int, during=None, seconds: float = 3.0) -> list:
+    samples = []
+    stop = threading.Event()
+    worker = threading.Thread(target=live_session, args=(path, rows, stop, samples))
+    worker.start()
+    if during:
+        during()
+    else:
+        time.sleep(seconds)
+    stop.set()
+    worker.join()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live-session latency during an online backup")
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--pages", type=int, default=256)
+    parser.add_argument("--pause", type=float, default=0.005)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = pathlib.Path(workdir)
+        db_path = workdir / "users.db"
+        started = time.perf_counter()
+        rows = fill(db_path, args.size_mb)
+        (workdir / "words.db").touch()
+        print(f"built {db_path.stat().st_size / 1e6:,.0f} MB ({rows:,} rows) in {time.perf_counter() - started:.1f}s")
+        print(f"idle:             {summary(measure(db_path, rows))}")
+        for label, pages in (("stepped backup:  ", args.pages), ("one-step backup: ", -1)):
+            backups = BackupManager(db_path, workdir / "words.db", workdir / f"backups{pages}",
+                                    pages=pages, pause=args.pause if pages > 0 else 0.0)
+            timing = {}
+
+            def run_backup():
+                begin = time.perf_counter()
+                backups.backup()
+                timing['seconds'] = time.perf_counter() - begin
+
+            samples = measure(db_path, rows, during=run_backup)
+            print(f"{label} {summary(samples)} (backup {timing['seconds']:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# bench_calibration.py – Time IRT calibration on synthetic answers
+# Usage: python benchmarks/bench_calibration.py [--answers 1000000] [--model rasch|2pl]
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from calibration import array_chunks, fit_irt, simulate_answers  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time IRT calibration on synthetic answers")
+    parser.add_argument("--answers", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--words", type=int, default=5_000)
+    parser.add_argument("--model", choices=["rasch", "2pl"], default="rasch")
+    parser.add_argument("--epochs", type=int, default=25)
+    parser.add_argument("--chunk-size", type=int, default=250_000)
+    args = parser.parse_args()
+
+    (users, words, correct), truth = simulate_answers(args.answers, args.users, args.words, args.model)
+    print(f"{args.answers:,} answers, {args.users:,} users, {args.words:,} words, model={args.model}")
+    start = time.perf_counter()
+    fitted = fit_irt(array_chunks(users, words, correct, args.chunk_size),
+                     args.users, args.words, model=args.model, epochs=args.epochs)
+    elapsed = time.perf_counter() - start
+    print(f"fit time: {elapsed:.2f}s ({args.answers / elapsed:,.0f} answers/s)")
+    print(f"difficulty correlation with truth: {np.corrcoef(fitted['b'], truth['b'])[0, 1]:.3f}")
+    print(f"ability correlation with truth:    {np.corrcoef(fitted['theta'], truth['theta'])[0, 1]:.3f}")
+    if args.model == "2pl":
+        print(f"discrimination correlation:        {np.corrcoef(fitted['a'], truth['a'])[0, 1]:.3f}")
+
+
+if __name__ == "__main__":
+    main()
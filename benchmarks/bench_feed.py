@@ -0,0 +1,93 @@
+# bench_feed.py – Activity feed: fan-out on write (activity_feed) vs fan-out on read (follows ⋈ activities)
+# Usage: python benchmarks/bench_feed.py [--users 5000] [--following 50] [--celebrity-followers 3000]
+import argparse
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from core import DatabaseManager, SocialManager  # noqa: E402
+
+
+def build(db: DatabaseManager, social: SocialManager, args) -> list:
+    """Users, a follow graph with a few very popular accounts, and history fanned out as it happened"""
+    users = [f"user{i}" for i in range(args.users)]
+    celebrities = users[:args.celebrities]
+    conn = db.conn_u
+    conn.executemany("INSERT INTO users(username, pwd_hash) VALUES(?, '')", ((u,) for u in users))
+    edges = set()
+    for user in users:
+        for followee in random.sample(users, args.following):
+            if followee != user:
+                edges.add((user, followee))
+    for celebrity in celebrities:
+        for follower in random.sample(users, args.celebrity_followers):
+            if follower != celebrity:
+                edges.add((follower, celebrity))
+    conn.executemany("INSERT INTO follows(follower, following) VALUES(?, ?)", edges)
+    conn.commit()
+    for round_number in range(args.activities):
+        for user in users:
+            social.record_activity(user, "quiz", f"scored {round_number}/10 (random quiz)")
+        conn.commit()
+    social.trim()
+    return users
+
+
+def summary(samples: list) -> str:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return f"p50 {pick(0.50):.2f}ms p95 {pick(0.95):.2f}ms max {ordered[-1] * 1000:.2f}ms"
+
+
+def timed_calls(function, arguments: list) -> list:
+    samples = []
+    for argument in arguments:
+        started = time.perf_counter()
+        function(argument)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan-out-on-write vs fan-out-on-read activity feeds")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--following", type=int, default=50, help="Accounts each user follows")
+    parser.add_argument("--celebrities", type=int, default=5)
+    parser.add_argument("--celebrity-followers", type=int, default=3000)
+    parser.add_argument("--activities", type=int, default=10, help="Past activities per user")
+    parser.add_argument("--samples", type=int, default=300)
+    args = parser.parse_args()
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = pathlib.Path(workdir)
+        db = DatabaseManager(workdir / "users.db", workdir / "words.db", workdir / "archive")
+        social = SocialManager(db)
+        started = time.perf_counter()
+        users = build(db, social, args)
+        feed_rows = db.conn_u.execute("SELECT COUNT(*) FROM activity_feed").fetchone()[0]
+        print(f"built {len(users):,} users, {args.activities * len(users):,} activities, "
+              f"{feed_rows:,} feed rows in {time.perf_counter() - started:.1f}s")
+
+        readers = random.sample(users, args.samples)
+        mismatches = sum(social.feed(user, 20) != social.feed_on_read(user, 20) for user in readers)
+        print(f"feeds identical for {args.samples - mismatches}/{args.samples} sampled readers")
+        print(f"read, fan-out on write: {summary(timed_calls(lambda u: social.feed(u, 20), readers))}")
+        print(f"read, fan-out on read:  {summary(timed_calls(lambda u: social.feed_on_read(u, 20), readers))}")
+
+        def write(actor):
+            social.record_activity(actor, "quiz", "scored 10/10 (random quiz)")
+            db.conn_u.commit()
+
+        regular = random.sample(users[args.celebrities:], min(args.samples, len(users) - args.celebrities))
+        celebrities = [users[i % args.celebrities] for i in range(min(args.samples, 50))]
+        print(f"write, ~{args.following} followers:   {summary(timed_calls(write, regular))}")
+        print(f"write, ~{args.celebrity_followers} followers: {summary(timed_calls(write, celebrities))}")
+        db.close_connections()
+
+
+if __name__ == "__main__":
+    main()
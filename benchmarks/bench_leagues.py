@@ -0,0 +1,64 @@
+# bench_leagues.py – Time the weekly league rollover (finalize, promote/demote, re-deal) on synthetic users
+# Usage: python benchmarks/bench_leagues.py [--users 100000] [--active 0.6]
+import argparse
+import datetime as dt
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from core import DatabaseManager, LeagueManager  # noqa: E402
+
+
+def fill_week(db: DatabaseManager, users: list, week: dt.date, active: float):
+    """One daily_user_stats row per active user and day of the week"""
+    rows = []
+    for day in range(7):
+        date = str(week + dt.timedelta(days=day))
+        rows.extend((user, date, random.randrange(10, 400)) for user in users if random.random() < active)
+    db.conn_u.executemany("INSERT INTO daily_user_stats(username, date, quizzes, points) VALUES(?, ?, 1, ?)", rows)
+    db.conn_u.commit()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weekly league rollover on synthetic users")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--active", type=float, default=0.6, help="Chance a user studies on a given day")
+    parser.add_argument("--weeks", type=int, default=3)
+    args = parser.parse_args()
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = pathlib.Path(workdir)
+        db = DatabaseManager(workdir / "users.db", workdir / "words.db", workdir / "archive")
+        leagues = LeagueManager(db)
+        week = LeagueManager.week_start(dt.date(2025, 1, 6))
+        users = [f"user{i}" for i in range(args.users)]
+        db.conn_u.executemany("INSERT INTO users(username, pwd_hash, last_quiz_date) VALUES(?, '', ?)",
+                              ((user, str(week)) for user in users))
+        db.conn_u.commit()
+        started = time.perf_counter()
+        print(f"first placement: {leagues.run(week)} in {time.perf_counter() - started:.2f}s")
+        for _ in range(args.weeks):
+            rows = fill_week(db, users, week, args.active)
+            week += dt.timedelta(days=7)
+            started = time.perf_counter()
+            detail = leagues.run(week)
+            print(f"rollover to {week} ({rows:,} rollup rows): {time.perf_counter() - started:.2f}s – {detail}")
+        tiers = db.conn_u.execute("""
+            SELECT tier, COUNT(*), COUNT(DISTINCT division) FROM league_members GROUP BY tier
+        """).fetchall()
+        print("tiers (tier, learners, divisions):", tiers)
+        sample = random.sample(users, 1000)
+        started = time.perf_counter()
+        for user in sample:
+            leagues.standings(user)
+        print(f"standings read: {(time.perf_counter() - started) / len(sample) * 1000:.2f}ms per user")
+        db.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4379 @@
+# core.py – Database and domain managers shared by the Streamlit app and the admin CLI
+import sqlite3
+import pathlib
+import datetime as dt
+import pytz
+import time
+import random
+from PyDictionary import PyDictionary
+import bcrypt
+import logging
+import os
+import sys
+import threading
+import urllib.parse
+import zlib
+import json
+import math
+import bisect
+from array import array
+import tempfile
+import gzip
+import shutil
+import numpy as np
+from typing import Optional, List, Tuple, Dict, Callable, Iterator, NamedTuple
+from collections import defaultdict, deque, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from calibration import array_chunks, fit_irt
+from neighbors import PostingsIndex, TfidfModel, top_k_neighbors
+from metrics import REGISTRY, Counter, Histogram, instrument_methods, serve_http, write_textfile
+from tracing import configure_tracing, count_statement, trace_methods
+from workload import capture_methods, configure_capture
+
+# ---------- CONSTANTS ----------
+DB_U = pathlib.Path("users.db")
+DB_W = pathlib.Path("words.db")
+ARCHIVE_DIR = pathlib.Path("archive")
+BACKUP_DIR = pathlib.Path("backups")
+EXPORT_DIR = pathlib.Path("exports")
+QUIZ_LOG_ARCHIVE = "quiz_log.db"
+# quiz_log rows older than this many days move to the cold tier
+QUIZ_LOG_HOT_DAYS = 90
+# Browser sessions untouched for this long lose their server-side quiz/review state
+SESSION_IDLE_SECONDS = 1800
+LEADERBOARD_TTL = 5.0
+PERCENTILE_ALPHA = 0.01
+PERCENTILE_PERSIST_SECONDS = 60.0
+FEED_CAP = 200
+LEAGUE_TIERS = ("Bronze", "Silver", "Gold", "Sapphire", "Ruby", "Diamond")
+LEAGUE_SIZE = 30
+LEAGUE_PROMOTE = 5
+LEAGUE_DEMOTE = 5
+LEAGUE_ACTIVE_DAYS = 28
+IST = pytz.timezone("Asia/Kolkata")
+# Adaptive quiz: ability update rate per answer and target offset (logit 0.85 ≈ 70% success)
+ADAPTIVE_STEP = 0.4
+ADAPTIVE_TARGET_OFFSET = 0.85
+# Prometheus exposition (opt-in): HTTP port on METRICS_ADDR (unset/0 disables) and/or a textfile
+# rewritten every METRICS_INTERVAL seconds
+METRICS_PORT = int(os.environ.get("VOCAB_METRICS_PORT") or 0)
+METRICS_ADDR = os.environ.get("VOCAB_METRICS_ADDR", "127.0.0.1")
+METRICS_FILE = os.environ.get("VOCAB_METRICS_FILE")
+METRICS_INTERVAL = 15.0
+# Span traces per rerun (opt-in via VOCAB_TRACE_FILE): rotating JSONL, sampled plus every rerun
+# slower than TRACE_SLOW_MS
+TRACE_FILE = os.environ.get("VOCAB_TRACE_FILE", "")
+TRACE_SAMPLE_RATE = float(os.environ.get("VOCAB_TRACE_SAMPLE", "0.05"))
+TRACE_SLOW_MS = 500.0
+# Seed for the managers' shared RNG (unset: OS entropy); fix it to make quiz generation reproducible
+RNG_SEED = int(os.environ["VOCAB_SEED"]) if os.environ.get("VOCAB_SEED") else None
+# Directory for daily manager-call captures (calls-<date>.jsonl) replayed by admin_cli.py; unset disables
+CAPTURE_DIR = os.environ.get("VOCAB_CAPTURE_DIR")
+
+# ---------- LOGGING SETUP ----------
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# ---------- CLOCK ----------
+class IstClock:
+    """
+    Current IST date for a long-running process. The date is recomputed only when the
+    wall clock passes the next IST midnight, so today() is a float comparison per call;
+    callbacks registered with on_rollover run once per day change.
+    """
+    def __init__(self):
+        self._today: Optional[dt.date] = None
+        self._rollover_at = 0.0
+        self._callbacks: List[Callable[[dt.date], None]] = []
+        self._lock = threading.Lock()
+
+    def today(self) -> dt.date:
+        if time.time() >= self._rollover_at:
+            self._roll()
+        return self._today
+
+    def seconds_until_rollover(self) -> float:
+        self.today()
+        return max(0.0, self._rollover_at - time.time())
+
+    def on_rollover(self, callback: Callable[[dt.date], None]):
+        self._callbacks.append(callback)
+
+    def _roll(self):
+        with self._lock:
+            now = dt.datetime.now(IST)
+            if now.timestamp() < self._rollover_at:
+                return
+            previous, self._today = self._today, now.date()
+            next_midnight = IST.localize(dt.datetime.combine(self._today + dt.timedelta(days=1), dt.time()))
+            self._rollover_at = next_midnight.timestamp()
+        if previous is not None and previous != self._today:
+            logger.info(f"Day rolled over from {previous} to {self._today}")
+            for callback in self._callbacks:
+                try:
+                    callback(self._today)
+                except Exception as e:
+                    logger.error(f"Error in day rollover callback: {e}")
+
+
+CLOCK = IstClock()
+
+
+def today_ist() -> dt.date:
+    return CLOCK.today()
+
+# ---------- METRICS ----------
+PAGE_RERUN_SECONDS = Histogram(
+    "vocab_page_rerun_seconds", "Streamlit rerun latency per page branch", ("page",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+MANAGER_SECONDS = Histogram(
+    "vocab_manager_method_seconds", "Latency of public manager methods", ("manager", "method"))
+QUIZ_GENERATION_SECONDS = Histogram(
+    "vocab_quiz_generation_seconds", "Time to produce a quiz (pool hit, synchronous build or producer build)",
+    ("quiz_type", "source"))
+SQLITE_COMMITS = Counter("vocab_sqlite_commits_total", "SQLite commits", ("db",))
+SQLITE_COMMIT_SECONDS = Histogram("vocab_sqlite_commit_seconds", "SQLite commit latency", ("db",))
+SQLITE_LOCK_ERRORS = Counter(
+    "vocab_sqlite_lock_errors_total", "Statements or commits failing with 'database is locked/busy'", ("db",))
+
+
+def instrumented(cls: type) -> type:
+    """Time public manager methods into MANAGER_SECONDS, trace them as spans and record them for replay"""
+    return capture_methods(trace_methods(instrument_methods(MANAGER_SECONDS)(cls)))
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection that counts commits, commit latency, lock-wait failures and per-span statements"""
+    db_label = "other"
+    commits = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._after_commit: List[Callable[[], None]] = []
+
+    def after_commit(self, callback: Callable[[], None]):
+        """Run callback once the open transaction commits; a rollback discards it"""
+        self._after_commit.append(callback)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        except sqlite3.OperationalError as e:
+            self._count_lock_error(e)
+            raise
+        self.commits += 1
+        SQLITE_COMMITS.inc(db=self.db_label)
+        SQLITE_COMMIT_SECONDS.observe(time.perf_counter() - started, db=self.db_label)
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._after_commit = []
+        super().rollback()
+
+    def execute(self, *args, **kwargs):
+        count_statement()
+        try:
+            return super().execute(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            self._count_lock_error(e)
+            raise
+
+    def executemany(self, *args, **kwargs):
+        count_statement()
+        try:
+            return super().executemany(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            self._count_lock_error(e)
+            raise
+
+    def executescript(self, *args, **kwargs):
+        count_statement()
+        try:
+            return super().executescript(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            self._count_lock_error(e)
+            raise
+
+    def data_version(self) -> Tuple[int, int]:
+        """Changes whenever this connection commits or another connection commits to the main database"""
+        return self.commits, self.execute("PRAGMA data_version").fetchone()[0]
+
+    def _count_lock_error(self, error: sqlite3.OperationalError):
+        message = str(error)
+        if "locked" in message or "busy" in message:
+            SQLITE_LOCK_ERRORS.inc(db=self.db_label)
+
+
+def register_cache_metrics(cache: str, stats: Callable[[], Dict]):
+    """Expose a cache's stats() dict (hits, misses, hit_ratio, entries/ready) at scrape time"""
+    def collect():
+        values = stats()
+        labels = {'cache': cache}
+        families = [
+            ("vocab_cache_hits_total", "counter", "Cache hits", [(dict(labels), values['hits'])]),
+            ("vocab_cache_misses_total", "counter", "Cache misses", [(dict(labels), values['misses'])]),
+            ("vocab_cache_hit_ratio", "gauge", "Cache hit ratio since start", [(dict(labels), values['hit_ratio'])])
+        ]
+        entries = values.get('entries', values.get('ready'))
+        if entries is not None:
+            families.append(("vocab_cache_entries", "gauge", "Entries held by the cache", [(dict(labels), entries)]))
+        return families
+    REGISTRY.register_collector(f"cache:{cache}", collect)
+
+
+def register_single_flight_metrics(reads: "SingleFlight"):
+    """Expose how shared reads were served: by their own query, by joining one in flight, or from the TTL"""
+    def collect():
+        values = reads.stats()
+        return [("vocab_single_flight_requests_total", "counter", "Shared reads by how they were served",
+                 [({'outcome': outcome}, values[outcome]) for outcome in ('executed', 'coalesced', 'reused')])]
+    REGISTRY.register_collector("single_flight", collect)
+
+
+def register_session_metrics(sessions: "SessionStore"):
+    """Expose live session count, retained state bytes per key and evictions at scrape time"""
+    def collect():
+        stats = sessions.stats()
+        return [
+            ("vocab_sessions", "gauge", "Browser sessions holding server-side state", [({}, stats['sessions'])]),
+            ("vocab_session_state_bytes", "gauge", "Approximate bytes of session state per key",
+             [({'key': key}, size) for key, size in stats['bytes'].items()]),
+            ("vocab_sessions_evicted_total", "counter", "Sessions whose state was evicted after idling",
+             [({}, stats['evicted'])])
+        ]
+    REGISTRY.register_collector("sessions", collect)
+
+
+def start_metrics_exporters():
+    """Start the /metrics HTTP thread and/or the textfile writer configured by environment"""
+    if METRICS_PORT:
+        serve_http(METRICS_PORT, METRICS_ADDR)
+    if METRICS_FILE:
+        write_textfile(METRICS_FILE, METRICS_INTERVAL)
+
+# ---------- SINGLE FLIGHT ----------
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical reads: concurrent callers with the same key wait for one in-flight
+    execution and share its result, which is then reused for `ttl` seconds. Keys should
+    include the data version so a commit never serves an older result. Results are shared
+    between sessions, so callers must treat them as read-only.
+    """
+    def __init__(self, ttl: float = 2.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[Tuple, _Flight] = {}
+        self._results: "OrderedDict[Tuple, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.reused = 0
+
+    def do(self, key: Tuple, fn: Callable[[], object], ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self.requests += 1
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self.reused += 1
+                return cached[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self.executed += 1
+                del self._inflight[key]
+                if flight.error is None and ttl > 0:
+                    self._results[key] = (time.monotonic() + ttl, flight.result)
+                    self._results.move_to_end(key)
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+            flight.done.set()
+        return flight.result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            shared = self.coalesced + self.reused
+            return {
+                'entries': len(self._results),
+                'requests': self.requests,
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'reused': self.reused,
+                'hits': shared,
+                'misses': self.executed,
+                # Share of requests that did not run their own query
+                'hit_ratio': shared / self.requests if self.requests else 0.0
+            }
+
+# ---------- DATABASE MANAGER ----------
+class DatabaseManager:
+    def __init__(self, users_path: pathlib.Path = DB_U, words_path: pathlib.Path = DB_W,
+                 archive_dir: pathlib.Path = ARCHIVE_DIR):
+        self.users_path = users_path
+        self.words_path = words_path
+        self.archive_dir = archive_dir
+        self._conn_u = self.init_user_db()
+        self._conn_w = self.init_word_db()
+        self.dictionary = PyDictionary()
+        # Committed ids only, shared by every session thread
+        self._id_cache: Dict[str, Dict[str, int]] = {}
+        self._id_lock = threading.Lock()
+        # Shared reads that many sessions issue at once (leaderboard, today's challenge)
+        self.reads = SingleFlight()
+        # Per-thread read-only connections installed by use_readers()
+        self._readers = threading.local()
+
+    @property
+    def conn_u(self) -> sqlite3.Connection:
+        return getattr(self._readers, "conn_u", None) or self._conn_u
+
+    @property
+    def conn_w(self) -> sqlite3.Connection:
+        return getattr(self._readers, "conn_w", None) or self._conn_w
+
+    def use_readers(self):
+        """
+        Route the calling thread's conn_u/conn_w to read-only connections of its own, kept for
+        the thread's lifetime. For background threads that only read (quiz pool producers),
+        so their statements never run inside the UI's open transactions.
+        """
+        if getattr(self._readers, "conn_u", None) is not None:
+            return
+        for name, path, label in (("conn_u", self.users_path, "users"), ("conn_w", self.words_path, "words")):
+            conn = sqlite3.connect(f"file:{urllib.parse.quote(str(pathlib.Path(path).resolve()))}?mode=ro",
+                                   uri=True, check_same_thread=False, factory=InstrumentedConnection)
+            conn.db_label = label
+            setattr(self._readers, name, conn)
+
+    @staticmethod
+    def configure_connection(conn: sqlite3.Connection):
+        """WAL lets readers run alongside the writer; incremental auto-vacuum only takes effect on new files"""
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+
+    def init_user_db(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.users_path, check_same_thread=False, factory=InstrumentedConnection)
+        conn.db_label = "users"
+        self.configure_connection(conn)
+        c = conn.cursor()
+        # Enhanced users table
+        c.execute("""CREATE TABLE IF NOT EXISTS users(
+            username TEXT PRIMARY KEY,
+            pwd_hash TEXT NOT NULL,
+            streak INTEGER DEFAULT 0,
+            total_q INTEGER DEFAULT 0,
+            correct INTEGER DEFAULT 0,
+            time_spent REAL DEFAULT 0,
+            last_quiz_date TEXT,
+            points INTEGER DEFAULT 0,
+            level INTEGER DEFAULT 1,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_login TEXT DEFAULT CURRENT_TIMESTAMP,
+            study_streak INTEGER DEFAULT 0,
+            last_study_date TEXT,
+            total_study_time REAL DEFAULT 0
+        )""")
+        # Enhanced quiz log
+        c.execute("""CREATE TABLE IF NOT EXISTS quiz_log(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            date TEXT NOT NULL,
+            quiz_type TEXT NOT NULL,
+            length INTEGER NOT NULL,
+            correct INTEGER NOT NULL,
+            time_spent REAL NOT NULL,
+            accuracy REAL,
+            points_earned INTEGER DEFAULT 0,
+            FOREIGN KEY (username) REFERENCES users(username)
+        )""")
+        # Word-user relationship with spaced repetition data
+        c.execute("""CREATE TABLE IF NOT EXISTS word_user(
+            username TEXT NOT NULL,
+            word TEXT NOT NULL,
+            status TEXT NOT NULL,
+            date TEXT NOT NULL,
+            attempts INTEGER DEFAULT 1,
+            last_seen TEXT DEFAULT CURRENT_TIMESTAMP,
+            next_review TEXT,
+            ease_factor REAL DEFAULT 2.5,
+            interval_days INTEGER DEFAULT 1,
+            repetitions INTEGER DEFAULT 0,
+            first_known TEXT,
+            PRIMARY KEY(username, word),
+            FOREIGN KEY (username) REFERENCES users(username)
+        )""")
+        # Date a word was first answered correctly, so known -> wrong -> known is not new again.
+        # Older files get the column with their current 'known' rows dated by their last status change.
+        if "first_known" not in {row[1] for row in c.execute("PRAGMA table_info(word_user)")}:
+            c.execute("ALTER TABLE word_user ADD COLUMN first_known TEXT")
+            c.execute("UPDATE word_user SET first_known = date WHERE status = 'known'")
+        # Social features
+        c.execute("""CREATE TABLE IF NOT EXISTS follows(
+            follower TEXT NOT NULL,
+            following TEXT NOT NULL,
+            date_followed TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(follower, following),
+            FOREIGN KEY (follower) REFERENCES users(username),
+            FOREIGN KEY (following) REFERENCES users(username)
+        )""")
+        # The primary key serves "who do I follow"; this serves "who follows me"
+        c.execute("CREATE INDEX IF NOT EXISTS idx_follows_following ON follows(following, follower)")
+        # Everything a user did that their followers see, newest last
+        c.execute("""CREATE TABLE IF NOT EXISTS activities(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            actor TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            detail TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )""")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_activities_actor ON activities(actor, id)")
+        # Fan-out-on-write copy of activities per follower, so a feed is one key range
+        c.execute("""CREATE TABLE IF NOT EXISTS activity_feed(
+            username TEXT NOT NULL,
+            activity_id INTEGER NOT NULL,
+            actor TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            detail TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY(username, activity_id)
+        ) WITHOUT ROWID""")
+        # Enhanced achievements
+        c.execute("""CREATE TABLE IF NOT EXISTS user_achievements(
+            username TEXT NOT NULL,
+            achievement TEXT NOT NULL,
+            date_earned TEXT NOT NULL,
+            points_earned INTEGER DEFAULT 0,
+            PRIMARY KEY(username, achievement),
+            FOREIGN KEY (username) REFERENCES users(username)
+        )""")
+        # Daily challenges
+        c.execute("""CREATE TABLE IF NOT EXISTS daily_challenges(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            challenge_type TEXT NOT NULL,
+            target_value INTEGER NOT NULL,
+            reward_points INTEGER DEFAULT 50,
+            description TEXT
+        )""")
+        # Challenge completions
+        c.execute("""CREATE TABLE IF NOT EXISTS challenge_completions(
+            username TEXT NOT NULL,
+            challenge_id INTEGER NOT NULL,
+            completed_date TEXT NOT NULL,
+            points_earned INTEGER DEFAULT 0,
+            PRIMARY KEY(username, challenge_id),
+            FOREIGN KEY (username) REFERENCES users(username),
+            FOREIGN KEY (challenge_id) REFERENCES daily_challenges(id)
+        )""")
+        # Study sessions
+        c.execute("""CREATE TABLE IF NOT EXISTS study_sessions(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            session_type TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            duration REAL,
+            cards_reviewed INTEGER DEFAULT 0,
+            FOREIGN KEY (username) REFERENCES users(username)
+        )""")
+        # Daily per-user rollup of quiz activity (kept in step with quiz_log)
+        c.execute("""CREATE TABLE IF NOT EXISTS daily_user_stats(
+            username TEXT NOT NULL,
+            date TEXT NOT NULL,
+            quizzes INTEGER DEFAULT 0,
+            questions INTEGER DEFAULT 0,
+            correct INTEGER DEFAULT 0,
+            time_spent REAL DEFAULT 0,
+            points INTEGER DEFAULT 0,
+            new_known INTEGER DEFAULT 0,
+            PRIMARY KEY(username, date),
+            FOREIGN KEY (username) REFERENCES users(username)
+        )""")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_quiz_log_user_date ON quiz_log(username, date)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_quiz_log_date ON quiz_log(date)")
+        # Per-user daily progress towards that day's challenge
+        c.execute("""CREATE TABLE IF NOT EXISTS challenge_progress(
+            username TEXT NOT NULL,
+            date TEXT NOT NULL,
+            challenge_id INTEGER NOT NULL,
+            progress REAL DEFAULT 0,
+            PRIMARY KEY(username, date),
+            FOREIGN KEY (username) REFERENCES users(username),
+            FOREIGN KEY (challenge_id) REFERENCES daily_challenges(id)
+        )""")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_daily_challenges_date ON daily_challenges(date)")
+        # Compact integer ids for users and words, used by event tables
+        c.execute("""CREATE TABLE IF NOT EXISTS user_ids(
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE
+        )""")
+        c.execute("""CREATE TABLE IF NOT EXISTS word_ids(
+            id INTEGER PRIMARY KEY,
+            word TEXT NOT NULL UNIQUE
+        )""")
+        # Append-only log of individual quiz answers, partitioned by month (YYYYMM)
+        c.execute("""CREATE TABLE IF NOT EXISTS answer_events(
+            id INTEGER PRIMARY KEY,
+            month INTEGER NOT NULL,
+            quiz_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            word_id INTEGER NOT NULL,
+            chosen_index INTEGER,
+            correct_index INTEGER,
+            is_correct INTEGER NOT NULL,
+            latency_ms INTEGER,
+            answered_at INTEGER NOT NULL
+        )""")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_answer_events_month ON answer_events(month)")
+        # Global per-word answer statistics across all users
+        c.execute("""CREATE TABLE IF NOT EXISTS word_stats(
+            word_id INTEGER PRIMARY KEY,
+            attempts INTEGER DEFAULT 0,
+            correct INTEGER DEFAULT 0,
+            mean_latency_ms REAL,
+            latency_samples INTEGER DEFAULT 0,
+            last_updated TEXT
+        )""")
+        # IRT parameters written by the offline calibration job
+        c.execute("""CREATE TABLE IF NOT EXISTS word_difficulty(
+            word_id INTEGER PRIMARY KEY,
+            difficulty REAL NOT NULL,
+            discrimination REAL DEFAULT 1,
+            answers INTEGER DEFAULT 0,
+            calibrated_at TEXT
+        )""")
+        c.execute("""CREATE TABLE IF NOT EXISTS user_ability(
+            user_id INTEGER PRIMARY KEY,
+            ability REAL NOT NULL,
+            answers INTEGER DEFAULT 0,
+            calibrated_at TEXT
+        )""")
+        # Last exported key per history table (see HistoryExporter)
+        c.execute("""CREATE TABLE IF NOT EXISTS export_watermarks(
+            table_name TEXT PRIMARY KEY,
+            last_key INTEGER NOT NULL,
+            rows INTEGER DEFAULT 0,
+            exported_at TEXT
+        )""")
+        # One row per maintenance job run
+        c.execute("""CREATE TABLE IF NOT EXISTS maintenance_runs(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job TEXT NOT NULL,
+            run_date TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            status TEXT NOT NULL,
+            detail TEXT
+        )""")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_runs_job ON maintenance_runs(job, run_date)")
+        # League division of every active user for the current week (week = its Monday)
+        c.execute("""CREATE TABLE IF NOT EXISTS league_members(
+            username TEXT PRIMARY KEY,
+            week TEXT NOT NULL,
+            tier INTEGER NOT NULL,
+            division INTEGER NOT NULL
+        )""")
+        # Ranked standings per week and division, written by LeagueManager; final once the week is over
+        c.execute("""CREATE TABLE IF NOT EXISTS league_standings(
+            week TEXT NOT NULL,
+            tier INTEGER NOT NULL,
+            division INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            points INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            outcome TEXT NOT NULL,
+            final INTEGER NOT NULL DEFAULT 0,
+            computed_at TEXT NOT NULL,
+            PRIMARY KEY(week, tier, division, username)
+        ) WITHOUT ROWID""")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_league_standings_user ON league_standings(username, week)")
+        # Quiz and study streaks recomputed from history by StreakRepair
+        c.execute("""CREATE TABLE IF NOT EXISTS user_streaks(
+            username TEXT PRIMARY KEY,
+            quiz_current INTEGER NOT NULL,
+            quiz_longest INTEGER NOT NULL,
+            quiz_last_date TEXT,
+            study_current INTEGER NOT NULL,
+            study_longest INTEGER NOT NULL,
+            study_last_date TEXT,
+            updated_at TEXT NOT NULL
+        )""")
+        # Persisted per-metric distributions over learners (see PercentileManager)
+        c.execute("""CREATE TABLE IF NOT EXISTS percentile_sketches(
+            metric TEXT PRIMARY KEY,
+            alpha REAL NOT NULL,
+            sketch TEXT NOT NULL,
+            users INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )""")
+        conn.commit()
+        self.attach_quiz_log_archive(conn, self.archive_dir)
+        return conn
+
+    @staticmethod
+    def attach_quiz_log_archive(conn: sqlite3.Connection, archive_dir: pathlib.Path = ARCHIVE_DIR):
+        """
+        Attach the cold quiz_log tier (see QuizLogTiering) as schema `cold` and expose both
+        tiers through the TEMP VIEW quiz_log_all. Hot-only queries keep using quiz_log.
+        """
+        archive_dir = pathlib.Path(archive_dir)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        conn.execute("ATTACH DATABASE ? AS cold", (str(archive_dir / QUIZ_LOG_ARCHIVE),))
+        conn.execute("PRAGMA cold.journal_mode = WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS cold.quiz_log(
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            date TEXT NOT NULL,
+            quiz_type TEXT NOT NULL,
+            length INTEGER NOT NULL,
+            correct INTEGER NOT NULL,
+            time_spent REAL NOT NULL,
+            accuracy REAL,
+            points_earned INTEGER DEFAULT 0
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS cold.idx_quiz_log_user_date ON quiz_log(username, date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cold.idx_quiz_log_date ON quiz_log(date)")
+        conn.execute("""CREATE TEMP VIEW IF NOT EXISTS quiz_log_all AS
+            SELECT id, username, date, quiz_type, length, correct, time_spent, accuracy, points_earned
+            FROM main.quiz_log
+            UNION ALL
+            SELECT id, username, date, quiz_type, length, correct, time_spent, accuracy, points_earned
+            FROM cold.quiz_log""")
+        conn.commit()
+
+    def init_word_db(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.words_path, check_same_thread=False, factory=InstrumentedConnection)
+        conn.db_label = "words"
+        self.configure_connection(conn)
+        c = conn.cursor()
+        # Enhanced words table
+        c.execute("""CREATE TABLE IF NOT EXISTS words(
+            word TEXT PRIMARY KEY,
+            definition TEXT NOT NULL,
+            pronunciation TEXT,
+            etymology TEXT,
+            example1 TEXT,
+            example2 TEXT,
+            added_by TEXT DEFAULT 'system',
+            date_added TEXT DEFAULT CURRENT_TIMESTAMP,
+            usage_count INTEGER DEFAULT 0,
+            last_used TEXT
+        )""")
+        # Enhanced suggestions
+        c.execute("""CREATE TABLE IF NOT EXISTS suggestions(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            word TEXT NOT NULL,
+            username TEXT NOT NULL,
+            date TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            reviewed_by TEXT,
+            reviewed_date TEXT,
+            notes TEXT
+        )""")
+        # Precomputed semantic neighbours of each word's definition (for distractors)
+        c.execute("""CREATE TABLE IF NOT EXISTS word_neighbors(
+            word TEXT NOT NULL,
+            neighbor TEXT NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY(word, neighbor)
+        )""")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_word_neighbors_score ON word_neighbors(word, score)")
+        # TF-IDF vocabulary the neighbour index was built with
+        c.execute("""CREATE TABLE IF NOT EXISTS tfidf_terms(
+            term TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            idf REAL NOT NULL
+        )""")
+        # Pinned word of the day, so adding words cannot change today's pick
+        c.execute("""CREATE TABLE IF NOT EXISTS word_of_the_day(
+            date TEXT PRIMARY KEY,
+            word TEXT NOT NULL
+        )""")
+        conn.commit()
+        return conn
+
+    def intern_ids(self, table: str, column: str, values: List[str],
+                   conn: Optional[sqlite3.Connection] = None) -> Dict[str, int]:
+        """
+        Map names to compact integer ids from user_ids/word_ids, creating missing ones.
+        Inserts go through `conn` (default conn_u), which the caller commits. Ids read inside
+        an open transaction reach the shared cache only once it commits, so a rollback cannot
+        leave ids behind that a later insert reuses.
+        """
+        conn = conn or self.conn_u
+        with self._id_lock:
+            cache = self._id_cache.setdefault(table, {})
+            known = {value: cache[value] for value in values if value in cache}
+        missing = list({value for value in values if value not in known})
+        if missing:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {table}({column}) VALUES(?)", [(value,) for value in missing]
+            )
+            found = {}
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update({value: row_id for row_id, value in conn.execute(
+                    f"SELECT id, {column} FROM {table} WHERE {column} IN ({placeholders})", chunk
+                ).fetchall()})
+            if not conn.in_transaction:
+                self._cache_ids(table, found)
+            elif isinstance(conn, InstrumentedConnection):
+                conn.after_commit(lambda: self._cache_ids(table, found))
+            known.update(found)
+        return {value: known[value] for value in values}
+
+    def _cache_ids(self, table: str, ids: Dict[str, int]):
+        with self._id_lock:
+            self._id_cache.setdefault(table, {}).update(ids)
+
+    def user_id(self, username: str) -> int:
+        return self.intern_ids("user_ids", "username", [username])[username]
+
+    def word_ids(self, words: List[str]) -> Dict[str, int]:
+        return self.intern_ids("word_ids", "word", words)
+
+    def close_connections(self):
+        """Properly close database connections"""
+        try:
+            self._conn_u.close()
+            self._conn_w.close()
+        except Exception as e:
+            logger.error(f"Error closing connections: {e}")
+
+# ---------- AUTHENTICATION MANAGER ----------
+@instrumented
+class AuthManager:
+    # Passwords must never reach workload captures
+    capture_calls = False
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+        self.ensure_default_users()
+
+    @staticmethod
+    def hash_password(password: str) -> str:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+    @staticmethod
+    def verify_password(password: str, hashed: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+        except Exception as e:
+            logger.error(f"Password verification error: {e}")
+            return False
+
+    def ensure_default_users(self):
+        try:
+            # Create demo user
+            demo_exists = self.db.conn_u.execute("SELECT 1 FROM users WHERE username='demo'").fetchone()
+            if not demo_exists:
+                demo_hash = self.hash_password("demo")
+                self.db.conn_u.execute(
+                    "INSERT INTO users(username, pwd_hash) VALUES(?, ?)", 
+                    ("demo", demo_hash)
+                )
+            # Create admin user
+            admin_exists = self.db.conn_u.execute("SELECT 1 FROM users WHERE username='admin'").fetchone()
+            if not admin_exists:
+                admin_hash = self.hash_password("admin@123")
+                self.db.conn_u.execute(
+                    "INSERT INTO users(username, pwd_hash) VALUES(?, ?)", 
+                    ("admin", admin_hash)
+                )
+            self.db.conn_u.commit()
+        except Exception as e:
+            logger.error(f"Error creating default users: {e}")
+
+    def authenticate(self, username: str, password: str) -> bool:
+        try:
+            user = self.db.conn_u.execute(
+                "SELECT pwd_hash FROM users WHERE username=?", 
+                (username,)
+            ).fetchone()
+            if user and self.verify_password(password, user[0]):
+                # Update last login
+                self.db.conn_u.execute(
+                    "UPDATE users SET last_login=? WHERE username=?",
+                    (str(dt.datetime.now(IST)), username)
+                )
+                self.db.conn_u.commit()
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Authentication error: {e}")
+            return False
+
+    def register(self, username: str, password: str) -> Tuple[bool, str]:
+        try:
+            if not username or not password:
+                return False, "Username and password are required"
+            if len(username) < 3:
+                return False, "Username must be at least 3 characters"
+            if len(password) < 4:
+                return False, "Password must be at least 4 characters"
+            # Check for invalid characters
+            if not username.replace("_", "").replace("-", "").isalnum():
+                return False, "Username can only contain letters, numbers, hyphens, and underscores"
+            existing = self.db.conn_u.execute(
+                "SELECT 1 FROM users WHERE username=?", 
+                (username,)
+            ).fetchone()
+            if existing:
+                return False, "Username already taken"
+            pwd_hash = self.hash_password(password)
+            self.db.conn_u.execute(
+                "INSERT INTO users(username, pwd_hash) VALUES(?, ?)",
+                (username, pwd_hash)
+            )
+            self.db.conn_u.commit()
+            return True, "Account created successfully"
+        except Exception as e:
+            logger.error(f"Registration error: {e}")
+            return False, "Registration failed"
+
+# ---------- WORD DETAIL CACHE ----------
+class WordRecord(NamedTuple):
+    """Immutable word details row (a tuple, so no per-instance __dict__)"""
+    word: str
+    definition: str
+    pronunciation: str
+    example1: str
+    example2: str
+    etymology: str
+
+
+class WordDetailCache:
+    """Process-wide bounded LRU of word details, cleared when the vocabulary version changes"""
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries: "OrderedDict[str, WordRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, word: str, version: int) -> Optional[WordRecord]:
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            record = self._entries.get(word)
+            if record is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(word)
+            self.hits += 1
+            return record
+
+    def put(self, record: WordRecord, version: int):
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[record.word] = record
+            self._entries.move_to_end(record.word)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+# ---------- VOCABULARY SNAPSHOT ----------
+class VocabularySnapshot:
+    """Immutable columnar copy of the vocabulary, shared by reference across sessions"""
+    __slots__ = ("version", "ids", "words", "definitions", "pronunciations", "positions", "by_definition")
+
+    def __init__(self, version: int, ids: List[int], words: List[str],
+                 definitions: List[str], pronunciations: List[str]):
+        self.version = version
+        self.ids = array("l", ids)
+        self.words = tuple(words)
+        self.definitions = tuple(definitions)
+        self.pronunciations = tuple(pronunciations)
+        self.positions = {word: position for position, word in enumerate(self.words)}
+        # First word carrying each definition, so session state can refer to options by position
+        self.by_definition: Dict[str, int] = {}
+        for position, definition in enumerate(self.definitions):
+            self.by_definition.setdefault(definition, position)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def sample(self, count: int, exclude: Optional[set] = None,
+               rng: Optional[random.Random] = None) -> List[int]:
+        """Random distinct positions, skipping words in `exclude`"""
+        rng = rng or random
+        n = len(self.words)
+        if not exclude:
+            return rng.sample(range(n), min(count, n))
+        if count + len(exclude) <= n // 2:
+            # Rejection sampling: at least half the draws land on a free position, so this is
+            # O(count) expected instead of a full O(n) permutation per call
+            picks, chosen = [], set()
+            while len(picks) < count:
+                position = rng.randrange(n)
+                if position not in chosen and self.words[position] not in exclude:
+                    chosen.add(position)
+                    picks.append(position)
+            return picks
+        picks = []
+        for position in rng.sample(range(n), n):
+            if self.words[position] not in exclude:
+                picks.append(position)
+                if len(picks) == count:
+                    break
+        return picks
+
+    def sample_words(self, count: int, exclude: Optional[set] = None,
+                     rng: Optional[random.Random] = None) -> List[str]:
+        return [self.words[position] for position in self.sample(count, exclude, rng)]
+
+    def word_of_the_day(self, date: dt.date) -> Optional[int]:
+        """Position of the date's word; stable for a given date and vocabulary"""
+        if not self.words:
+            return None
+        return zlib.crc32(str(date).encode()) % len(self.words)
+
+
+class VocabularyStore:
+    """Holds the current snapshot; publish() builds a new one and swaps the reference atomically"""
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+        self._current: Optional[VocabularySnapshot] = None
+        self._publish_lock = threading.RLock()
+
+    @property
+    def current(self) -> VocabularySnapshot:
+        snapshot = self._current
+        if snapshot is None:
+            with self._publish_lock:
+                snapshot = self._current or self.publish()
+        return snapshot
+
+    def publish(self, version: Optional[int] = None) -> VocabularySnapshot:
+        """
+        Load the vocabulary into a new snapshot; readers keep the old one until the swap.
+        Runs lazily on whichever thread first needs a snapshot (pool producers included), so it
+        reads and interns ids on its own connections and never commits the shared conn_u.
+        """
+        with self._publish_lock:
+            conn_w = sqlite3.connect(self.db.words_path)
+            conn_u = sqlite3.connect(self.db.users_path)
+            try:
+                if version is None:
+                    version = conn_w.execute("PRAGMA user_version").fetchone()[0]
+                rows = conn_w.execute(
+                    "SELECT word, definition, COALESCE(pronunciation, '') FROM words ORDER BY word"
+                ).fetchall()
+                words = [word for word, _, _ in rows]
+                word_ids = self.db.intern_ids("word_ids", "word", words, conn=conn_u)
+                conn_u.commit()
+            finally:
+                conn_w.close()
+                conn_u.close()
+            snapshot = VocabularySnapshot(version, [word_ids[word] for word in words], words,
+                                          [definition for _, definition, _ in rows],
+                                          [pronunciation for _, _, pronunciation in rows])
+            self._current = snapshot
+            logger.info(f"Published vocabulary snapshot v{version} ({len(snapshot)} words)")
+            return snapshot
+
+# ---------- WORD MANAGER ----------
+@instrumented
+class WordManager:
+    def __init__(self, db_manager: DatabaseManager, neighbor_index: Optional["NeighborIndexManager"] = None):
+        self.db = db_manager
+        self.neighbor_index = neighbor_index
+        self.detail_cache = WordDetailCache()
+        self.vocabulary = VocabularyStore(db_manager)
+        self._word_of_the_day: Optional[Tuple[str, Optional[str]]] = None
+        # Vocabulary version, persisted in words.db (PRAGMA user_version) so other processes see bumps
+        self.vocab_version = self.db.conn_w.execute("PRAGMA user_version").fetchone()[0]
+
+    def bump_vocab_version(self, publish: bool = True) -> int:
+        """
+        Mark the vocabulary as changed so cached word details are dropped and, unless
+        a bulk import will publish once at the end, publish a new snapshot.
+        The read and write of user_version share one write transaction, so concurrent
+        bumps from other processes are never lost.
+        """
+        conn = self.db.conn_w
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0] + 1
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self.vocab_version = version
+        if publish:
+            self.vocabulary.publish(version)
+        return version
+
+    def refresh_vocab_version(self) -> int:
+        """Adopt a version bumped by another process (admin CLI import), publishing its snapshot"""
+        stored = self.db.conn_w.execute("PRAGMA user_version").fetchone()[0]
+        if stored != self.vocab_version:
+            self.vocab_version = stored
+            self.vocabulary.publish(stored)
+        return stored
+
+    def add_word(self, word: str, added_by: str = "admin") -> str:
+        word = word.lower().strip()
+        if not word or len(word) < 2:
+            return "Invalid word"
+        if self.db.conn_w.execute("SELECT 1 FROM words WHERE word=?", (word,)).fetchone():
+            return "Word already exists"
+        try:
+            # Get word information with better error handling
+            definition_text, pronunciation, examples = self.lookup_word(word)
+            # Insert word
+            self.db.conn_w.execute("""
+                INSERT INTO words(word, definition, pronunciation, etymology, example1, example2, added_by, date_added)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                word, definition_text, pronunciation, "",
+                examples[0] if examples else "",
+                examples[1] if len(examples) > 1 else "",
+                added_by, str(today_ist())
+            ))
+            self.db.conn_w.commit()
+            self.bump_vocab_version()
+            if self.neighbor_index:
+                self.neighbor_index.add_word(word, definition_text)
+            return "Word added successfully"
+        except Exception as e:
+            logger.error(f"Error adding word '{word}': {e}")
+            return f"Error adding word: {str(e)}"
+
+    def lookup_word(self, word: str) -> Tuple[str, str, List[str]]:
+        """Definition, pronunciation and up to two examples from the online dictionary"""
+        definition_text = "No definition available"
+        pronunciation = ""
+        examples = []
+        try:
+            meanings = self.db.dictionary.meaning(word)
+            if meanings:
+                definition_parts = []
+                for part_of_speech, definitions in meanings.items():
+                    for definition in definitions[:2]:  # Limit to 2 definitions per part
+                        definition_parts.append(f"{part_of_speech}: {definition}")
+                definition_text = "; ".join(definition_parts)
+        except Exception as e:
+            logger.warning(f"Failed to get definition for '{word}': {e}")
+        try:
+            pronunciation = self.db.dictionary.phonetic(word) or ""
+        except Exception as e:
+            logger.warning(f"Failed to get pronunciation for '{word}': {e}")
+        try:
+            sentences = self.db.dictionary.sentence(word)
+            if sentences:
+                examples = sentences[:2]
+        except Exception as e:
+            logger.warning(f"Failed to get examples for '{word}': {e}")
+        return definition_text, pronunciation, examples
+
+    def import_words(self, rows: Iterator[Dict], added_by: str = "admin", batch_size: int = 500,
+                     progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        Bulk insert words, one transaction per batch. Rows without a definition are looked
+        up in the dictionary. The vocabulary version is bumped once at the end; rebuild
+        the neighbour index afterwards instead of indexing word by word.
+        Returns the number of new words.
+        """
+        inserted = 0
+        seen = 0
+        batch = []
+
+        def flush():
+            nonlocal inserted
+            before = self.db.conn_w.total_changes
+            self.db.conn_w.executemany("""
+                INSERT OR IGNORE INTO words(word, definition, pronunciation, etymology, example1, example2,
+                                            added_by, date_added)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+            self.db.conn_w.commit()
+            inserted += self.db.conn_w.total_changes - before
+            batch.clear()
+
+        for row in rows:
+            seen += 1
+            word = (row.get('word') or "").lower().strip()
+            if len(word) < 2:
+                continue
+            definition = row.get('definition') or ""
+            pronunciation = row.get('pronunciation') or ""
+            examples = [row.get('example1') or "", row.get('example2') or ""]
+            if not definition:
+                if self.db.conn_w.execute("SELECT 1 FROM words WHERE word=?", (word,)).fetchone():
+                    continue
+                definition, looked_up_pronunciation, looked_up_examples = self.lookup_word(word)
+                pronunciation = pronunciation or looked_up_pronunciation
+                examples = (looked_up_examples + ["", ""])[:2]
+            batch.append((word, definition, pronunciation, row.get('etymology') or "",
+                          examples[0], examples[1], added_by, str(today_ist())))
+            if len(batch) >= batch_size:
+                flush()
+                if progress:
+                    progress(seen, inserted)
+        if batch:
+            flush()
+        if progress:
+            progress(seen, inserted)
+        if inserted:
+            self.bump_vocab_version()
+        return inserted
+
+    def get_word_details(self, word: str) -> Optional[Dict]:
+        version = self.refresh_vocab_version()
+        record = self.detail_cache.get(word, version)
+        if record is not None:
+            return record._asdict()
+        try:
+            result = self.db.conn_w.execute("""
+                SELECT word, definition, pronunciation, example1, example2, etymology
+                FROM words WHERE word=?
+            """, (word,)).fetchone()
+            if result:
+                record = WordRecord(*(value if value is not None else "" for value in result))
+                self.detail_cache.put(record, version)
+                return record._asdict()
+            return None
+        except Exception as e:
+            logger.error(f"Error getting word details for '{word}': {e}")
+            return None
+
+    def update_word_usage(self, word: str):
+        """Update word usage statistics"""
+        try:
+            self.db.conn_w.execute("""
+                UPDATE words 
+                SET usage_count = usage_count + 1, last_used = ?
+                WHERE word = ?
+            """, (str(today_ist()), word))
+            self.db.conn_w.commit()
+        except Exception as e:
+            logger.error(f"Error updating word usage for '{word}': {e}")
+
+    def pregenerate_word_of_the_day(self, days: int = 7) -> int:
+        """Pin the word of the day for today and the following days; existing picks are kept"""
+        try:
+            vocabulary = self.vocabulary.current
+            start = today_ist()
+            rows = []
+            for offset in range(days):
+                date = start + dt.timedelta(days=offset)
+                position = vocabulary.word_of_the_day(date)
+                if position is not None:
+                    rows.append((str(date), vocabulary.words[position]))
+            before = self.db.conn_w.total_changes
+            self.db.conn_w.executemany("INSERT OR IGNORE INTO word_of_the_day(date, word) VALUES(?, ?)", rows)
+            self.db.conn_w.commit()
+            return self.db.conn_w.total_changes - before
+        except Exception as e:
+            logger.error(f"Error pre-generating word of the day: {e}")
+            return 0
+
+    def word_of_the_day(self) -> Optional[str]:
+        """Today's pinned word, pinning it now if the nightly job has not run"""
+        today = str(today_ist())
+        cached = self._word_of_the_day
+        if cached and cached[0] == today:
+            return cached[1]
+        query = "SELECT word FROM word_of_the_day WHERE date=?"
+        row = self.db.conn_w.execute(query, (today,)).fetchone()
+        if row is None:
+            self.pregenerate_word_of_the_day(days=1)
+            row = self.db.conn_w.execute(query, (today,)).fetchone()
+        word = row[0] if row else None
+        self._word_of_the_day = (today, word)
+        return word
+
+# ---------- SEMANTIC NEIGHBOR INDEX ----------
+@instrumented
+class NeighborIndexManager:
+    """TF-IDF nearest neighbours of each definition, used to pick plausible distractors"""
+    def __init__(self, db_manager: DatabaseManager, k: int = 10, rng: Optional[random.Random] = None):
+        self.db = db_manager
+        self.k = k
+        self.rng = rng or random.Random()
+        self._model: Optional[TfidfModel] = None
+        # Sparse rows of every indexed definition and the highest words.rowid they cover
+        self._postings: Optional[PostingsIndex] = None
+        self._indexed_rowid = 0
+        # Per postings row, a lower bound on the score that enters its full neighbour list (0: not full)
+        self._floor = np.zeros(0, dtype=np.float32)
+
+    def build(self, block_size: int = 512, max_features: int = 2048,
+              log: Optional[Callable[[str], None]] = None) -> int:
+        """Offline job: rebuild the TF-IDF model and the whole neighbour table"""
+        try:
+            started = time.time()
+            rows = self.db.conn_w.execute("SELECT word, definition FROM words ORDER BY word").fetchall()
+            words = [word for word, _ in rows]
+            model = TfidfModel.fit([definition for _, definition in rows], max_features=max_features)
+            vectors = model.transform([definition for _, definition in rows])
+            if log:
+                log(f"vectorized {len(words):,} definitions over {len(model.terms):,} terms")
+            indices, scores = top_k_neighbors(vectors, self.k, block_size)
+            self.db.conn_w.execute("DELETE FROM word_neighbors")
+            self.db.conn_w.executemany("""
+                INSERT INTO word_neighbors(word, neighbor, score) VALUES(?, ?, ?)
+            """, ((words[row], words[indices[row, rank]], float(scores[row, rank]))
+                  for row in range(len(words)) for rank in range(indices.shape[1])
+                  if scores[row, rank] > 0))
+            self.db.conn_w.execute("DELETE FROM tfidf_terms")
+            self.db.conn_w.executemany("""
+                INSERT INTO tfidf_terms(term, position, idf) VALUES(?, ?, ?)
+            """, ((term, position, float(model.idf[position])) for term, position in model.terms.items()))
+            self.db.conn_w.commit()
+            self._model = model
+            self._postings = None
+            logger.info(f"Built neighbour index for {len(words)} words in {time.time() - started:.1f}s")
+            return len(words)
+        except Exception as e:
+            self.db.conn_w.rollback()
+            logger.error(f"Error building neighbour index: {e}")
+            return 0
+
+    def load_model(self) -> Optional[TfidfModel]:
+        """Load the stored TF-IDF vocabulary, or None if the index was never built"""
+        if self._model is None:
+            rows = self.db.conn_w.execute("SELECT term, position, idf FROM tfidf_terms ORDER BY position").fetchall()
+            if rows:
+                self._model = TfidfModel({term: position for term, position, _ in rows},
+                                         np.array([idf for _, _, idf in rows]))
+        return self._model
+
+    def _sync_postings(self, model: TfidfModel) -> PostingsIndex:
+        """Postings of every stored definition, catching up on words inserted since the last call"""
+        fresh = self._postings is None or self._postings.model is not model
+        if fresh:
+            self._postings = PostingsIndex(model)
+            self._indexed_rowid = 0
+        for rowid, word, definition in self.db.conn_w.execute("""
+            SELECT rowid, word, definition FROM words WHERE rowid > ? ORDER BY rowid
+        """, (self._indexed_rowid,)).fetchall():
+            self._postings.add(word, definition)
+            self._indexed_rowid = rowid
+        if fresh:
+            self._floor = np.zeros(len(self._postings), dtype=np.float32)
+            for word, weakest in self.db.conn_w.execute("""
+                SELECT word, MIN(score) FROM word_neighbors GROUP BY word HAVING COUNT(*) >= ?
+            """, (self.k,)).fetchall():
+                if word in self._postings.rows:
+                    self._floor[self._postings.rows[word]] = weakest
+        elif len(self._floor) < len(self._postings):
+            self._floor = np.concatenate([self._floor, np.zeros(len(self._postings) - len(self._floor),
+                                                                dtype=np.float32)])
+        return self._postings
+
+    def add_word(self, word: str, definition: str) -> int:
+        """
+        Incrementally index a newly inserted word: score its sparse TF-IDF row against the
+        in-memory postings of the existing vocabulary (stored IDF weights, no refit), then
+        splice the new word into the lists of existing words it now beats
+        """
+        try:
+            model = self.load_model()
+            if model is None:
+                return 0
+            postings = self._sync_postings(model)
+            sims = postings.scores(definition)
+            keys = postings.keys
+            if word in postings.rows:
+                sims[postings.rows[word]] = 0
+            related = np.flatnonzero(sims > 0)
+            if not len(related):
+                return 0
+            top = related[np.argsort(-sims[related], kind="stable")[:self.k]]
+            self.db.conn_w.executemany("""
+                INSERT OR REPLACE INTO word_neighbors(word, neighbor, score) VALUES(?, ?, ?)
+            """, [(word, keys[i], float(sims[i])) for i in top])
+            # Only lists whose entry bar the new word may clear are read back and checked
+            candidates = related[sims[related] > self._floor[related]]
+            lists = {}
+            for start in range(0, len(candidates), 500):
+                chunk = [keys[i] for i in candidates[start:start + 500]]
+                lists.update({other: (count, weakest) for other, count, weakest in self.db.conn_w.execute(f"""
+                    SELECT word, COUNT(*), MIN(score) FROM word_neighbors
+                    WHERE word IN ({",".join("?" * len(chunk))}) GROUP BY word
+                """, chunk).fetchall()})
+            spliced, evicted, floors = [], [], []
+            for i in candidates:
+                other = keys[i]
+                count, weakest = lists.get(other, (0, 0.0))
+                if count < self.k or sims[i] > weakest:
+                    spliced.append((other, word, float(sims[i])))
+                    if count >= self.k:
+                        evicted.append((other, other))
+                    elif count + 1 == self.k:
+                        floors.append((i, min(weakest, sims[i]) if count else sims[i]))
+                elif count >= self.k:
+                    floors.append((i, weakest))
+            self.db.conn_w.executemany("""
+                INSERT OR REPLACE INTO word_neighbors(word, neighbor, score) VALUES(?, ?, ?)
+            """, spliced)
+            self.db.conn_w.executemany("""
+                DELETE FROM word_neighbors WHERE word = ? AND neighbor = (
+                    SELECT neighbor FROM word_neighbors WHERE word = ? ORDER BY score ASC LIMIT 1
+                )
+            """, evicted)
+            self.db.conn_w.commit()
+            if len(top) >= self.k and word in postings.rows:
+                floors.append((postings.rows[word], sims[top[-1]]))
+            for i, floor in floors:
+                self._floor[i] = floor
+            return len(spliced)
+        except Exception as e:
+            self.db.conn_w.rollback()
+            logger.error(f"Error indexing neighbours for '{word}': {e}")
+            return 0
+
+    def get_distractors(self, word: str, correct_def: str, count: int = 3) -> List[str]:
+        """Definitions of semantically close words, sampled from the strongest neighbours"""
+        try:
+            candidates = [definition for definition, in self.db.conn_w.execute("""
+                SELECT w.definition FROM word_neighbors n JOIN words w ON w.word = n.neighbor
+                WHERE n.word = ? AND w.definition != ?
+                ORDER BY n.score DESC LIMIT ?
+            """, (word, correct_def, count * 2)).fetchall()]
+            return self.rng.sample(candidates, min(count, len(candidates)))
+        except Exception as e:
+            logger.error(f"Error getting distractors for '{word}': {e}")
+            return []
+
+# ---------- SPACED REPETITION SYSTEM ----------
+@instrumented
+class SpacedRepetitionManager:
+    def __init__(self, db_manager: DatabaseManager, gamification_manager=None):
+        self.db = db_manager
+        self.gamification = gamification_manager
+
+    def calculate_next_review(self, ease_factor: float, interval_days: int, repetitions: int, quality: int) -> Tuple[int, float, int]:
+        """
+        Calculate next review interval using SM-2 algorithm
+        quality: 0-5 (0=total blackout, 5=perfect response)
+        """
+        repetitions += 1
+        if quality < 3:
+            # Reset if quality is poor
+            repetitions = 0
+            interval_days = 1
+        else:
+            if repetitions <= 2:
+                interval_days = 1 if repetitions == 1 else 6
+            else:
+                interval_days = int(interval_days * ease_factor)
+        # Update ease factor
+        ease_factor = ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        ease_factor = max(1.3, ease_factor)  # Minimum ease factor
+        return interval_days, ease_factor, repetitions
+
+    def update_word_memory(self, username: str, word: str, quality: int):
+        """Update spaced repetition data for a word"""
+        try:
+            # Get current data
+            result = self.db.conn_u.execute("""
+                SELECT ease_factor, interval_days, repetitions
+                FROM word_user
+                WHERE username = ? AND word = ?
+            """, (username, word)).fetchone()
+            if result:
+                ease_factor, interval_days, repetitions = result
+            else:
+                ease_factor, interval_days, repetitions = 2.5, 1, 0
+            # Calculate next review
+            new_interval, new_ease, new_repetitions = self.calculate_next_review(
+                ease_factor, interval_days, repetitions, quality
+            )
+            # Calculate next review date
+            next_review_date = today_ist() + dt.timedelta(days=new_interval)
+            # Update database
+            self.db.conn_u.execute("""
+                UPDATE word_user
+                SET ease_factor = ?, interval_days = ?, repetitions = ?, 
+                    next_review = ?, last_seen = ?
+                WHERE username = ? AND word = ?
+            """, (new_ease, new_interval, new_repetitions, 
+                  str(next_review_date), str(today_ist()), username, word))
+            self.db.conn_u.commit()
+        except Exception as e:
+            logger.error(f"Error updating word memory: {e}")
+
+    def get_due_words(self, username: str, limit: int = 20) -> List[str]:
+        """Get words due for review"""
+        try:
+            result = self.db.conn_u.execute("""
+                SELECT word FROM word_user
+                WHERE username = ? AND status = 'known'
+                AND (next_review IS NULL OR next_review <= ?)
+                ORDER BY last_seen ASC
+                LIMIT ?
+            """, (username, str(today_ist()), limit)).fetchall()
+            return [word for word, in result]
+        except Exception as e:
+            logger.error(f"Error getting due words: {e}")
+            return []
+
+    def log_study_session(self, username: str, session_type: str, start_time: float, cards_reviewed: int):
+        """Record a finished study session and count it towards today's challenge"""
+        try:
+            end_time = time.time()
+            duration = max(end_time - start_time, 0)
+            self.db.conn_u.execute("""
+                INSERT INTO study_sessions(username, session_type, start_time, end_time, duration, cards_reviewed)
+                VALUES(?, ?, ?, ?, ?, ?)
+            """, (username, session_type,
+                  dt.datetime.fromtimestamp(start_time, IST).strftime('%Y-%m-%d %H:%M:%S'),
+                  dt.datetime.fromtimestamp(end_time, IST).strftime('%Y-%m-%d %H:%M:%S'),
+                  duration, cards_reviewed))
+            today = today_ist()
+            self.db.conn_u.execute("""
+                UPDATE users SET total_study_time = total_study_time + ?,
+                    study_streak = CASE last_study_date WHEN ? THEN study_streak
+                                                        WHEN ? THEN study_streak + 1
+                                                        ELSE 1 END,
+                    last_study_date = ?
+                WHERE username = ?
+            """, (duration, str(today), str(today - dt.timedelta(days=1)), str(today), username))
+            if self.gamification:
+                self.gamification.record_challenge_progress(username, 'study_time', duration)
+            self.db.conn_u.commit()
+        except Exception as e:
+            logger.error(f"Error logging study session: {e}")
+
+# ---------- GAMIFICATION MANAGER ----------
+@instrumented
+class GamificationManager:
+    def __init__(self, db_manager: DatabaseManager, rng: Optional[random.Random] = None):
+        self.db = db_manager
+        self.rng = rng or random.Random()
+        self.achievements_config = {
+            # Points-based achievements
+            "🥉 First Century": {"type": "points", "threshold": 100, "points": 50},
+            "🥈 Half Millennium": {"type": "points", "threshold": 500, "points": 100},
+            "🥇 Millennium Master": {"type": "points", "threshold": 1000, "points": 200},
+            "💎 Point Collector": {"type": "points", "threshold": 2000, "points": 300},
+            "🚀 Sky High": {"type": "points", "threshold": 5000, "points": 500},
+            # Streak achievements
+            "🔥 Week Streak": {"type": "streak", "threshold": 7, "points": 70},
+            "⭐ Monthly Master": {"type": "streak", "threshold": 30, "points": 300},
+            "👑 Century Streak": {"type": "streak", "threshold": 100, "points": 1000},
+            # Knowledge achievements
+            "📚 Vocabulary Builder": {"type": "known", "threshold": 50, "points": 100},
+            "🎓 Word Scholar": {"type": "known", "threshold": 200, "points": 300},
+            "🧠 Lexicon Legend": {"type": "known", "threshold": 500, "points": 500},
+            "📖 Dictionary Master": {"type": "known", "threshold": 1000, "points": 1000},
+            # Quiz achievements
+            "🎯 Perfect Score": {"type": "perfect_quiz", "threshold": 1, "points": 50},
+            "⚡ Speed Demon": {"type": "fast_quiz", "threshold": 1, "points": 30},
+            "📊 Quiz Master": {"type": "total_quizzes", "threshold": 50, "points": 200},
+            "🏃 Marathon Runner": {"type": "total_quizzes", "threshold": 100, "points": 400},
+            # Study achievements
+            "📝 Dedicated Learner": {"type": "study_time", "threshold": 3600, "points": 150},  # 1 hour
+            "⏰ Time Master": {"type": "study_time", "threshold": 18000, "points": 500},  # 5 hours
+            # Social achievements
+            "👥 Social Butterfly": {"type": "followers", "threshold": 5, "points": 100},
+            "🌟 Influencer": {"type": "followers", "threshold": 20, "points": 300},
+        }
+        self.challenge_templates = [
+            {"type": "quiz_words", "target": 20, "reward": 100, "desc": "Complete a 20-word quiz"},
+            {"type": "perfect_quiz", "target": 1, "reward": 150, "desc": "Get 100% on any quiz"},
+            {"type": "study_time", "target": 1800, "reward": 80, "desc": "Study for 30 minutes"},
+            {"type": "learn_new", "target": 10, "reward": 120, "desc": "Learn 10 new words"},
+        ]
+        # Per-user value for each challenge type on a given date (bound to one `date` parameter)
+        self.challenge_sources = {
+            "quiz_words": "SELECT username, questions AS value FROM daily_user_stats WHERE date = ?",
+            "learn_new": "SELECT username, new_known AS value FROM daily_user_stats WHERE date = ?",
+            "perfect_quiz": """SELECT username, COUNT(*) AS value FROM quiz_log
+                               WHERE date = ? AND accuracy = 100 GROUP BY username""",
+            "study_time": """SELECT username, SUM(duration) AS value FROM study_sessions
+                             WHERE DATE(start_time) = ? GROUP BY username""",
+        }
+        self._challenge_cache: Dict[str, Optional[Dict]] = {}
+
+    def calculate_level(self, points: int) -> int:
+        return min(int(points / 100) + 1, 50)
+
+    def get_level_progress(self, points: int) -> Tuple[int, int, float]:
+        level = self.calculate_level(points)
+        next_threshold = level * 100
+        current_progress = points % 100 if points % 100 != 0 else 100
+        progress_ratio = current_progress / 100
+        return level, next_threshold, progress_ratio
+
+    def award_achievements(self, username: str) -> List[str]:
+        try:
+            # Get comprehensive user stats
+            user_stats = self.db.conn_u.execute("""
+                SELECT points, streak, correct, total_q, total_study_time
+                FROM users WHERE username=?
+            """, (username,)).fetchone()
+            if not user_stats:
+                return []
+            points, streak, known_words, total_quizzes, study_time = user_stats
+            # Get followers count
+            followers_count = len(self.db.conn_u.execute(
+                "SELECT follower FROM follows WHERE following=?", 
+                (username,)
+            ).fetchall())
+            # Get existing achievements
+            existing = {ach for ach, in self.db.conn_u.execute(
+                "SELECT achievement FROM user_achievements WHERE username=?", 
+                (username,)
+            ).fetchall()}
+            new_achievements = []
+            for achievement, config in self.achievements_config.items():
+                if achievement in existing:
+                    continue
+                should_award = False
+                if config["type"] == "points" and points >= config["threshold"]:
+                    should_award = True
+                elif config["type"] == "streak" and streak >= config["threshold"]:
+                    should_award = True
+                elif config["type"] == "known" and known_words >= config["threshold"]:
+                    should_award = True
+                elif config["type"] == "total_quizzes" and total_quizzes >= config["threshold"]:
+                    should_award = True
+                elif config["type"] == "study_time" and study_time >= config["threshold"]:
+                    should_award = True
+                elif config["type"] == "followers" and followers_count >= config["threshold"]:
+                    should_award = True
+                if should_award:
+                    self.db.conn_u.execute("""
+                        INSERT INTO user_achievements(username, achievement, date_earned, points_earned)
+                        VALUES(?, ?, ?, ?)
+                    """, (username, achievement, str(today_ist()), config["points"]))
+                    # Add bonus points
+                    self.db.conn_u.execute(
+                        "UPDATE users SET points = points + ? WHERE username = ?",
+                        (config["points"], username)
+                    )
+                    SocialManager(self.db).record_activity(username, "achievement", f"earned {achievement}")
+                    new_achievements.append(achievement)
+            if new_achievements:
+                self.db.conn_u.commit()
+            return new_achievements
+        except Exception as e:
+            logger.error(f"Error awarding achievements: {e}")
+            return []
+
+    def pregenerate_challenges(self, days: int = 7) -> int:
+        """Create challenges for today and the following days that don't have one yet"""
+        try:
+            dates = [str(today_ist() + dt.timedelta(days=offset)) for offset in range(days)]
+            existing = {date for date, in self.db.conn_u.execute("""
+                SELECT date FROM daily_challenges WHERE date >= ? AND date <= ?
+            """, (dates[0], dates[-1])).fetchall()}
+            created = 0
+            for date in dates:
+                if date in existing:
+                    continue
+                challenge = self.rng.choice(self.challenge_templates)
+                self.db.conn_u.execute("""
+                    INSERT INTO daily_challenges(date, challenge_type, target_value, reward_points, description)
+                    VALUES(?, ?, ?, ?, ?)
+                """, (date, challenge["type"], challenge["target"],
+                      challenge["reward"], challenge["desc"]))
+                created += 1
+            if created:
+                self.db.conn_u.commit()
+            return created
+        except Exception as e:
+            logger.error(f"Error pre-generating daily challenges: {e}")
+            return 0
+
+    def create_daily_challenge(self) -> bool:
+        """Create daily challenge if it doesn't exist for today"""
+        return self.pregenerate_challenges(days=1) > 0
+
+    def get_daily_challenge(self) -> Optional[Dict]:
+        """Get today's challenge (cached per day)"""
+        today = str(today_ist())
+        if today in self._challenge_cache:
+            return self._challenge_cache[today]
+        try:
+            # Every session misses at once when the day rolls over; let them share one query
+            result = self.db.reads.do(
+                ('daily_challenge', today, self.db.conn_u.data_version()),
+                lambda: self.db.conn_u.execute("""
+                    SELECT id, challenge_type, target_value, reward_points, description
+                    FROM daily_challenges WHERE date=?
+                """, (today,)).fetchone())
+            if result:
+                challenge = {
+                    'id': result[0],
+                    'type': result[1],
+                    'target': result[2],
+                    'reward': result[3],
+                    'description': result[4]
+                }
+                self._challenge_cache = {today: challenge}
+                return challenge
+            return None
+        except Exception as e:
+            logger.error(f"Error getting daily challenge: {e}")
+            return None
+
+    def get_challenge_status(self, username: str) -> Optional[Dict]:
+        """Get today's challenge with the user's progress and completion in one lookup"""
+        try:
+            query = """
+                SELECT c.id, c.challenge_type, c.target_value, c.reward_points, c.description,
+                       COALESCE(p.progress, 0), cc.completed_date
+                FROM daily_challenges c
+                LEFT JOIN challenge_progress p ON p.username = ? AND p.date = c.date
+                LEFT JOIN challenge_completions cc ON cc.username = ? AND cc.challenge_id = c.id
+                WHERE c.date = ?
+                LIMIT 1
+            """
+            params = (username, username, str(today_ist()))
+            result = self.db.conn_u.execute(query, params).fetchone()
+            if not result and self.pregenerate_challenges():
+                result = self.db.conn_u.execute(query, params).fetchone()
+            if result:
+                return {
+                    'id': result[0],
+                    'type': result[1],
+                    'target': result[2],
+                    'reward': result[3],
+                    'description': result[4],
+                    'progress': result[5],
+                    'completed': result[6] is not None
+                }
+            return None
+        except Exception as e:
+            logger.error(f"Error getting challenge status: {e}")
+            return None
+
+    def record_challenge_progress(self, username: str, challenge_type: str, amount: float) -> Optional[str]:
+        """
+        Add to the user's progress counter if today's challenge is of this type.
+        Completes the challenge as soon as the counter crosses the target; the caller commits.
+        """
+        try:
+            challenge = self.get_daily_challenge()
+            if not challenge or challenge['type'] != challenge_type or amount <= 0:
+                return None
+            self.db.conn_u.execute("""
+                INSERT INTO challenge_progress(username, date, challenge_id, progress)
+                VALUES(?, ?, ?, ?)
+                ON CONFLICT(username, date) DO UPDATE SET progress = progress + excluded.progress
+            """, (username, str(today_ist()), challenge['id'], amount))
+            progress = self.db.conn_u.execute("""
+                SELECT progress FROM challenge_progress WHERE username=? AND date=?
+            """, (username, str(today_ist()))).fetchone()[0]
+            if progress >= challenge['target'] and self._complete_challenge(username, challenge):
+                return f"🎉 Challenge completed! Earned {challenge['reward']} points!"
+            return None
+        except Exception as e:
+            logger.error(f"Error recording challenge progress: {e}")
+            return None
+
+    def _complete_challenge(self, username: str, challenge: Dict) -> bool:
+        """Mark the challenge completed and award points, once per user"""
+        inserted = self.db.conn_u.execute("""
+            INSERT OR IGNORE INTO challenge_completions(username, challenge_id, completed_date, points_earned)
+            VALUES(?, ?, ?, ?)
+        """, (username, challenge['id'], str(today_ist()), challenge['reward'])).rowcount
+        if inserted:
+            self.db.conn_u.execute("""
+                UPDATE users SET points = points + ? WHERE username = ?
+            """, (challenge['reward'], username))
+        return bool(inserted)
+
+    def evaluate_challenge_completions(self, date: Optional[str] = None) -> int:
+        """
+        End-of-day batch: recompute every user's progress for the day's challenge from
+        the source tables and award all completions with set-based SQL
+        """
+        date = date or str(today_ist())
+        try:
+            challenge = self.db.conn_u.execute("""
+                SELECT id, challenge_type, target_value, reward_points
+                FROM daily_challenges WHERE date=?
+            """, (date,)).fetchone()
+            if not challenge:
+                return 0
+            challenge_id, challenge_type, target, reward = challenge
+            source = self.challenge_sources[challenge_type]
+            # Repair counters that missed writes
+            self.db.conn_u.execute(f"""
+                INSERT INTO challenge_progress(username, date, challenge_id, progress)
+                SELECT username, ?, ?, value FROM ({source}) WHERE value > 0
+                ON CONFLICT(username, date) DO UPDATE SET progress = excluded.progress
+            """, (date, challenge_id, date))
+            self.db.conn_u.execute("DROP TABLE IF EXISTS temp.newly_completed")
+            self.db.conn_u.execute("""
+                CREATE TEMP TABLE newly_completed AS
+                SELECT p.username FROM challenge_progress p
+                WHERE p.date = ? AND p.challenge_id = ? AND p.progress >= ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM challenge_completions cc
+                    WHERE cc.username = p.username AND cc.challenge_id = p.challenge_id
+                )
+            """, (date, challenge_id, target))
+            self.db.conn_u.execute("""
+                INSERT INTO challenge_completions(username, challenge_id, completed_date, points_earned)
+                SELECT username, ?, ?, ? FROM temp.newly_completed
+            """, (challenge_id, date, reward))
+            awarded = self.db.conn_u.execute("""
+                UPDATE users SET points = points + ?
+                WHERE username IN (SELECT username FROM temp.newly_completed)
+            """, (reward,)).rowcount
+            self.db.conn_u.execute("DROP TABLE temp.newly_completed")
+            self.db.conn_u.commit()
+            logger.info(f"Challenge {challenge_id} ({date}): {awarded} new completions")
+            return awarded
+        except Exception as e:
+            self.db.conn_u.rollback()
+            logger.error(f"Error evaluating challenge completions: {e}")
+            return 0
+
+# ---------- SOCIAL GRAPH ----------
+@instrumented
+class SocialManager:
+    """
+    Follows plus an activity feed. Each activity is copied into every follower's
+    activity_feed when it happens (fan-out on write), so reading a feed never joins the
+    graph. Feeds and each actor's activities are trimmed to FEED_CAP nightly.
+    """
+    def __init__(self, db_manager: DatabaseManager, cap: int = FEED_CAP):
+        self.db = db_manager
+        self.cap = cap
+
+    def follow(self, follower: str, following: str) -> str:
+        """Follow a user and copy their recent activity into the follower's feed"""
+        if follower == following:
+            return "You can't follow yourself."
+        try:
+            if not self.db.conn_u.execute("SELECT 1 FROM users WHERE username=?", (following,)).fetchone():
+                return f"No user named '{following}'."
+            added = self.db.conn_u.execute(
+                "INSERT OR IGNORE INTO follows(follower, following) VALUES(?, ?)", (follower, following)
+            ).rowcount
+            if not added:
+                return f"You already follow {following}."
+            self.db.conn_u.execute("""
+                INSERT OR IGNORE INTO activity_feed(username, activity_id, actor, kind, detail, created_at)
+                SELECT ?, id, actor, kind, detail, created_at FROM activities
+                WHERE actor=? ORDER BY id DESC LIMIT ?
+            """, (follower, following, self.cap))
+            self.db.conn_u.commit()
+            return f"You are now following {following}."
+        except Exception as e:
+            logger.error(f"Error following {following}: {e}")
+            return "Could not follow that user."
+
+    def unfollow(self, follower: str, following: str) -> bool:
+        try:
+            removed = self.db.conn_u.execute(
+                "DELETE FROM follows WHERE follower=? AND following=?", (follower, following)
+            ).rowcount
+            self.db.conn_u.execute(
+                "DELETE FROM activity_feed WHERE username=? AND actor=?", (follower, following)
+            )
+            self.db.conn_u.commit()
+            return bool(removed)
+        except Exception as e:
+            logger.error(f"Error unfollowing {following}: {e}")
+            return False
+
+    def following(self, username: str) -> List[str]:
+        return [name for name, in self.db.conn_u.execute(
+            "SELECT following FROM follows WHERE follower=? ORDER BY following", (username,)
+        ).fetchall()]
+
+    def followers(self, username: str) -> List[str]:
+        return [name for name, in self.db.conn_u.execute(
+            "SELECT follower FROM follows WHERE following=? ORDER BY follower", (username,)
+        ).fetchall()]
+
+    def record_activity(self, actor: str, kind: str, detail: str) -> int:
+        """Log an activity and fan it out to the actor's followers; the caller commits"""
+        activity_id = self.db.conn_u.execute("""
+            INSERT INTO activities(actor, kind, detail, created_at) VALUES(?, ?, ?, ?)
+        """, (actor, kind, detail, str(dt.datetime.now(IST)))).lastrowid
+        return self.db.conn_u.execute("""
+            INSERT INTO activity_feed(username, activity_id, actor, kind, detail, created_at)
+            SELECT f.follower, a.id, a.actor, a.kind, a.detail, a.created_at
+            FROM follows f JOIN activities a ON a.id = ?
+            WHERE f.following = ?
+        """, (activity_id, actor)).rowcount
+
+    def feed(self, username: str, limit: int = 20) -> List[Dict]:
+        """Newest activities of the people a user follows"""
+        try:
+            rows = self.db.conn_u.execute("""
+                SELECT actor, kind, detail, created_at FROM activity_feed
+                WHERE username=? ORDER BY activity_id DESC LIMIT ?
+            """, (username, limit)).fetchall()
+            return [{'actor': actor, 'kind': kind, 'detail': detail, 'created_at': created_at}
+                    for actor, kind, detail, created_at in rows]
+        except Exception as e:
+            logger.error(f"Error getting activity feed: {e}")
+            return []
+
+    def feed_on_read(self, username: str, limit: int = 20) -> List[Dict]:
+        """The same feed assembled from the graph at read time (for comparison and repair)"""
+        rows = self.db.conn_u.execute("""
+            SELECT a.actor, a.kind, a.detail, a.created_at
+            FROM follows f JOIN activities a ON a.actor = f.following
+            WHERE f.follower=? ORDER BY a.id DESC LIMIT ?
+        """, (username, limit)).fetchall()
+        return [{'actor': actor, 'kind': kind, 'detail': detail, 'created_at': created_at}
+                for actor, kind, detail, created_at in rows]
+
+    def trim(self) -> Tuple[int, int]:
+        """Keep the newest `cap` rows per feed and per actor; returns (feed rows, activities) deleted"""
+        feed_rows = self.db.conn_u.execute("""
+            DELETE FROM activity_feed WHERE (username, activity_id) IN (
+                SELECT username, activity_id FROM (
+                    SELECT username, activity_id,
+                           ROW_NUMBER() OVER (PARTITION BY username ORDER BY activity_id DESC) AS position
+                    FROM activity_feed
+                ) WHERE position > ?
+            )
+        """, (self.cap,)).rowcount
+        activities = self.db.conn_u.execute("""
+            DELETE FROM activities WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY actor ORDER BY id DESC) AS position
+                    FROM activities
+                ) WHERE position > ?
+            )
+        """, (self.cap,)).rowcount
+        self.db.conn_u.commit()
+        return feed_rows, activities
+
+# ---------- ANSWER EVENT LOG ----------
+@instrumented
+class AnswerEventLog:
+    """Append-only per-answer event store with monthly archival"""
+    COLUMNS = ("id", "month", "quiz_id", "user_id", "word_id", "chosen_index",
+               "correct_index", "is_correct", "latency_ms", "answered_at")
+
+    def __init__(self, db_manager: DatabaseManager, archive_dir: pathlib.Path = ARCHIVE_DIR):
+        self.db = db_manager
+        self.archive_dir = archive_dir
+
+    def record_quiz(self, username: str, quiz_id: int, answers: List[Dict]):
+        """Append one row per answer in a single batch; the caller commits"""
+        if not answers:
+            return
+        now = dt.datetime.now(IST)
+        month = now.year * 100 + now.month
+        answered_at = int(now.timestamp())
+        user_id = self.db.user_id(username)
+        word_ids = self.db.word_ids([answer['word'] for answer in answers])
+        self.db.conn_u.executemany("""
+            INSERT INTO answer_events(month, quiz_id, user_id, word_id, chosen_index,
+                                      correct_index, is_correct, latency_ms, answered_at)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(month, quiz_id, user_id, word_ids[answer['word']],
+               answer.get('chosen_index'), answer.get('correct_index'),
+               1 if answer['is_correct'] else 0, answer.get('latency_ms'), answered_at)
+              for answer in answers])
+
+    def archive_path(self, month: int) -> pathlib.Path:
+        return self.archive_dir / f"answer_events_{month}.db"
+
+    def archive_months(self, keep_months: int = 3) -> int:
+        """Move whole months older than the last `keep_months` into per-month archive files"""
+        today = dt.datetime.now(IST).date()
+        year, month = today.year, today.month - keep_months
+        while month <= 0:
+            year, month = year - 1, month + 12
+        cutoff = year * 100 + month
+        moved = 0
+        conn = sqlite3.connect(self.db.users_path)
+        try:
+            months = [m for m, in conn.execute(
+                "SELECT DISTINCT month FROM answer_events WHERE month < ? ORDER BY month", (cutoff,)
+            ).fetchall()]
+            if months:
+                self.archive_dir.mkdir(parents=True, exist_ok=True)
+            for archived_month in months:
+                conn.execute("ATTACH DATABASE ? AS archive", (str(self.archive_path(archived_month)),))
+                try:
+                    conn.execute("""CREATE TABLE IF NOT EXISTS archive.answer_events AS
+                                    SELECT * FROM main.answer_events WHERE 0""")
+                    conn.execute("""INSERT INTO archive.answer_events
+                                    SELECT * FROM main.answer_events WHERE month = ?""", (archived_month,))
+                    moved += conn.execute("DELETE FROM main.answer_events WHERE month = ?",
+                                          (archived_month,)).rowcount
+                    conn.commit()
+                finally:
+                    conn.execute("DETACH DATABASE archive")
+                logger.info(f"Archived answer_events for {archived_month}")
+            return moved
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error archiving answer events: {e}")
+            return moved
+        finally:
+            conn.close()
+
+    def iter_events(self, since_id: int = 0, batch_size: int = 5000,
+                    include_archive: bool = False) -> Iterator[Tuple]:
+        """
+        Stream events as tuples in COLUMNS order, oldest first, using keyset pagination
+        so memory stays bounded by batch_size
+        """
+        sources = []
+        if include_archive and self.archive_dir.exists():
+            sources.extend(sorted(self.archive_dir.glob("answer_events_*.db")))
+        sources.append(self.db.users_path)
+        for path in sources:
+            conn = sqlite3.connect(path)
+            try:
+                last_id = since_id
+                while True:
+                    rows = conn.execute(f"""
+                        SELECT {", ".join(self.COLUMNS)} FROM answer_events
+                        WHERE id > ? ORDER BY id LIMIT ?
+                    """, (last_id, batch_size)).fetchall()
+                    if not rows:
+                        break
+                    yield from rows
+                    last_id = rows[-1][0]
+            finally:
+                conn.close()
+
+# ---------- WORD STATISTICS ----------
+@instrumented
+class WordStatsManager:
+    """Global per-word answer statistics with an in-memory read-through cache"""
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+        # word -> (attempts, correct, mean_latency_ms)
+        self._cache: Dict[str, Tuple[int, int, Optional[float]]] = {}
+
+    def warm(self) -> int:
+        """Load every word's stats into the cache"""
+        try:
+            rows = self.db.conn_u.execute("""
+                SELECT w.word, s.attempts, s.correct, s.mean_latency_ms
+                FROM word_stats s JOIN word_ids w ON w.id = s.word_id
+            """).fetchall()
+            self._cache.update({word: (attempts, correct, latency) for word, attempts, correct, latency in rows})
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error warming word stats: {e}")
+            return 0
+
+    def get(self, word: str) -> Tuple[int, int, Optional[float]]:
+        """Get (attempts, correct, mean_latency_ms) for a word"""
+        stats = self._cache.get(word)
+        if stats is None:
+            try:
+                row = self.db.conn_u.execute("""
+                    SELECT s.attempts, s.correct, s.mean_latency_ms
+                    FROM word_stats s JOIN word_ids w ON w.id = s.word_id
+                    WHERE w.word = ?
+                """, (word,)).fetchone()
+            except Exception as e:
+                logger.error(f"Error getting word stats for '{word}': {e}")
+                return 0, 0, None
+            stats = row if row else (0, 0, None)
+            self._cache[word] = stats
+        return stats
+
+    def difficulty(self, word: str) -> float:
+        """Smoothed global error rate in [0, 1]; unseen words score 0.5"""
+        attempts, correct, _ = self.get(word)
+        return 1 - (correct + 1) / (attempts + 2)
+
+    def difficulty_map(self) -> Dict[str, float]:
+        """Smoothed error rate for every cached word (call warm() first for full coverage)"""
+        return {word: 1 - (correct + 1) / (attempts + 2)
+                for word, (attempts, correct, _) in list(self._cache.items())}
+
+    def record_answers(self, answers: List[Dict]):
+        """Fold one quiz's answers into word_stats; the caller commits"""
+        if not answers:
+            return
+        batch: Dict[str, List] = {}
+        for answer in answers:
+            attempts, correct, latency_sum, latency_n = batch.get(answer['word'], (0, 0, 0, 0))
+            latency = answer.get('latency_ms')
+            batch[answer['word']] = (
+                attempts + 1,
+                correct + (1 if answer['is_correct'] else 0),
+                latency_sum + (latency or 0),
+                latency_n + (1 if latency is not None else 0)
+            )
+        word_ids = self.db.word_ids(list(batch))
+        now = str(dt.datetime.now(IST))
+        self.db.conn_u.executemany("""
+            INSERT INTO word_stats(word_id, attempts, correct, mean_latency_ms, latency_samples, last_updated)
+            VALUES(?, ?, ?, ?, ?, ?)
+            ON CONFLICT(word_id) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                correct = correct + excluded.correct,
+                mean_latency_ms = CASE
+                    WHEN excluded.latency_samples = 0 THEN mean_latency_ms
+                    WHEN latency_samples = 0 OR mean_latency_ms IS NULL THEN excluded.mean_latency_ms
+                    ELSE (mean_latency_ms * latency_samples + excluded.mean_latency_ms * excluded.latency_samples)
+                         / (latency_samples + excluded.latency_samples)
+                END,
+                latency_samples = latency_samples + excluded.latency_samples,
+                last_updated = excluded.last_updated
+        """, [(word_ids[word], attempts, correct,
+               latency_sum / latency_n if latency_n else None, latency_n, now)
+              for word, (attempts, correct, latency_sum, latency_n) in batch.items()])
+        for word in batch:
+            self._cache.pop(word, None)
+
+    def recompute(self, archive_dir: pathlib.Path = ARCHIVE_DIR) -> int:
+        """Rebuild word_stats from answer_events, including archived months; raises on failure"""
+        conn = sqlite3.connect(self.db.users_path)
+        try:
+            conn.execute("""CREATE TEMP TABLE totals(
+                word_id INTEGER PRIMARY KEY, attempts INTEGER, correct INTEGER,
+                latency_sum REAL, latency_samples INTEGER)""")
+            fold = """
+                INSERT INTO temp.totals
+                SELECT word_id, COUNT(*), SUM(is_correct), COALESCE(SUM(latency_ms), 0), COUNT(latency_ms)
+                FROM {}.answer_events GROUP BY word_id
+                ON CONFLICT(word_id) DO UPDATE SET
+                    attempts = attempts + excluded.attempts,
+                    correct = correct + excluded.correct,
+                    latency_sum = latency_sum + excluded.latency_sum,
+                    latency_samples = latency_samples + excluded.latency_samples
+            """
+            conn.execute(fold.format("main"))
+            conn.commit()
+            # One archive attached at a time (SQLite allows 10); ATTACH/DETACH need no open transaction
+            for path in sorted(archive_dir.glob("answer_events_*.db")) if archive_dir.exists() else []:
+                conn.execute("ATTACH DATABASE ? AS archive", (str(path),))
+                try:
+                    conn.execute(fold.format("archive"))
+                    conn.commit()
+                finally:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    conn.execute("DETACH DATABASE archive")
+            conn.execute("DELETE FROM main.word_stats")
+            rows = conn.execute("""
+                INSERT INTO main.word_stats(word_id, attempts, correct, mean_latency_ms, latency_samples, last_updated)
+                SELECT word_id, attempts, correct,
+                       CASE WHEN latency_samples > 0 THEN latency_sum / latency_samples END,
+                       latency_samples, ?
+                FROM temp.totals
+            """, (str(dt.datetime.now(IST)),)).rowcount
+            conn.commit()
+            self._cache.clear()
+            logger.info(f"Recomputed word_stats for {rows} words")
+            return rows
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error recomputing word stats: {e}")
+            raise
+        finally:
+            conn.close()
+
+# ---------- DIFFICULTY CALIBRATION ----------
+class DifficultyIndex:
+    """Immutable snapshot of the vocabulary sorted by difficulty, for adaptive sampling"""
+    __slots__ = ("words", "definitions", "difficulties")
+
+    def __init__(self, words: List[str], definitions: List[str], difficulties: List[float]):
+        order = np.argsort(np.asarray(difficulties, dtype=np.float64), kind="stable")
+        self.words = [words[i] for i in order]
+        self.definitions = [definitions[i] for i in order]
+        self.difficulties = np.asarray(difficulties, dtype=np.float64)[order]
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def sample_near(self, target: float, exclude: set, band: float = 0.5,
+                    rng: Optional[random.Random] = None) -> Optional[int]:
+        """Random position whose difficulty is within `band` of target, widening until one is free"""
+        rng = rng or random
+        n = len(self.words)
+        if len(exclude) >= n:
+            return None
+        while True:
+            lo = int(np.searchsorted(self.difficulties, target - band, side="left"))
+            hi = int(np.searchsorted(self.difficulties, target + band, side="right"))
+            for _ in range(8):
+                if hi > lo:
+                    position = rng.randrange(lo, hi)
+                    if self.words[position] not in exclude:
+                        return position
+            if lo == 0 and hi == n:
+                free = [i for i in range(n) if self.words[i] not in exclude]
+                return rng.choice(free) if free else None
+            band *= 2
+
+    def random_definitions(self, count: int, exclude_position: int,
+                           rng: Optional[random.Random] = None) -> List[str]:
+        """Distractor definitions drawn from other words in the index"""
+        correct_def = self.definitions[exclude_position]
+        picks = []
+        for position in (rng or random).sample(range(len(self.words)), min(len(self.words), count * 3)):
+            if position != exclude_position and self.definitions[position] != correct_def:
+                picks.append(self.definitions[position])
+                if len(picks) == count:
+                    break
+        return picks
+
+@instrumented
+class CalibrationManager:
+    """Offline IRT calibration of word difficulty and user ability"""
+    def __init__(self, db_manager: DatabaseManager, word_stats: Optional["WordStatsManager"] = None,
+                 archive_dir: pathlib.Path = ARCHIVE_DIR):
+        self.db = db_manager
+        self.word_stats = word_stats
+        self.archive_dir = archive_dir
+        self._word_difficulty: Dict[str, float] = {}
+        self._user_ability: Dict[str, float] = {}
+        self._index: Optional[DifficultyIndex] = None
+
+    def load(self) -> int:
+        """Load stored parameters so lookups are O(1) dict reads"""
+        try:
+            self._word_difficulty = dict(self.db.conn_u.execute("""
+                SELECT w.word, d.difficulty FROM word_difficulty d JOIN word_ids w ON w.id = d.word_id
+            """).fetchall())
+            self._user_ability = dict(self.db.conn_u.execute("""
+                SELECT u.username, a.ability FROM user_ability a JOIN user_ids u ON u.id = a.user_id
+            """).fetchall())
+            return len(self._word_difficulty)
+        except Exception as e:
+            logger.error(f"Error loading calibration parameters: {e}")
+            return 0
+
+    def word_difficulty(self, word: str) -> Optional[float]:
+        """Calibrated difficulty in logits (0 = average word), None if uncalibrated"""
+        return self._word_difficulty.get(word)
+
+    def user_ability(self, username: str) -> Optional[float]:
+        """Calibrated ability in logits on the same scale as word difficulty"""
+        return self._user_ability.get(username)
+
+    def difficulty_index(self) -> Optional[DifficultyIndex]:
+        """Get the difficulty-sorted vocabulary index, building it on first use"""
+        if self._index is None:
+            self.rebuild_index()
+        return self._index
+
+    def invalidate_index(self):
+        self._index = None
+
+    def rebuild_index(self) -> int:
+        """
+        Build the index from all words. Calibrated IRT difficulty is used where available,
+        otherwise the logit of the smoothed global error rate from word_stats.
+        """
+        try:
+            rows = self.db.conn_w.execute("SELECT word, definition FROM words").fetchall()
+            observed = self.word_stats.difficulty_map() if self.word_stats else {}
+            difficulties = []
+            for word, _ in rows:
+                difficulty = self._word_difficulty.get(word)
+                if difficulty is None:
+                    error_rate = observed.get(word, 0.5)
+                    difficulty = float(np.log(error_rate / (1 - error_rate)))
+                difficulties.append(difficulty)
+            self._index = DifficultyIndex([word for word, _ in rows], [definition for _, definition in rows],
+                                          difficulties)
+            return len(self._index)
+        except Exception as e:
+            logger.error(f"Error building difficulty index: {e}")
+            return 0
+
+    def calibrate(self, model: str = "rasch", epochs: int = 25, chunk_size: int = 250_000,
+                  log: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Fit the IRT model over every answer event (hot and archived) and store the parameters.
+        Answers are spilled to memory-mapped int32/int8 arrays so memory stays bounded.
+        Raises on failure so batch callers do not mistake it for success.
+        """
+        started = time.time()
+        conn = sqlite3.connect(self.db.users_path)
+
+        @contextmanager
+        def source(path: Optional[pathlib.Path]) -> Iterator[str]:
+            # One archive attached at a time: SQLite allows only 10 attached databases
+            if path is None:
+                yield "main"
+                return
+            conn.execute("ATTACH DATABASE ? AS archive", (str(path),))
+            try:
+                yield "archive"
+            finally:
+                conn.execute("DETACH DATABASE archive")
+
+        try:
+            paths = [None] + (sorted(self.archive_dir.glob("answer_events_*.db")) if self.archive_dir.exists() else [])
+            extents = []
+            for path in paths:
+                with source(path) as schema:
+                    extents.append(conn.execute(f"SELECT COUNT(*), MAX(id) FROM {schema}.answer_events").fetchone())
+            total = sum(count for count, _ in extents)
+            if total == 0:
+                return {'answers': 0}
+            n_users = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM user_ids").fetchone()[0]
+            n_words = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM word_ids").fetchone()[0]
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                users = np.memmap(pathlib.Path(tmp_dir) / "users", dtype=np.int32, mode="w+", shape=(total,))
+                words = np.memmap(pathlib.Path(tmp_dir) / "words", dtype=np.int32, mode="w+", shape=(total,))
+                correct = np.memmap(pathlib.Path(tmp_dir) / "correct", dtype=np.int8, mode="w+", shape=(total,))
+                filled = 0
+                for path, (count, max_id) in zip(paths, extents):
+                    if not count:
+                        continue
+                    with source(path) as schema:
+                        last_id = 0
+                        while filled < total:
+                            rows = conn.execute(f"""
+                                SELECT id, user_id, word_id, is_correct FROM {schema}.answer_events
+                                WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+                            """, (last_id, max_id, min(chunk_size, total - filled))).fetchall()
+                            if not rows:
+                                break
+                            block = np.array(rows, dtype=np.int64)
+                            end = filled + len(block)
+                            users[filled:end] = block[:, 1]
+                            words[filled:end] = block[:, 2]
+                            correct[filled:end] = block[:, 3]
+                            filled = end
+                            last_id = rows[-1][0]
+                if log:
+                    log(f"loaded {filled:,} answers in {time.time() - started:.1f}s")
+                fitted = fit_irt(array_chunks(users[:filled], words[:filled], correct[:filled], chunk_size),
+                                 n_users, n_words, model=model, epochs=epochs, log=log)
+                del users, words, correct
+            now = str(dt.datetime.now(IST))
+            word_rows = [(int(word_id), float(fitted['b'][word_id]), float(fitted['a'][word_id]),
+                          int(fitted['word_counts'][word_id]), now)
+                         for word_id in np.flatnonzero(fitted['word_counts'])]
+            user_rows = [(int(user_id), float(fitted['theta'][user_id]), int(fitted['user_counts'][user_id]), now)
+                         for user_id in np.flatnonzero(fitted['user_counts'])]
+            conn.execute("DELETE FROM main.word_difficulty")
+            conn.executemany("""
+                INSERT INTO main.word_difficulty(word_id, difficulty, discrimination, answers, calibrated_at)
+                VALUES(?, ?, ?, ?, ?)
+            """, word_rows)
+            conn.execute("DELETE FROM main.user_ability")
+            conn.executemany("""
+                INSERT INTO main.user_ability(user_id, ability, answers, calibrated_at)
+                VALUES(?, ?, ?, ?)
+            """, user_rows)
+            conn.commit()
+            self.load()
+            self.rebuild_index()
+            summary = {'answers': filled, 'words': len(word_rows), 'users': len(user_rows),
+                       'model': model, 'seconds': round(time.time() - started, 2)}
+            logger.info(f"IRT calibration finished: {summary}")
+            return summary
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error calibrating word difficulty: {e}")
+            raise
+        finally:
+            conn.close()
+
+# ---------- PERCENTILE SKETCHES ----------
+class LogSketch:
+    """
+    DDSketch-style quantile sketch of non-negative values: counts in logarithmic buckets, so
+    any value is placed within relative error `alpha`. Unlike t-digest/KLL, values can be
+    removed again, which lets a user's old value move when it changes. Memory depends on
+    the value range (about 1,700 buckets for 1e-6..1e9 at 1%), never on the number of values.
+    """
+    __slots__ = ("alpha", "log_gamma", "zero", "counts", "count", "_keys", "_below")
+    MIN_VALUE = 1e-6
+
+    def __init__(self, alpha: float = PERCENTILE_ALPHA):
+        self.alpha = alpha
+        self.log_gamma = math.log((1 + alpha) / (1 - alpha))
+        self.zero = 0
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self._keys: Optional[List[int]] = None
+        self._below: List[int] = []
+
+    def _key(self, value: float) -> Optional[int]:
+        return None if value < self.MIN_VALUE else math.ceil(math.log(value) / self.log_gamma)
+
+    def add(self, value: float, n: int = 1):
+        key = self._key(value)
+        if key is None:
+            self.zero += n
+        else:
+            self.counts[key] = self.counts.get(key, 0) + n
+        self.count += n
+        self._keys = None
+
+    def remove(self, value: float):
+        key = self._key(value)
+        if key is None:
+            if self.zero == 0:
+                return
+            self.zero -= 1
+        else:
+            remaining = self.counts.get(key, 0) - 1
+            if remaining < 0:
+                return
+            if remaining:
+                self.counts[key] = remaining
+            else:
+                del self.counts[key]
+        self.count -= 1
+        self._keys = None
+
+    def _index(self):
+        # Prefix counts over the sorted buckets, rebuilt only after a change
+        if self._keys is None:
+            self._keys = sorted(self.counts)
+            below, total = [], self.zero
+            for key in self._keys:
+                below.append(total)
+                total += self.counts[key]
+            self._below = below
+
+    def count_below(self, value: float) -> int:
+        """Number of values in lower buckets than `value` (values in the same bucket count as ties)"""
+        key = self._key(value)
+        if key is None:
+            return 0
+        self._index()
+        position = bisect.bisect_left(self._keys, key)
+        if position < len(self._keys):
+            return self._below[position]
+        return self.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero:
+            return 0.0
+        self._index()
+        for key, below in zip(self._keys, self._below):
+            if rank < below + self.counts[key]:
+                # Midpoint of the bucket (gamma^(key-1), gamma^key] in relative terms
+                return 2 * math.exp(key * self.log_gamma) / (1 + math.exp(self.log_gamma))
+        return 2 * math.exp(self._keys[-1] * self.log_gamma) / (1 + math.exp(self.log_gamma))
+
+    def to_json(self) -> str:
+        return json.dumps({'zero': self.zero, 'counts': self.counts})
+
+    @classmethod
+    def from_json(cls, alpha: float, data: str) -> "LogSketch":
+        sketch = cls(alpha)
+        state = json.loads(data)
+        sketch.zero = state['zero']
+        sketch.counts = {int(key): count for key, count in state['counts'].items()}
+        sketch.count = sketch.zero + sum(sketch.counts.values())
+        return sketch
+
+
+@instrumented
+class PercentileManager:
+    """
+    "Better than X% of learners" for points, accuracy and known words, served from one
+    LogSketch per metric instead of sorting users. Learners count once they have taken a
+    quiz. save_quiz_result moves each user's values as they change; the sketches are written
+    to percentile_sketches every PERCENTILE_PERSIST_SECONDS and rebuilt nightly, which also
+    absorbs changes made outside the quiz path (late challenge rewards, reviews).
+    """
+    METRICS = ('points', 'accuracy', 'known_words')
+
+    def __init__(self, db_manager: DatabaseManager, alpha: float = PERCENTILE_ALPHA,
+                 persist_seconds: float = PERCENTILE_PERSIST_SECONDS):
+        self.db = db_manager
+        self.alpha = alpha
+        self.persist_seconds = persist_seconds
+        self._sketches = {metric: LogSketch(alpha) for metric in self.METRICS}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stale = False
+        self._persisted = time.monotonic()
+
+    def invalidate(self):
+        """The stored sketches were rebuilt elsewhere (nightly job): reload them on next use, on the caller's thread"""
+        with self._lock:
+            self._stale = True
+
+    def _reload_if_stale(self):
+        with self._lock:
+            stale, self._stale = self._stale, False
+        if stale:
+            self.load()
+
+    def load(self) -> int:
+        """Load the persisted sketches, rebuilding them if missing or stored at another accuracy"""
+        try:
+            rows = self.db.conn_u.execute("SELECT metric, alpha, sketch FROM percentile_sketches").fetchall()
+            stored = {metric: LogSketch.from_json(alpha, sketch) for metric, alpha, sketch in rows
+                      if alpha == self.alpha}
+            if set(stored) != set(self.METRICS):
+                return self.rebuild()
+            with self._lock:
+                self._sketches = stored
+            return stored['points'].count
+        except Exception as e:
+            logger.error(f"Error loading percentile sketches: {e}")
+            return 0
+
+    def user_values(self, username: str) -> Optional[Tuple[float, float, int]]:
+        """Current (points, accuracy, known_words) of a user, None before their first quiz"""
+        row = self.db.conn_u.execute("""
+            SELECT points, correct * 100.0 / total_q,
+                   (SELECT COUNT(*) FROM word_user WHERE username=users.username AND status='known')
+            FROM users WHERE username=? AND total_q > 0
+        """, (username,)).fetchone()
+        return tuple(row) if row else None
+
+    def record(self, before: Optional[Tuple], after: Optional[Tuple]):
+        """Move one user's values from `before` to `after` (either may be None); called after commit"""
+        self._reload_if_stale()
+        with self._lock:
+            for position, metric in enumerate(self.METRICS):
+                sketch = self._sketches[metric]
+                if before is not None:
+                    sketch.remove(before[position])
+                if after is not None:
+                    sketch.add(after[position])
+            self._dirty = True
+            due = time.monotonic() - self._persisted >= self.persist_seconds
+        if due:
+            self.persist()
+
+    def percentiles(self, values: Dict[str, float]) -> Dict[str, float]:
+        """Share (0-100) of other learners each given value beats, by metric"""
+        self._reload_if_stale()
+        result = {}
+        with self._lock:
+            for metric, sketch in self._sketches.items():
+                if metric in values and sketch.count > 1:
+                    below = sketch.count_below(values[metric])
+                    result[metric] = min(below / (sketch.count - 1), 1.0) * 100
+        return result
+
+    def quantiles(self, qs: Tuple[float, ...] = (0.1, 0.5, 0.9)) -> Dict[str, Dict]:
+        self._reload_if_stale()
+        with self._lock:
+            return {metric: {'users': sketch.count, **{f"p{round(q * 100)}": sketch.quantile(q) for q in qs}}
+                    for metric, sketch in self._sketches.items()}
+
+    def persist(self) -> bool:
+        with self._lock:
+            # Never write over a newer rebuild; the next read reloads it instead
+            if not self._dirty or self._stale:
+                return False
+            rows = [(metric, self.alpha, sketch.to_json(), sketch.count, str(dt.datetime.now(IST)))
+                    for metric, sketch in self._sketches.items()]
+            self._dirty = False
+            self._persisted = time.monotonic()
+        try:
+            self.db.conn_u.executemany("""
+                INSERT OR REPLACE INTO percentile_sketches(metric, alpha, sketch, users, updated_at)
+                VALUES(?, ?, ?, ?, ?)
+            """, rows)
+            self.db.conn_u.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error persisting percentile sketches: {e}")
+            return False
+
+    def rebuild(self) -> int:
+        """Rebuild every sketch in one streaming pass over users, on a connection of its own"""
+        conn = sqlite3.connect(self.db.users_path)
+        try:
+            sketches = {metric: LogSketch(self.alpha) for metric in self.METRICS}
+            cursor = conn.execute("""
+                SELECT u.points, u.correct * 100.0 / u.total_q, COALESCE(k.known, 0)
+                FROM users u
+                LEFT JOIN (SELECT username, COUNT(*) AS known FROM word_user
+                           WHERE status='known' GROUP BY username) k ON k.username = u.username
+                WHERE u.total_q > 0
+            """)
+            for row in cursor:
+                for metric, value in zip(self.METRICS, row):
+                    sketches[metric].add(value)
+            with self._lock:
+                self._sketches = sketches
+                self._dirty = True
+            self.persist()
+            return sketches['points'].count
+        except Exception as e:
+            logger.error(f"Error rebuilding percentile sketches: {e}")
+            return 0
+        finally:
+            conn.close()
+
+# ---------- QUIZ MANAGER ----------
+@instrumented
+class QuizManager:
+    def __init__(self, db_manager: DatabaseManager, word_manager: WordManager,
+                 gamification_manager: Optional[GamificationManager] = None,
+                 word_stats: Optional[WordStatsManager] = None,
+                 calibration: Optional[CalibrationManager] = None,
+                 neighbor_index: Optional[NeighborIndexManager] = None,
+                 rng: Optional[random.Random] = None,
+                 percentiles: Optional[PercentileManager] = None):
+        self.db = db_manager
+        self.word_manager = word_manager
+        self.rng = rng or random.Random()
+        self.neighbor_index = (neighbor_index or word_manager.neighbor_index
+                               or NeighborIndexManager(db_manager, rng=self.rng))
+        self.gamification = gamification_manager or GamificationManager(db_manager, self.rng)
+        self.word_stats = word_stats or WordStatsManager(db_manager)
+        self.calibration = calibration or CalibrationManager(db_manager, self.word_stats)
+        self.event_log = AnswerEventLog(db_manager)
+        # Optional: a fresh, unloaded manager here would persist an empty distribution
+        self.percentiles = percentiles
+
+    def get_quiz_words(self, quiz_type: str, length: int, username: str = None,
+                       track_usage: bool = True) -> List[Dict]:
+        """Get words for quiz based on type; pooled quizzes record usage when taken instead"""
+        try:
+            # Random picks come from the shared in-memory snapshot and self.rng, never ORDER BY RANDOM(),
+            # so a seeded RNG reproduces the quiz
+            vocabulary = self.word_manager.vocabulary.current
+            if quiz_type == "random":
+                # Get random words
+                words = [(word,) for word in vocabulary.sample_words(length, rng=self.rng)]
+            elif quiz_type == "review" and username:
+                # Get words user got wrong
+                wrong = [word for word, in self.db.conn_u.execute("""
+                    SELECT DISTINCT word FROM word_user
+                    WHERE username=? AND status='wrong'
+                    ORDER BY word
+                """, (username,)).fetchall()]
+                words = [(word,) for word in self.rng.sample(wrong, min(length, len(wrong)))]
+                if len(words) < length:
+                    # Fill with random words if not enough review words
+                    remaining = length - len(words)
+                    seen = {word for word, in self.db.conn_u.execute(
+                        "SELECT word FROM word_user WHERE username=?", (username,))}
+                    words.extend((word,) for word in vocabulary.sample_words(remaining, seen, self.rng))
+            elif quiz_type == "spaced" and username:
+                # Get words due for spaced repetition
+                sr_manager = SpacedRepetitionManager(self.db)
+                due_words = sr_manager.get_due_words(username, length)
+                words = [(word,) for word in due_words]
+                if len(words) < length:
+                    # Fill with random words
+                    remaining = length - len(words)
+                    words.extend((word,) for word in vocabulary.sample_words(remaining, set(due_words), self.rng))
+            else:
+                # Default to random
+                words = [(word,) for word in vocabulary.sample_words(length, rng=self.rng)]
+            # Get word details and create quiz questions
+            quiz_words = []
+            for word, in words[:length]:
+                word_details = self.word_manager.get_word_details(word)
+                if word_details:
+                    # Get 3 wrong definitions, preferring semantically close ones
+                    wrong_defs = self.neighbor_index.get_distractors(word, word_details['definition'])
+                    if len(wrong_defs) < 3:
+                        wrong_defs += self.random_definitions(vocabulary, word, word_details['definition'],
+                                                              3 - len(wrong_defs), self.rng)
+                    quiz_words.append(self.make_question(word_details, wrong_defs))
+            if track_usage:
+                self.record_usage(quiz_words)
+            return quiz_words
+        except Exception as e:
+            logger.error(f"Error getting quiz words: {e}")
+            return []
+
+    def record_usage(self, quiz_words: List[Dict]):
+        """Update word usage statistics for the words of a quiz that is being handed out"""
+        try:
+            self.db.conn_w.executemany("""
+                UPDATE words
+                SET usage_count = usage_count + 1, last_used = ?
+                WHERE word = ?
+            """, [(str(today_ist()), question['word']) for question in quiz_words])
+            self.db.conn_w.commit()
+        except Exception as e:
+            logger.error(f"Error updating word usage: {e}")
+
+    @staticmethod
+    def random_definitions(vocabulary: VocabularySnapshot, word: str, correct_def: str,
+                           count: int, rng: Optional[random.Random] = None) -> List[str]:
+        """Random distractor definitions from the snapshot, never the answer itself"""
+        definitions = []
+        for position in vocabulary.sample(count + 2, {word}, rng):
+            definition = vocabulary.definitions[position]
+            if definition != correct_def and definition not in definitions:
+                definitions.append(definition)
+                if len(definitions) == count:
+                    break
+        return definitions
+
+    def make_question(self, word_details: Dict, wrong_defs: List[str]) -> Dict:
+        """Build a multiple choice question from a word and its distractor definitions"""
+        correct_def = word_details['definition']
+        options = [correct_def] + wrong_defs
+        self.rng.shuffle(options)
+        return {
+            'word': word_details['word'],
+            'definition': correct_def,
+            'options': options,
+            'correct_index': options.index(correct_def),
+            'difficulty': self.word_stats.difficulty(word_details['word']),
+            'pronunciation': word_details.get('pronunciation', ''),
+            'examples': [word_details.get('example1', ''), word_details.get('example2', '')]
+        }
+
+    def start_adaptive_quiz(self, username: str) -> Tuple[List[Dict], Dict]:
+        """First question of an adaptive quiz plus the state that steers the following ones"""
+        state = {'ability': self.calibration.user_ability(username) or 0.0, 'used': []}
+        question = self.next_adaptive_question(state)
+        return ([question] if question else []), state
+
+    def next_adaptive_question(self, state: Dict, last_correct: Optional[bool] = None) -> Optional[Dict]:
+        """
+        Update the running ability estimate from the last answer and pick the next word
+        from the in-memory difficulty index, aiming for roughly a 70% chance of success
+        """
+        try:
+            index = self.calibration.difficulty_index()
+            if not index:
+                return None
+            if last_correct is not None and 'last_difficulty' in state:
+                expected = 1 / (1 + np.exp(state['last_difficulty'] - state['ability']))
+                state['ability'] += ADAPTIVE_STEP * ((1 if last_correct else 0) - expected)
+            position = index.sample_near(state['ability'] - ADAPTIVE_TARGET_OFFSET, set(state['used']),
+                                         rng=self.rng)
+            if position is None:
+                return None
+            word = index.words[position]
+            word_details = self.word_manager.get_word_details(word)
+            if not word_details:
+                return None
+            state['used'].append(word)
+            state['last_difficulty'] = float(index.difficulties[position])
+            self.word_manager.update_word_usage(word)
+            wrong_defs = self.neighbor_index.get_distractors(word, word_details['definition'])
+            if len(wrong_defs) < 3:
+                wrong_defs += index.random_definitions(3 - len(wrong_defs), position, self.rng)
+            return self.make_question(word_details, wrong_defs)
+        except Exception as e:
+            logger.error(f"Error getting adaptive question: {e}")
+            return None
+
+    def save_quiz_result(self, username: str, quiz_type: str, length: int, 
+                        correct: int, time_spent: float,
+                        words_attempted: List[Dict]) -> Tuple[int, Optional[str]]:
+        """
+        Save quiz results to database. Returns the points earned and, if this quiz
+        completed today's challenge, the completion message (else None).
+        """
+        try:
+            # One date for the whole save, even if the day rolls over mid-transaction
+            today = str(today_ist())
+            accuracy = (correct / length * 100) if length > 0 else 0
+            # Calibrated hard words pay up to 5 extra points each
+            difficulty_bonus = 0
+            for word_data in words_attempted:
+                difficulty = self.calibration.word_difficulty(word_data['word'])
+                if word_data['is_correct'] and difficulty is not None:
+                    difficulty_bonus += min(max(round(difficulty), 0), 5)
+            points_earned = self.calculate_quiz_points(correct, length, time_spent, accuracy, difficulty_bonus)
+            before = self.percentiles.user_values(username) if self.percentiles else None
+            # Save quiz log
+            quiz_id = self.db.conn_u.execute("""
+                INSERT INTO quiz_log(username, date, quiz_type, length, correct, 
+                                   time_spent, accuracy, points_earned)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            """, (username, today, quiz_type, length, correct, 
+                  time_spent, accuracy, points_earned)).lastrowid
+            SocialManager(self.db).record_activity(
+                username, "quiz", f"scored {correct}/{length} ({quiz_type} quiz)")
+            # Append the individual answers to the event log
+            self.event_log.record_quiz(username, quiz_id, words_attempted)
+            self.word_stats.record_answers(words_attempted)
+            # Update streak while last_quiz_date still holds the previous quiz day
+            self.update_streak(username)
+            # Update user stats
+            self.db.conn_u.execute("""
+                UPDATE users 
+                SET total_q = total_q + ?, correct = correct + ?, 
+                    time_spent = time_spent + ?, points = points + ?,
+                    last_quiz_date = ?
+                WHERE username = ?
+            """, (length, correct, time_spent, points_earned, today, username))
+            # Words that move to 'known' for the first time ever count towards today's rollup
+            attempted = [word_data['word'] for word_data in words_attempted]
+            previously_known = set()
+            if attempted:
+                placeholders = ",".join("?" * len(attempted))
+                previously_known = {word for word, in self.db.conn_u.execute(f"""
+                    SELECT word FROM word_user
+                    WHERE username=? AND first_known IS NOT NULL AND word IN ({placeholders})
+                """, (username, *attempted)).fetchall()}
+            new_known = len({word_data['word'] for word_data in words_attempted
+                             if word_data['is_correct']} - previously_known)
+            # Update daily rollup
+            self.db.conn_u.execute("""
+                INSERT INTO daily_user_stats(username, date, quizzes, questions, correct,
+                                             time_spent, points, new_known)
+                VALUES(?, ?, 1, ?, ?, ?, ?, ?)
+                ON CONFLICT(username, date) DO UPDATE SET
+                    quizzes = quizzes + 1,
+                    questions = questions + excluded.questions,
+                    correct = correct + excluded.correct,
+                    time_spent = time_spent + excluded.time_spent,
+                    points = points + excluded.points,
+                    new_known = new_known + excluded.new_known
+            """, (username, today, length, correct, time_spent, points_earned, new_known))
+            # Advance today's challenge counter
+            challenge_progress = {
+                'quiz_words': length,
+                'perfect_quiz': 1 if accuracy == 100 else 0,
+                'learn_new': new_known
+            }
+            challenge_message = None
+            for challenge_type, amount in challenge_progress.items():
+                challenge_message = (self.gamification.record_challenge_progress(username, challenge_type, amount)
+                                     or challenge_message)
+            # Save individual word results
+            for word_data in words_attempted:
+                word = word_data['word']
+                is_correct = word_data['is_correct']
+                status = 'known' if is_correct else 'wrong'
+                # Insert or update word-user relationship
+                self.db.conn_u.execute("""
+                    INSERT OR REPLACE INTO word_user(username, word, status, date, attempts, last_seen, first_known)
+                    VALUES(?, ?, ?, ?, 
+                           COALESCE((SELECT attempts FROM word_user WHERE username=? AND word=?), 0) + 1,
+                           ?,
+                           COALESCE((SELECT first_known FROM word_user WHERE username=? AND word=?),
+                                    CASE WHEN ? = 'known' THEN ? END))
+                """, (username, word, status, today, username, word, today, username, word, status, today))
+                # Update spaced repetition if applicable
+                if quiz_type == "spaced":
+                    sr_manager = SpacedRepetitionManager(self.db)
+                    quality = 5 if is_correct else 2
+                    sr_manager.update_word_memory(username, word, quality)
+            after = self.percentiles.user_values(username) if self.percentiles else None
+            self.db.conn_u.commit()
+            if self.percentiles:
+                self.percentiles.record(before, after)
+            return points_earned, challenge_message
+        except Exception as e:
+            # Drop the partial save (and the ids it interned) instead of leaving it for the next commit
+            self.db.conn_u.rollback()
+            logger.error(f"Error saving quiz result: {e}")
+            return 0, None
+
+    def calculate_quiz_points(self, correct: int, total: int, time_spent: float, accuracy: float,
+                              difficulty_bonus: int = 0) -> int:
+        """Calculate points earned from quiz"""
+        base_points = correct * 10 + difficulty_bonus
+        # Accuracy bonus
+        if accuracy == 100:
+            base_points += 50  # Perfect score bonus
+        elif accuracy >= 80:
+            base_points += 20  # High accuracy bonus
+        # Speed bonus (if completed quickly)
+        if time_spent < total * 5:  # Less than 5 seconds per question
+            base_points += 25
+        return max(base_points, 0)
+
+    def update_streak(self, username: str):
+        """Update user's quiz streak; call before last_quiz_date is set to today, the caller commits"""
+        try:
+            # Get last quiz date
+            last_quiz = self.db.conn_u.execute(
+                "SELECT last_quiz_date FROM users WHERE username=?",
+                (username,)
+            ).fetchone()
+            if last_quiz and last_quiz[0]:
+                last_date = dt.datetime.strptime(last_quiz[0], '%Y-%m-%d').date()
+                days_diff = (today_ist() - last_date).days
+                if days_diff == 0:
+                    # Same day, no change to streak
+                    return
+                elif days_diff == 1:
+                    # Consecutive day, increment streak
+                    self.db.conn_u.execute(
+                        "UPDATE users SET streak = streak + 1 WHERE username = ?",
+                        (username,)
+                    )
+                else:
+                    # Streak broken, reset to 1
+                    self.db.conn_u.execute(
+                        "UPDATE users SET streak = 1 WHERE username = ?",
+                        (username,)
+                    )
+            else:
+                # First quiz, set streak to 1
+                self.db.conn_u.execute(
+                    "UPDATE users SET streak = 1 WHERE username = ?",
+                    (username,)
+                )
+        except Exception as e:
+            logger.error(f"Error updating streak: {e}")
+
+# ---------- QUIZ POOL ----------
+class PooledQuiz(NamedTuple):
+    built_at: float
+    vocab_version: int
+    user_epoch: int
+    date: str
+    words: List[Dict]
+
+
+@instrumented
+class QuizPoolService:
+    """
+    Bounded pools of ready-made quizzes refilled by a background thread pool, so
+    starting a quiz is a deque pop instead of a synchronous build.
+    Random quizzes are pooled for the common lengths; spaced and review quizzes are
+    pooled per recently active user. A pooled quiz is stale (and discarded on take)
+    when it is older than max_age, the vocabulary version changed, the day rolled
+    over, or - for per-user pools - the user's answers changed since it was built.
+    """
+    USER_TYPES = ("spaced", "review")
+
+    def __init__(self, quiz_manager: QuizManager, lengths: Tuple[int, ...] = (10, 20),
+                 pool_size: int = 3, user_pool_size: int = 1, max_age: float = 600.0,
+                 active_window: float = 1800.0, max_user_keys: int = 4, workers: int = 2):
+        self.quiz = quiz_manager
+        self.lengths = lengths
+        self.pool_size = pool_size
+        self.user_pool_size = user_pool_size
+        self.max_age = max_age
+        self.active_window = active_window
+        self.max_user_keys = max_user_keys
+        self._pools: Dict[Tuple, deque] = {}
+        self._pending: set = set()
+        self._user_epochs: Dict[str, int] = defaultdict(int)
+        self._user_keys: Dict[str, set] = defaultdict(set)
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quiz-pool")
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.built = 0
+        self.build_seconds = 0.0
+
+    def prime(self):
+        """Start filling the shared random pools"""
+        for length in self.lengths:
+            self._schedule(("random", length, None))
+
+    def touch(self, username: str):
+        """Note user activity; newly active users get their spaced/review pools filled"""
+        now = time.time()
+        with self._lock:
+            returning = now - self._last_seen.get(username, 0.0) > self.active_window
+            self._last_seen[username] = now
+            keys = list(self._user_keys[username])
+        if returning:
+            self._expire_idle_users(now)
+            for key in keys or [(quiz_type, self.lengths[0], username) for quiz_type in self.USER_TYPES]:
+                self._schedule(key)
+
+    def invalidate_user(self, username: str):
+        """The user's wrong/due words changed: drop their pooled quizzes and rebuild"""
+        with self._lock:
+            self._user_epochs[username] += 1
+            keys = list(self._user_keys[username])
+            for key in keys:
+                self._pools.pop(key, None)
+        for key in keys:
+            self._schedule(key)
+
+    def get(self, quiz_type: str, length: int, username: str = None) -> List[Dict]:
+        """Take a pooled quiz, or build one synchronously on a miss"""
+        started = time.perf_counter()
+        key = self._key(quiz_type, length, username)
+        quiz_words = self._take(key) if key else None
+        if quiz_words is None:
+            quiz_words = self.quiz.get_quiz_words(quiz_type, length, username)
+            source = "build"
+        else:
+            self.quiz.record_usage(quiz_words)
+            source = "pool"
+        QUIZ_GENERATION_SECONDS.observe(time.perf_counter() - started, quiz_type=quiz_type, source=source)
+        return quiz_words
+
+    def _key(self, quiz_type: str, length: int, username: Optional[str]) -> Optional[Tuple]:
+        if quiz_type == "random":
+            return (quiz_type, length, None)
+        if quiz_type in self.USER_TYPES and username:
+            return (quiz_type, length, username)
+        return None
+
+    def _take(self, key: Tuple) -> Optional[List[Dict]]:
+        quiz_words = None
+        with self._lock:
+            pool = self._pools.get(key)
+            while pool:
+                pooled = pool.popleft()
+                if self._is_fresh(pooled, key):
+                    quiz_words = pooled.words
+                    break
+                self.stale += 1
+            if quiz_words is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            username = key[2]
+            if username is not None and key not in self._user_keys[username]:
+                # Remember lengths this user asks for, within a small per-user budget
+                if len(self._user_keys[username]) >= self.max_user_keys:
+                    self._pools.pop(self._user_keys[username].pop(), None)
+                self._user_keys[username].add(key)
+        self._schedule(key)
+        return quiz_words
+
+    def _is_fresh(self, pooled: PooledQuiz, key: Tuple) -> bool:
+        username = key[2]
+        return (time.time() - pooled.built_at <= self.max_age
+                and pooled.vocab_version == self.quiz.word_manager.vocab_version
+                and pooled.date == str(today_ist())
+                and (username is None or pooled.user_epoch == self._user_epochs[username]))
+
+    def _capacity(self, key: Tuple) -> int:
+        return self.pool_size if key[2] is None else self.user_pool_size
+
+    def _schedule(self, key: Tuple):
+        with self._lock:
+            if key in self._pending or len(self._pools.get(key, ())) >= self._capacity(key):
+                return
+            self._pending.add(key)
+        self._executor.submit(self._fill, key)
+
+    def _fill(self, key: Tuple):
+        quiz_type, length, username = key
+        try:
+            self.quiz.db.use_readers()
+            while True:
+                with self._lock:
+                    pool = self._pools.setdefault(key, deque())
+                    if len(pool) >= self._capacity(key):
+                        return
+                    epoch = self._user_epochs[username] if username else 0
+                vocab_version = self.quiz.word_manager.vocab_version
+                started = time.time()
+                quiz_words = self.quiz.get_quiz_words(quiz_type, length, username, track_usage=False)
+                if len(quiz_words) < length:
+                    # Not enough words for a full quiz; leave it to the synchronous path
+                    return
+                QUIZ_GENERATION_SECONDS.observe(time.time() - started, quiz_type=quiz_type, source="producer")
+                with self._lock:
+                    self.built += 1
+                    self.build_seconds += time.time() - started
+                    if username and epoch != self._user_epochs[username]:
+                        continue
+                    self._pools.setdefault(key, deque()).append(
+                        PooledQuiz(started, vocab_version, epoch, str(today_ist()), quiz_words))
+        except Exception as e:
+            logger.error(f"Error filling quiz pool {key}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def _expire_idle_users(self, now: float):
+        with self._lock:
+            for username, seen in list(self._last_seen.items()):
+                if now - seen > self.active_window:
+                    del self._last_seen[username]
+                    for key in self._user_keys.pop(username, ()):
+                        self._pools.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'pools': len(self._pools),
+                'ready': sum(len(pool) for pool in self._pools.values()),
+                'active_users': len(self._last_seen),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'built': self.built,
+                'mean_build_ms': 1000 * self.build_seconds / self.built if self.built else 0.0,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+# ---------- SESSION STATE ----------
+def deep_getsizeof(obj, shared: Tuple[type, ...] = ()) -> int:
+    """Approximate bytes retained by obj (containers, dicts, __slots__), not counting `shared` types"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, shared) or isinstance(item, type):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        elif not isinstance(item, (str, bytes, array)):
+            for cls in type(item).__mro__:
+                stack.extend(getattr(item, name) for name in getattr(cls, "__slots__", ())
+                             if hasattr(item, name))
+            if hasattr(item, "__dict__"):
+                stack.append(vars(item))
+    return total
+
+
+class CompactQuiz:
+    """
+    One session's quiz: words and options are positions in the vocabulary snapshot the quiz
+    was built from (shared by all sessions, not copied). Definitions missing from the snapshot
+    are stored once in `extra` and referenced as -1, -2, ...; answers are one byte per question.
+    """
+    __slots__ = ("snapshot", "quiz_type", "length", "words", "options", "option_start", "correct",
+                 "chosen", "latency_ms", "extra", "current", "start_time", "question_start",
+                 "timer_question", "adaptive", "time_spent", "points_earned", "challenge_message")
+
+    def __init__(self, snapshot: VocabularySnapshot, quiz_type: str, length: int,
+                 questions: List[Dict], adaptive: Optional[Dict] = None):
+        self.snapshot = snapshot
+        self.quiz_type = quiz_type
+        self.words = array("l")
+        self.options = array("l")
+        self.option_start = array("l", [0])
+        self.correct = array("b")
+        self.chosen = array("b")
+        self.latency_ms = array("l")
+        self.extra: List[str] = []
+        self.current = 0
+        self.start_time = time.time()
+        self.question_start = 0.0
+        self.timer_question = -1
+        self.adaptive = adaptive
+        self.time_spent: Optional[float] = None
+        self.points_earned: Optional[int] = None
+        self.challenge_message: Optional[str] = None
+        for question in questions:
+            self.append(question)
+        # Adaptive quizzes grow one question at a time up to the requested length
+        self.length = length if adaptive is not None else len(self.words)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def append(self, question: Dict) -> bool:
+        position = self.snapshot.positions.get(question['word'])
+        if position is None:
+            return False
+        self.words.append(position)
+        self.options.extend(self._reference(option) for option in question['options'])
+        self.option_start.append(len(self.options))
+        self.correct.append(question['correct_index'])
+        self.chosen.append(-1)
+        self.latency_ms.append(0)
+        return True
+
+    def _reference(self, definition: str) -> int:
+        position = self.snapshot.by_definition.get(definition)
+        if position is not None:
+            return position
+        if definition not in self.extra:
+            self.extra.append(definition)
+        return -1 - self.extra.index(definition)
+
+    def _definition(self, reference: int) -> str:
+        return self.snapshot.definitions[reference] if reference >= 0 else self.extra[-1 - reference]
+
+    def word(self, index: int) -> str:
+        return self.snapshot.words[self.words[index]]
+
+    def question(self, index: int) -> Dict:
+        options = [self._definition(reference)
+                   for reference in self.options[self.option_start[index]:self.option_start[index + 1]]]
+        return {
+            'word': self.word(index),
+            'definition': options[self.correct[index]],
+            'options': options,
+            'correct_index': self.correct[index],
+            'pronunciation': self.snapshot.pronunciations[self.words[index]] or ''
+        }
+
+    def answer(self, index: int, chosen_index: int, latency_ms: int) -> bool:
+        """Record (or overwrite, after going back) the answer to a question"""
+        self.chosen[index] = chosen_index
+        self.latency_ms[index] = latency_ms
+        return chosen_index == self.correct[index]
+
+    @property
+    def score(self) -> int:
+        return sum(1 for chosen, correct in zip(self.chosen, self.correct) if chosen == correct)
+
+    def answers(self) -> List[Dict]:
+        """Answered questions in the shape save_quiz_result and the event log expect"""
+        answers = []
+        for index, chosen_index in enumerate(self.chosen):
+            if chosen_index < 0:
+                continue
+            question = self.question(index)
+            answers.append({
+                'word': question['word'],
+                'chosen': question['options'][chosen_index],
+                'correct': question['definition'],
+                'is_correct': chosen_index == question['correct_index'],
+                'chosen_index': chosen_index,
+                'correct_index': question['correct_index'],
+                'latency_ms': self.latency_ms[index]
+            })
+        return answers
+
+
+class CompactReview:
+    """Spaced-repetition session: due words as snapshot positions plus one quality byte per reviewed card"""
+    __slots__ = ("snapshot", "words", "qualities", "start_time", "saved")
+
+    def __init__(self, snapshot: VocabularySnapshot, due_words: List[str]):
+        self.snapshot = snapshot
+        self.words = array("l", [snapshot.positions[word] for word in due_words if word in snapshot.positions])
+        self.qualities = array("b")
+        self.start_time = time.time()
+        self.saved = False
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @property
+    def index(self) -> int:
+        return len(self.qualities)
+
+    def word(self, index: int) -> str:
+        return self.snapshot.words[self.words[index]]
+
+    def rate(self, quality: int):
+        self.qualities.append(quality)
+
+    def reviews(self) -> List[Tuple[str, int]]:
+        return [(self.word(index), quality) for index, quality in enumerate(self.qualities)]
+
+
+class SessionSlot:
+    """Server-side state of one browser session; the keys accounted for per session"""
+    __slots__ = ("session_id", "username", "last_seen", "quiz", "review", "deck")
+    KEYS = ("quiz", "review", "deck")
+
+    def __init__(self, session_id: str, username: str):
+        self.session_id = session_id
+        self.username = username
+        self.last_seen = time.time()
+        self.quiz: Optional[CompactQuiz] = None
+        self.review: Optional[CompactReview] = None
+        self.deck: Optional[List[str]] = None
+
+
+class SessionStore:
+    """
+    Quiz, review and flashcard state of every browser session, kept here instead of in
+    st.session_state so it can be measured and dropped for sessions idle past idle_seconds.
+    """
+    SWEEP_INTERVAL = 60.0
+    SHARED = (VocabularySnapshot,)
+
+    def __init__(self, idle_seconds: float = SESSION_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._slots: Dict[str, SessionSlot] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self.evicted = 0
+
+    def slot(self, session_id: str, username: str) -> SessionSlot:
+        """The session's state, fresh if it was evicted or a different user logged in"""
+        now = time.time()
+        with self._lock:
+            slot = self._slots.get(session_id)
+            if slot is None or slot.username != username:
+                slot = self._slots[session_id] = SessionSlot(session_id, username)
+            slot.last_seen = now
+        if now - self._last_sweep >= self.SWEEP_INTERVAL:
+            self.evict_idle(now)
+        return slot
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._slots.pop(session_id, None)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        with self._lock:
+            self._last_sweep = now
+            idle = [session_id for session_id, slot in self._slots.items()
+                    if now - slot.last_seen > self.idle_seconds]
+            for session_id in idle:
+                del self._slots[session_id]
+            self.evicted += len(idle)
+        if idle:
+            logger.info(f"Evicted state of {len(idle)} idle sessions")
+        return len(idle)
+
+    def usage(self) -> List[Dict]:
+        """Approximate bytes per session and key, largest sessions first"""
+        now = time.time()
+        with self._lock:
+            slots = list(self._slots.values())
+        rows = []
+        for slot in slots:
+            row = {'session': slot.session_id, 'username': slot.username,
+                   'idle_s': round(now - slot.last_seen)}
+            for key in SessionSlot.KEYS:
+                value = getattr(slot, key)
+                row[key] = deep_getsizeof(value, self.SHARED) if value is not None else 0
+            row['total'] = sum(row[key] for key in SessionSlot.KEYS)
+            rows.append(row)
+        return sorted(rows, key=lambda row: -row['total'])
+
+    def stats(self) -> Dict:
+        rows = self.usage()
+        return {
+            'sessions': len(rows),
+            'evicted': self.evicted,
+            'bytes': {key: sum(row[key] for row in rows) for key in SessionSlot.KEYS}
+        }
+
+# ---------- ANALYTICS MANAGER ----------
+@instrumented
+class AnalyticsManager:
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+
+    def get_user_stats(self, username: str) -> Dict:
+        """Get comprehensive user statistics"""
+        try:
+            # Basic stats
+            user_data = self.db.conn_u.execute("""
+                SELECT points, streak, total_q, correct, time_spent, 
+                       total_study_time, study_streak, created_at
+                FROM users WHERE username=?
+            """, (username,)).fetchone()
+            if not user_data:
+                return {}
+            points, streak, total_q, correct, time_spent, study_time, study_streak, created_at = user_data
+            # Calculate derived stats
+            accuracy = (correct / total_q * 100) if total_q > 0 else 0
+            avg_time_per_q = time_spent / total_q if total_q > 0 else 0
+            # Get level info
+            gam_manager = GamificationManager(self.db)
+            level, next_threshold, progress = gam_manager.get_level_progress(points)
+            # Get achievements
+            achievements = self.db.conn_u.execute("""
+                SELECT achievement, date_earned FROM user_achievements 
+                WHERE username=? ORDER BY date_earned DESC
+            """, (username,)).fetchall()
+            # Get quiz history (last 30 days, one row per day from the rollup)
+            thirty_days_ago = (today_ist() - dt.timedelta(days=30)).strftime('%Y-%m-%d')
+            quiz_history = self.db.conn_u.execute("""
+                SELECT date, ROUND(correct * 100.0 / questions, 1), points
+                FROM daily_user_stats
+                WHERE username=? AND date >= ? AND questions > 0
+                ORDER BY date DESC
+            """, (username, thirty_days_ago)).fetchall()
+            # Get word stats
+            known_words = self.db.conn_u.execute("""
+                SELECT COUNT(*) FROM word_user 
+                WHERE username=? AND status='known'
+            """, (username,)).fetchone()[0]
+            wrong_words = self.db.conn_u.execute("""
+                SELECT COUNT(*) FROM word_user 
+                WHERE username=? AND status='wrong'
+            """, (username,)).fetchone()[0]
+            # Get followers/following
+            followers = len(self.db.conn_u.execute(
+                "SELECT follower FROM follows WHERE following=?", (username,)
+            ).fetchall())
+            following = len(self.db.conn_u.execute(
+                "SELECT following FROM follows WHERE follower=?", (username,)
+            ).fetchall())
+            return {
+                'points': points,
+                'level': level,
+                'progress_to_next': progress,
+                'streak': streak,
+                'study_streak': study_streak,
+                'total_quizzes': total_q,
+                'correct_answers': correct,
+                'accuracy': round(accuracy, 1),
+                'time_spent': time_spent,
+                'study_time': study_time or 0,
+                'avg_time_per_question': round(avg_time_per_q, 1),
+                'known_words': known_words,
+                'wrong_words': wrong_words,
+                'achievements': achievements,
+                'quiz_history': quiz_history,
+                'followers': followers,
+                'following': following,
+                'member_since': created_at
+            }
+        except Exception as e:
+            logger.error(f"Error getting user stats: {e}")
+            return {}
+
+    def get_daily_stats(self, username: str, days: int = 30) -> List[Tuple]:
+        """Get per-day rollup rows for the last `days` days, oldest first"""
+        try:
+            start_date = (today_ist() - dt.timedelta(days=days)).strftime('%Y-%m-%d')
+            return self.db.conn_u.execute("""
+                SELECT date, quizzes, questions, correct, time_spent, points, new_known
+                FROM daily_user_stats
+                WHERE username=? AND date >= ?
+                ORDER BY date ASC
+            """, (username, start_date)).fetchall()
+        except Exception as e:
+            logger.error(f"Error getting daily stats: {e}")
+            return []
+
+    def rebuild_daily_stats(self, only_if_empty: bool = False, since: Optional[str] = None) -> int:
+        """
+        Rebuild daily_user_stats from both quiz_log tiers (backfill job), optionally only for dates >= since.
+        new_known comes from word_user.first_known, which is approximate for rows older than that column.
+        """
+        try:
+            if only_if_empty:
+                has_rollup = self.db.conn_u.execute("SELECT 1 FROM daily_user_stats LIMIT 1").fetchone()
+                has_log = self.db.conn_u.execute("SELECT 1 FROM quiz_log_all LIMIT 1").fetchone()
+                if has_rollup or not has_log:
+                    return 0
+            since = since or ""
+            self.db.conn_u.execute("DELETE FROM daily_user_stats WHERE date >= ?", (since,))
+            self.db.conn_u.execute("""
+                INSERT INTO daily_user_stats(username, date, quizzes, questions, correct,
+                                             time_spent, points)
+                SELECT username, date, COUNT(*), SUM(length), SUM(correct),
+                       SUM(time_spent), SUM(points_earned)
+                FROM quiz_log_all
+                WHERE date >= ?
+                GROUP BY username, date
+            """, (since,))
+            self.db.conn_u.execute("""
+                INSERT INTO daily_user_stats(username, date, new_known)
+                SELECT username, first_known, COUNT(*) FROM word_user
+                WHERE first_known >= ?
+                GROUP BY username, first_known
+                ON CONFLICT(username, date) DO UPDATE SET new_known = excluded.new_known
+            """, (since,))
+            rows = self.db.conn_u.execute("SELECT COUNT(*) FROM daily_user_stats WHERE date >= ?",
+                                          (since,)).fetchone()[0]
+            self.db.conn_u.commit()
+            logger.info(f"Rebuilt daily_user_stats: {rows} rows" + (f" since {since}" if since else ""))
+            return rows
+        except Exception as e:
+            self.db.conn_u.rollback()
+            logger.error(f"Error rebuilding daily stats: {e}")
+            return 0
+
+    def reconcile_daily_stats(self, since: str) -> int:
+        """
+        Nightly check of the quiz_log-derived rollup columns (quizzes, questions, correct,
+        time_spent, points) for dates >= since against both quiz_log tiers. new_known is
+        left alone: it is counted exactly at write time.
+        Raises on failure so the maintenance run is recorded as an error.
+        """
+        try:
+            zeroed = self.db.conn_u.execute("""
+                UPDATE daily_user_stats SET quizzes = 0, questions = 0, correct = 0, time_spent = 0, points = 0
+                WHERE date >= ? AND quizzes != 0 AND NOT EXISTS (
+                    SELECT 1 FROM quiz_log_all q WHERE q.username = daily_user_stats.username
+                                                  AND q.date = daily_user_stats.date)
+            """, (since,)).rowcount
+            upserted = self.db.conn_u.execute("""
+                INSERT INTO daily_user_stats(username, date, quizzes, questions, correct, time_spent, points)
+                SELECT username, date, COUNT(*), SUM(length), SUM(correct), SUM(time_spent), SUM(points_earned)
+                FROM quiz_log_all
+                WHERE date >= ?
+                GROUP BY username, date
+                ON CONFLICT(username, date) DO UPDATE SET
+                    quizzes = excluded.quizzes, questions = excluded.questions, correct = excluded.correct,
+                    time_spent = excluded.time_spent, points = excluded.points
+            """, (since,)).rowcount
+            self.db.conn_u.commit()
+            logger.info(f"Reconciled daily_user_stats since {since}: {upserted} rows, {zeroed} zeroed")
+            return upserted + zeroed
+        except Exception as e:
+            self.db.conn_u.rollback()
+            logger.error(f"Error reconciling daily stats: {e}")
+            raise
+
+    def get_leaderboard(self, limit: int = 10) -> List[Dict]:
+        """Get leaderboard data; identical concurrent requests share one query for a few seconds"""
+        try:
+            key = ('leaderboard', limit, self.db.conn_u.data_version())
+            return self.db.reads.do(key, lambda: self._leaderboard(limit), ttl=LEADERBOARD_TTL)
+        except Exception as e:
+            logger.error(f"Error getting leaderboard: {e}")
+            return []
+
+    def get_friends_leaderboard(self, username: str, limit: int = 10) -> List[Dict]:
+        """Leaderboard of a user and the people they follow"""
+        try:
+            users = self.db.conn_u.execute("""
+                SELECT username, points, streak, total_q, correct
+                FROM users
+                WHERE username = ? OR username IN (SELECT following FROM follows WHERE follower = ?)
+                ORDER BY points DESC, streak DESC
+                LIMIT ?
+            """, (username, username, limit)).fetchall()
+            return self._leaderboard_rows(users)
+        except Exception as e:
+            logger.error(f"Error getting friends leaderboard: {e}")
+            return []
+
+    def _leaderboard(self, limit: int) -> List[Dict]:
+        users = self.db.conn_u.execute("""
+            SELECT username, points, streak, total_q, correct
+            FROM users 
+            ORDER BY points DESC, streak DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+        return self._leaderboard_rows(users)
+
+    def _leaderboard_rows(self, users: List[Tuple]) -> List[Dict]:
+        leaderboard = []
+        for i, (username, points, streak, total_q, correct) in enumerate(users, 1):
+            accuracy = (correct / total_q * 100) if total_q > 0 else 0
+            level = GamificationManager(self.db).calculate_level(points)
+            leaderboard.append({
+                'rank': i,
+                'username': username,
+                'points': points,
+                'level': level,
+                'streak': streak,
+                'accuracy': round(accuracy, 1),
+                'total_quizzes': total_q
+            })
+        return leaderboard
+
+# ---------- WEEKLY LEAGUES ----------
+@instrumented
+class LeagueManager:
+    """
+    Weekly leagues of about LEAGUE_SIZE learners per division, one ladder of LEAGUE_TIERS.
+    Weekly points come from the daily_user_stats rollup. The nightly job snapshots the
+    standings into league_standings, and when a new week starts it finalizes the old one
+    (top LEAGUE_PROMOTE move up, bottom LEAGUE_DEMOTE and anyone without points move down)
+    and deals everyone active in the last LEAGUE_ACTIVE_DAYS into new divisions. Both steps
+    are single set-based statements; the UI only reads the snapshot.
+    """
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+
+    @staticmethod
+    def week_start(day: dt.date) -> dt.date:
+        return day - dt.timedelta(days=day.weekday())
+
+    def run(self, today: dt.date) -> str:
+        """Roll the leagues over if a new week has started, then refresh this week's standings"""
+        conn = self.db.conn_u
+        week = self.week_start(today)
+        current = conn.execute("SELECT MAX(week) FROM league_members").fetchone()[0]
+        detail = []
+        try:
+            if current != str(week):
+                if current is not None:
+                    finalized = self.snapshot(dt.date.fromisoformat(current), final=True)
+                    detail.append(f"week of {current} finalized for {finalized} learners")
+                placed = self.assign(week, current)
+                detail.append(f"{placed} learners placed for the week of {week}")
+            detail.append(f"{self.snapshot(week, final=False)} standings refreshed")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return ", ".join(detail)
+
+    def snapshot(self, week: dt.date, final: bool) -> int:
+        """Rank every division of `week` by its points so far; the caller commits"""
+        conn = self.db.conn_u
+        conn.execute("DELETE FROM league_standings WHERE week=?", (str(week),))
+        return conn.execute("""
+            INSERT INTO league_standings(week, tier, division, username, points, rank, outcome, final, computed_at)
+            WITH weekly AS (
+                SELECT m.username, m.tier, m.division, COALESCE(SUM(d.points), 0) AS points
+                FROM league_members m
+                LEFT JOIN daily_user_stats d
+                       ON d.username = m.username AND d.date BETWEEN :start AND :end
+                WHERE m.week = :week
+                GROUP BY m.username
+            ),
+            ranked AS (
+                SELECT username, tier, division, points,
+                       RANK() OVER (PARTITION BY tier, division ORDER BY points DESC) AS position,
+                       COUNT(*) OVER (PARTITION BY tier, division) AS size
+                FROM weekly
+            )
+            SELECT :week, tier, division, username, points, position,
+                   CASE
+                       WHEN tier < :top AND points > 0 AND position <= :promote THEN 'promoted'
+                       WHEN tier > 0 AND (points = 0 OR position > size - :demote) THEN 'demoted'
+                       ELSE 'stayed'
+                   END,
+                   :final, :now
+            FROM ranked
+        """, {'week': str(week), 'start': str(week), 'end': str(week + dt.timedelta(days=6)),
+              'top': len(LEAGUE_TIERS) - 1, 'promote': LEAGUE_PROMOTE, 'demote': LEAGUE_DEMOTE,
+              'final': int(final), 'now': str(dt.datetime.now(IST))}).rowcount
+
+    def assign(self, week: dt.date, previous: Optional[str]) -> int:
+        """
+        Place active learners for `week`: tier from last week's final outcome (newcomers and
+        returning learners start in the bottom tier), then dealt round-robin by last week's
+        points into divisions of about LEAGUE_SIZE so every division gets a similar mix.
+        The caller commits.
+        """
+        conn = self.db.conn_u
+        conn.execute("DELETE FROM league_members")
+        return conn.execute("""
+            INSERT INTO league_members(username, week, tier, division)
+            WITH pool AS (
+                SELECT u.username,
+                       COALESCE(s.tier + CASE s.outcome WHEN 'promoted' THEN 1
+                                                        WHEN 'demoted' THEN -1 ELSE 0 END, 0) AS tier,
+                       COALESCE(s.points, 0) AS points
+                FROM users u
+                LEFT JOIN league_standings s ON s.username = u.username AND s.week = :previous
+                WHERE u.last_quiz_date >= :active_since
+            ),
+            dealt AS (
+                SELECT username, tier,
+                       ROW_NUMBER() OVER (PARTITION BY tier ORDER BY points DESC, username) AS position,
+                       COUNT(*) OVER (PARTITION BY tier) AS size
+                FROM pool
+            )
+            SELECT username, :week, tier, (position - 1) % MAX(1, (size + :size / 2) / :size)
+            FROM dealt
+        """, {'week': str(week), 'previous': previous, 'size': LEAGUE_SIZE,
+              'active_since': str(week - dt.timedelta(days=LEAGUE_ACTIVE_DAYS))}).rowcount
+
+    def standings(self, username: str) -> Optional[Dict]:
+        """The user's division in the latest snapshot, plus their result from the week before"""
+        try:
+            weeks = self.db.conn_u.execute("""
+                SELECT week, tier, division, outcome, final, computed_at FROM league_standings
+                WHERE username=? ORDER BY week DESC LIMIT 2
+            """, (username,)).fetchall()
+            if not weeks:
+                return None
+            week, tier, division, _, final, computed_at = weeks[0]
+            rows = self.db.conn_u.execute("""
+                SELECT username, points, rank, outcome FROM league_standings
+                WHERE week=? AND tier=? AND division=? ORDER BY rank, username
+            """, (week, tier, division)).fetchall()
+            last_week = None
+            if len(weeks) > 1 and weeks[1][4]:
+                last_week = {'week': weeks[1][0], 'tier': LEAGUE_TIERS[weeks[1][1]], 'outcome': weeks[1][3]}
+            return {
+                'week': week,
+                'tier': LEAGUE_TIERS[tier],
+                'division': division + 1,
+                'final': bool(final),
+                'computed_at': computed_at,
+                'rows': [{'rank': rank, 'username': name, 'points': points, 'outcome': outcome}
+                         for name, points, rank, outcome in rows],
+                'last_week': last_week
+            }
+        except Exception as e:
+            logger.error(f"Error getting league standings: {e}")
+            return None
+
+# ---------- STREAK REPAIR ----------
+class StreakRepair:
+    """
+    Recomputes every user's current and longest quiz and study streaks from history:
+    quiz days from daily_user_stats (the per-day rollup of both quiz_log tiers, which the
+    rollups job reconciles first) and study days from study_sessions, grouped into runs
+    of consecutive days (gaps and islands: day minus its row number is constant within
+    a run). A run still counts as current if it reaches yesterday. users.streak and
+    users.study_streak are only rewritten where they drifted, user_streaks only where a
+    value changed, and the drift is reported.
+    """
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+
+    def compute(self, today: dt.date) -> int:
+        """Fill temp.computed_streaks with one row per user"""
+        conn = self.db.conn_u
+        conn.execute("""CREATE TEMP TABLE IF NOT EXISTS computed_streaks(
+            username TEXT PRIMARY KEY,
+            quiz_current INTEGER, quiz_longest INTEGER, quiz_last_date TEXT,
+            study_current INTEGER, study_longest INTEGER, study_last_date TEXT)""")
+        conn.execute("DELETE FROM temp.computed_streaks")
+        return conn.execute("""
+            INSERT INTO temp.computed_streaks
+            WITH study_days AS (
+                SELECT username, substr(start_time, 1, 10) AS day FROM study_sessions
+                WHERE substr(start_time, 1, 10) <= :today GROUP BY username, day
+            ),
+            islands AS (
+                -- Each source is windowed on its own so the rollup is read in key order, unsorted
+                SELECT username, 'quiz' AS kind, date AS day,
+                       julianday(date) - ROW_NUMBER() OVER (PARTITION BY username ORDER BY date) AS island
+                FROM daily_user_stats WHERE quizzes > 0 AND date <= :today
+                UNION ALL
+                SELECT username, 'study', day,
+                       julianday(day) - ROW_NUMBER() OVER (PARTITION BY username ORDER BY day)
+                FROM study_days
+            ),
+            runs AS (
+                SELECT username, kind, COUNT(*) AS length, MAX(day) AS last_day
+                FROM islands GROUP BY username, kind, island
+            ),
+            streaks AS (
+                SELECT username,
+                       MAX(CASE WHEN kind = 'quiz' AND last_day >= :yesterday THEN length ELSE 0 END) AS quiz_current,
+                       MAX(CASE WHEN kind = 'quiz' THEN length ELSE 0 END) AS quiz_longest,
+                       MAX(CASE WHEN kind = 'quiz' THEN last_day END) AS quiz_last_date,
+                       MAX(CASE WHEN kind = 'study' AND last_day >= :yesterday THEN length ELSE 0 END) AS study_current,
+                       MAX(CASE WHEN kind = 'study' THEN length ELSE 0 END) AS study_longest,
+                       MAX(CASE WHEN kind = 'study' THEN last_day END) AS study_last_date
+                FROM runs GROUP BY username
+            )
+            SELECT u.username,
+                   COALESCE(s.quiz_current, 0), COALESCE(s.quiz_longest, 0), s.quiz_last_date,
+                   COALESCE(s.study_current, 0), COALESCE(s.study_longest, 0), s.study_last_date
+            FROM users u LEFT JOIN streaks s ON s.username = u.username
+        """, {'today': str(today), 'yesterday': str(today - dt.timedelta(days=1))}).rowcount
+
+    def drift(self, examples: int = 10) -> Dict:
+        """How far users.streak / users.study_streak are from the computed values"""
+        conn = self.db.conn_u
+        users, quiz_drift, study_drift, overstated, max_drift = conn.execute("""
+            SELECT COUNT(*),
+                   COALESCE(SUM(c.quiz_current != u.streak), 0),
+                   COALESCE(SUM(c.study_current != u.study_streak), 0),
+                   COALESCE(SUM(u.streak > c.quiz_current), 0),
+                   COALESCE(MAX(ABS(u.streak - c.quiz_current)), 0)
+            FROM temp.computed_streaks c JOIN users u ON u.username = c.username
+        """).fetchone()
+        worst = conn.execute("""
+            SELECT u.username, u.streak, c.quiz_current, u.study_streak, c.study_current
+            FROM temp.computed_streaks c JOIN users u ON u.username = c.username
+            WHERE c.quiz_current != u.streak OR c.study_current != u.study_streak
+            ORDER BY ABS(u.streak - c.quiz_current) + ABS(u.study_streak - c.study_current) DESC, u.username
+            LIMIT ?
+        """, (examples,)).fetchall()
+        return {
+            'users': users,
+            'quiz_drift': quiz_drift,
+            'study_drift': study_drift,
+            'overstated': overstated,
+            'max_quiz_drift': max_drift,
+            'worst': [{'username': name, 'streak': stored, 'computed': computed,
+                       'study_streak': stored_study, 'study_computed': computed_study}
+                      for name, stored, computed, stored_study, computed_study in worst]
+        }
+
+    def repair(self, today: dt.date, dry_run: bool = False) -> Dict:
+        """Recompute, report drift and (unless dry_run) write only the rows that changed"""
+        conn = self.db.conn_u
+        started = time.perf_counter()
+        try:
+            self.compute(today)
+            report = self.drift()
+            report['users_updated'] = report['streaks_updated'] = 0
+            if not dry_run:
+                report['users_updated'] = conn.execute("""
+                    UPDATE users SET streak = c.quiz_current, study_streak = c.study_current
+                    FROM temp.computed_streaks c
+                    WHERE c.username = users.username
+                      AND (users.streak IS NOT c.quiz_current OR users.study_streak IS NOT c.study_current)
+                """).rowcount
+                report['streaks_updated'] = conn.execute("""
+                    INSERT INTO user_streaks(username, quiz_current, quiz_longest, quiz_last_date,
+                                             study_current, study_longest, study_last_date, updated_at)
+                    SELECT username, quiz_current, quiz_longest, quiz_last_date,
+                           study_current, study_longest, study_last_date, ?
+                    FROM temp.computed_streaks WHERE true
+                    ON CONFLICT(username) DO UPDATE SET
+                        quiz_current = excluded.quiz_current,
+                        quiz_longest = excluded.quiz_longest,
+                        quiz_last_date = excluded.quiz_last_date,
+                        study_current = excluded.study_current,
+                        study_longest = excluded.study_longest,
+                        study_last_date = excluded.study_last_date,
+                        updated_at = excluded.updated_at
+                    WHERE (quiz_current, quiz_longest, quiz_last_date, study_current, study_longest, study_last_date)
+                          IS NOT (excluded.quiz_current, excluded.quiz_longest, excluded.quiz_last_date,
+                                  excluded.study_current, excluded.study_longest, excluded.study_last_date)
+                """, (str(dt.datetime.now(IST)),)).rowcount
+            conn.execute("DELETE FROM temp.computed_streaks")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        report['seconds'] = round(time.perf_counter() - started, 2)
+        if report['quiz_drift'] or report['study_drift']:
+            logger.info(f"Streak drift: {report['quiz_drift']} quiz and {report['study_drift']} study streaks "
+                        f"of {report['users']} users (max quiz drift {report['max_quiz_drift']} days)")
+        return report
+
+# ---------- QUIZ LOG TIERING ----------
+class QuizLogTiering:
+    """
+    Keeps quiz_log small: rows older than horizon_days move to the attached cold tier.
+    Each date is first folded into daily_user_stats, summed over both tiers so a
+    partly moved date still adds up. Its rows then move in id batches of batch_size,
+    each in one short transaction with a pause between, so live writers get the
+    lock. WAL has no atomic commit across attached files, so a batch is copied with
+    INSERT OR IGNORE before the hot rows are deleted. A batch interrupted between
+    the two commits is healed by the next run.
+    """
+    COLUMNS = "id, username, date, quiz_type, length, correct, time_spent, accuracy, points_earned"
+
+    def __init__(self, db_manager: DatabaseManager, horizon_days: int = QUIZ_LOG_HOT_DAYS,
+                 batch_size: int = 2000, pause: float = 0.01):
+        self.db = db_manager
+        self.horizon_days = horizon_days
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def archive(self, log: Optional[Callable[[str], None]] = None) -> int:
+        """Fold and move every date older than the horizon; returns the number of rows moved"""
+        conn = self.db.conn_u
+        cutoff = str(today_ist() - dt.timedelta(days=self.horizon_days))
+        dates = [date for date, in conn.execute(
+            "SELECT DISTINCT date FROM main.quiz_log WHERE date < ? ORDER BY date", (cutoff,))]
+        moved = 0
+        for date in dates:
+            self._fold(date)
+            while True:
+                ids = [row_id for row_id, in conn.execute(
+                    "SELECT id FROM main.quiz_log WHERE date = ? ORDER BY id LIMIT ?", (date, self.batch_size))]
+                if not ids:
+                    break
+                params = (date, ids[0], ids[-1])
+                try:
+                    conn.execute(f"""
+                        INSERT OR IGNORE INTO cold.quiz_log({self.COLUMNS})
+                        SELECT {self.COLUMNS} FROM main.quiz_log WHERE date = ? AND id BETWEEN ? AND ?
+                    """, params)
+                    conn.execute("DELETE FROM main.quiz_log WHERE date = ? AND id BETWEEN ? AND ?", params)
+                    conn.commit()
+                except sqlite3.Error:
+                    conn.rollback()
+                    raise
+                moved += len(ids)
+                time.sleep(self.pause)
+            if log:
+                log(f"{date}: archived, {moved:,} rows moved so far")
+        return moved
+
+    def _fold(self, date: str):
+        """Make the rollup for `date` exact before its rows leave the hot tier"""
+        self.db.conn_u.execute("""
+            INSERT INTO daily_user_stats(username, date, quizzes, questions, correct, time_spent, points)
+            SELECT username, date, COUNT(*), SUM(length), SUM(correct), SUM(time_spent), SUM(points_earned)
+            FROM quiz_log_all
+            WHERE date = ?
+            GROUP BY username
+            ON CONFLICT(username, date) DO UPDATE SET
+                quizzes = excluded.quizzes,
+                questions = excluded.questions,
+                correct = excluded.correct,
+                time_spent = excluded.time_spent,
+                points = excluded.points
+        """, (date,))
+        self.db.conn_u.commit()
+
+    def stats(self) -> Dict:
+        conn = self.db.conn_u
+        hot, oldest = conn.execute("SELECT COUNT(*), MIN(date) FROM main.quiz_log").fetchone()
+        return {
+            'hot_rows': hot,
+            'cold_rows': conn.execute("SELECT COUNT(*) FROM cold.quiz_log").fetchone()[0],
+            'oldest_hot_date': oldest,
+            'horizon_days': self.horizon_days
+        }
+
+# ---------- BACKUPS ----------
+class BackupRestarted(Exception):
+    """Raised from the backup progress callback when writers keep restarting a stepped copy"""
+
+
+class BackupManager:
+    """
+    Online snapshots of users.db, words.db and the cold quiz_log tier through SQLite's backup API.
+    The copy runs `pages` pages per step and pauses between steps, so the app's
+    writers are never locked out for long. In WAL mode the source connection holds
+    one read transaction across all steps: every step reads the same point-in-time
+    snapshot, writers carry on in the WAL and the copy never restarts (checkpoints
+    cannot pass the snapshot until it finishes). With a rollback journal a write
+    restarts a stepped copy, so after `max_restarts` it is finished in one step.
+    Each copy passes PRAGMA integrity_check before it is gzipped as
+    <name>-<YYYYmmddTHHMMSS>.db.gz; all files of one run share the timestamp.
+    """
+    # Files every snapshot must contain; the cold quiz_log tier is included once it exists
+    REQUIRED = ('users', 'words')
+
+    def __init__(self, users_path: pathlib.Path = DB_U, words_path: pathlib.Path = DB_W,
+                 backup_dir: pathlib.Path = BACKUP_DIR, keep: int = 14, pages: int = 256,
+                 pause: float = 0.005, max_restarts: int = 3, archive_dir: pathlib.Path = ARCHIVE_DIR):
+        self.paths = {'users': pathlib.Path(users_path), 'words': pathlib.Path(words_path),
+                      'quiz_log_archive': pathlib.Path(archive_dir) / QUIZ_LOG_ARCHIVE}
+        self.backup_dir = pathlib.Path(backup_dir)
+        self.keep = keep
+        self.pages = pages
+        self.pause = pause
+        self.max_restarts = max_restarts
+
+    def backup(self, log: Optional[Callable[[str], None]] = None) -> str:
+        """Snapshot both databases; returns the snapshot timestamp"""
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        stamp = dt.datetime.now(IST).strftime("%Y%m%dT%H%M%S")
+        for name, path in self.paths.items():
+            if name not in self.REQUIRED and not path.exists():
+                continue
+            started = time.perf_counter()
+            partial = self.backup_dir / f"{name}-{stamp}.db.partial"
+            try:
+                restarts = self._copy(path, partial)
+                self._check(partial)
+                target = self.backup_dir / f"{name}-{stamp}.db.gz"
+                with open(partial, "rb") as src, gzip.open(target, "wb", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            finally:
+                partial.unlink(missing_ok=True)
+            if log:
+                log(f"{name}: {path.stat().st_size / 1e6:,.1f} MB -> {target.stat().st_size / 1e6:,.1f} MB "
+                    f"in {time.perf_counter() - started:.2f}s ({restarts} restarts)")
+        self.prune()
+        return stamp
+
+    def _copy(self, source: pathlib.Path, target: pathlib.Path) -> int:
+        restarts = 0
+        remaining_before = None
+
+        def progress(status, remaining, total):
+            nonlocal restarts, remaining_before
+            if remaining_before is not None and remaining > remaining_before:
+                restarts += 1
+                if restarts > self.max_restarts:
+                    raise BackupRestarted()
+            remaining_before = remaining
+            time.sleep(self.pause)
+
+        src = sqlite3.connect(source, isolation_level=None)
+        dst = sqlite3.connect(target)
+        try:
+            pinned = src.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            if pinned:
+                src.execute("BEGIN")
+                src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            try:
+                src.backup(dst, pages=self.pages, progress=progress)
+            except BackupRestarted:
+                logger.info(f"Backup of {source} kept restarting; finishing in one step")
+                src.backup(dst, pages=-1)
+            if pinned:
+                src.execute("COMMIT")
+        finally:
+            dst.close()
+            src.close()
+        return restarts
+
+    @staticmethod
+    def _check(path: pathlib.Path):
+        conn = sqlite3.connect(path)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            conn.close()
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"integrity_check failed for {path.name}: {result}")
+
+    def snapshots(self) -> List[Dict]:
+        """Complete snapshots, newest first"""
+        files = defaultdict(dict)
+        for path in self.backup_dir.glob("*-*.db.gz"):
+            name, stamp = path.name[:-len(".db.gz")].rsplit("-", 1)
+            if name in self.paths:
+                files[stamp][name] = path
+        return [{'stamp': stamp, 'files': found,
+                 'bytes': sum(path.stat().st_size for path in found.values())}
+                for stamp, found in sorted(files.items(), reverse=True)
+                if all(name in found for name in self.REQUIRED)]
+
+    def prune(self) -> int:
+        """Delete all but the newest `keep` snapshots"""
+        removed = 0
+        for snapshot in self.snapshots()[self.keep:]:
+            for path in snapshot['files'].values():
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def extract(self, stamp: str, workdir: pathlib.Path) -> Dict[str, pathlib.Path]:
+        """Decompress a snapshot into workdir as <name>.db files and integrity-check each"""
+        snapshot = next((snapshot for snapshot in self.snapshots() if snapshot['stamp'] == stamp), None)
+        if snapshot is None:
+            raise FileNotFoundError(f"No complete snapshot '{stamp}' in {self.backup_dir}")
+        extracted = {}
+        for name, path in snapshot['files'].items():
+            extracted[name] = workdir / f"{name}.db"
+            with gzip.open(path, "rb") as src, open(extracted[name], "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            self._check(extracted[name])
+        return extracted
+
+    def verify(self, stamp: str) -> bool:
+        """Decompress a snapshot and run integrity_check on every file"""
+        with tempfile.TemporaryDirectory() as workdir:
+            try:
+                self.extract(stamp, pathlib.Path(workdir))
+                return True
+            except sqlite3.DatabaseError as e:
+                logger.error(f"Snapshot {stamp} failed verification: {e}")
+                return False
+
+    def restore(self, stamp: str, log: Optional[Callable[[str], None]] = None):
+        """
+        Replace the live databases with a verified snapshot. The pages are written through
+        the backup API, so open connections see the restored data rather than a swapped file;
+        stop the app (or expect its in-memory caches to be stale) before restoring.
+        """
+        with tempfile.TemporaryDirectory() as workdir:
+            extracted = self.extract(stamp, pathlib.Path(workdir))
+            for name, path in extracted.items():
+                src = sqlite3.connect(path)
+                dst = sqlite3.connect(self.paths[name])
+                try:
+                    src.backup(dst, pages=self.pages)
+                finally:
+                    dst.close()
+                    src.close()
+                if log:
+                    log(f"{name}: restored from {stamp}")
+
+# ---------- HISTORY EXPORT ----------
+def _load_arrow():
+    """pyarrow is optional; only the export needs it"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError as e:
+        raise RuntimeError("Exports need pyarrow: pip install pyarrow") from e
+
+
+class HistoryExporter:
+    """
+    Stream history tables out of users.db into month-partitioned Parquet or Arrow IPC
+    files: <out_dir>/<table>/month=YYYY-MM/part-<run>.<ext>. Rows are read with keyset
+    pagination in batches of batch_size on a dedicated connection; every batch is its
+    own short read, so in WAL mode writers and checkpoints are never held up. Memory is
+    bounded by one batch plus one open writer per month touched by the run.
+    Append-only tables are exported incrementally from the watermark in
+    export_watermarks. word_user is updated in place and has no change marker, so it is
+    exported as a full snapshot (partition snapshot=YYYY-MM-DD, by month inside).
+    Files are written under a temporary name and renamed, and the watermark moves only
+    after the whole table succeeded, so a failed run can simply be repeated.
+    """
+    # table: (keyset column for incremental export, or None for a full snapshot; month column)
+    TABLES = {
+        'quiz_log': ('id', 'date'),
+        'user_achievements': ('rowid', 'date_earned'),
+        'study_sessions': ('id', 'start_time'),
+        'word_user': (None, 'date'),
+    }
+    # Tables read through a view spanning the hot and cold tiers
+    SOURCES = {'quiz_log': 'quiz_log_all'}
+    ARROW_TYPES = {'INTEGER': 'int64', 'REAL': 'float64', 'TEXT': 'string'}
+
+    def __init__(self, users_path: pathlib.Path = DB_U, out_dir: pathlib.Path = EXPORT_DIR,
+                 fmt: str = "parquet", batch_size: int = 50_000, archive_dir: pathlib.Path = ARCHIVE_DIR):
+        if fmt not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown export format '{fmt}'")
+        self.pa = _load_arrow()
+        self.users_path = users_path
+        self.out_dir = pathlib.Path(out_dir)
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.archive_dir = archive_dir
+
+    def export(self, tables: Optional[List[str]] = None, full: bool = False,
+               log: Optional[Callable[[str], None]] = None) -> Dict[str, int]:
+        """Export the given tables (default: all); full ignores the watermarks"""
+        stamp = dt.datetime.now(IST).strftime("%Y%m%dT%H%M%S")
+        conn = sqlite3.connect(self.users_path)
+        DatabaseManager.attach_quiz_log_archive(conn, self.archive_dir)
+        try:
+            exported = {}
+            for table in tables or self.TABLES:
+                if table not in self.TABLES:
+                    raise ValueError(f"Unknown export table '{table}'")
+                started = time.perf_counter()
+                exported[table] = self._export_table(conn, table, full, stamp)
+                if log:
+                    log(f"{table}: {exported[table]:,} rows in {time.perf_counter() - started:.2f}s")
+            return exported
+        finally:
+            conn.close()
+
+    def _schema(self, conn: sqlite3.Connection, table: str, key: Optional[str]):
+        pa = self.pa
+        fields = [pa.field("rowid", pa.int64())] if key == "rowid" else []
+        for _, name, declared, _, _, _ in conn.execute(f"PRAGMA table_info({table})"):
+            fields.append(pa.field(name, getattr(pa, self.ARROW_TYPES.get(declared.upper(), 'string'))()))
+        return pa.schema(fields)
+
+    def _open_writer(self, path: pathlib.Path, schema):
+        if self.fmt == "parquet":
+            return self.pa.parquet.ParquetWriter(path, schema, compression="zstd")
+        return self.pa.ipc.new_file(str(path), schema)
+
+    def _export_table(self, conn: sqlite3.Connection, table: str, full: bool, stamp: str) -> int:
+        pa = self.pa
+        key, month_column = self.TABLES[table]
+        schema = self._schema(conn, table, key)
+        columns = ", ".join(schema.names)
+        month_position = schema.names.index(month_column)
+        base = self.out_dir / table
+        if key is None:
+            base = base / f"snapshot={today_ist()}"
+        last_key = 0
+        if key and not full:
+            row = conn.execute("SELECT last_key FROM export_watermarks WHERE table_name=?", (table,)).fetchone()
+            last_key = row[0] if row else 0
+        # Snapshots page on rowid too; it is appended after the exported columns
+        source = self.SOURCES.get(table, table)
+        if key:
+            select = f"SELECT {columns} FROM {source} WHERE {key} > ? ORDER BY {key} LIMIT ?"
+            key_position = schema.names.index(key)
+        else:
+            select = f"SELECT {columns}, rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?"
+            key_position = len(schema)
+        writers = {}
+        rows_written = 0
+        try:
+            while True:
+                rows = conn.execute(select, (last_key, self.batch_size)).fetchall()
+                if not rows:
+                    break
+                last_key = rows[-1][key_position]
+                by_month = defaultdict(list)
+                for row in rows:
+                    by_month[(row[month_position] or "")[:7] or "unknown"].append(row[:len(schema)])
+                for month, month_rows in by_month.items():
+                    if month not in writers:
+                        directory = base / f"month={month}"
+                        directory.mkdir(parents=True, exist_ok=True)
+                        path = directory / f"part-{stamp}.{self.fmt}.tmp"
+                        writers[month] = (path, self._open_writer(path, schema))
+                    batch = pa.RecordBatch.from_arrays(
+                        [pa.array(column, type=field.type) for column, field in zip(zip(*month_rows), schema)],
+                        schema=schema)
+                    writers[month][1].write_batch(batch)
+                rows_written += len(rows)
+        except BaseException:
+            for path, writer in writers.values():
+                writer.close()
+                path.unlink(missing_ok=True)
+            raise
+        for path, writer in writers.values():
+            writer.close()
+        if key is None and base.exists():
+            # A repeated snapshot on the same day replaces the earlier one
+            for old in base.glob(f"month=*/part-*.{self.fmt}"):
+                old.unlink()
+        for path, _ in writers.values():
+            path.rename(path.with_suffix(""))
+        if key:
+            conn.execute("""
+                INSERT INTO export_watermarks(table_name, last_key, rows, exported_at) VALUES(?, ?, ?, ?)
+                ON CONFLICT(table_name) DO UPDATE SET last_key = excluded.last_key,
+                    rows = export_watermarks.rows + excluded.rows, exported_at = excluded.exported_at
+            """, (table, last_key, rows_written, str(dt.datetime.now(IST))))
+            conn.commit()
+        return rows_written
+
+# ---------- MAINTENANCE SCHEDULER ----------
+class MaintenanceScheduler:
+    """
+    Nightly jobs run shortly after the IST day boundary, from a daemon thread in the app
+    process or on demand from the admin CLI. The jobs use their own connections so their
+    transactions never interleave with the UI's. Every run is recorded in maintenance_runs;
+    a job that already succeeded for the day is skipped unless forced, so a missed night
+    is caught up on start and several processes can share one database.
+    """
+    JOBS = ("rollups", "streaks", "challenges", "leagues", "word_of_the_day", "tiering", "percentiles", "feed",
+            "optimize", "backup")
+
+    def __init__(self, users_path: pathlib.Path = DB_U, words_path: pathlib.Path = DB_W,
+                 clock: IstClock = CLOCK, delay: float = 60.0, vacuum_pages: int = 2000,
+                 percentiles: Optional[PercentileManager] = None, archive_dir: pathlib.Path = ARCHIVE_DIR,
+                 seed: Optional[int] = RNG_SEED):
+        self.users_path = users_path
+        self.words_path = words_path
+        self.archive_dir = archive_dir
+        # The jobs' own seeded RNG: sharing the app's from this thread would interleave its draws
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.delay = delay
+        self.vacuum_pages = vacuum_pages
+        self.backups = BackupManager(users_path, words_path, archive_dir=archive_dir)
+        # The app's live sketches, told to reload after the nightly rebuild (which uses this
+        # scheduler's own manager and connection, never the UI's)
+        self.percentiles = percentiles
+        self._managers: Optional[Dict] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+
+    def _jobs(self) -> Dict:
+        if self._managers is None:
+            db = DatabaseManager(self.users_path, self.words_path, self.archive_dir)
+            self._managers = {
+                'db': db,
+                'word': WordManager(db),
+                'gamification': GamificationManager(db, self.rng),
+                'analytics': AnalyticsManager(db),
+                'percentiles': PercentileManager(db),
+                'social': SocialManager(db),
+                'leagues': LeagueManager(db)
+            }
+        return self._managers
+
+    def run(self, jobs: Optional[List[str]] = None, force: bool = False,
+            log: Optional[Callable[[str], None]] = None) -> List[Dict]:
+        """Run the given jobs (default: all) for the current IST day and record each run"""
+        results = []
+        with self._run_lock:
+            managers = self._jobs()
+            conn = managers['db'].conn_u
+            today = self.clock.today()
+            for job in jobs or self.JOBS:
+                if job not in self.JOBS:
+                    raise ValueError(f"Unknown maintenance job '{job}'")
+                if not force and conn.execute("""
+                    SELECT 1 FROM maintenance_runs WHERE job=? AND run_date=? AND status='ok'
+                """, (job, str(today))).fetchone():
+                    continue
+                started_at = str(dt.datetime.now(IST))
+                started = time.perf_counter()
+                try:
+                    detail = getattr(self, f"_run_{job}")(managers, today)
+                    status = "ok"
+                except Exception as e:
+                    managers['db'].conn_u.rollback()
+                    managers['db'].conn_w.rollback()
+                    detail = str(e)
+                    status = "error"
+                    logger.error(f"Maintenance job '{job}' failed: {e}")
+                duration_ms = (time.perf_counter() - started) * 1000
+                conn.execute("""
+                    INSERT INTO maintenance_runs(job, run_date, started_at, duration_ms, status, detail)
+                    VALUES(?, ?, ?, ?, ?, ?)
+                """, (job, str(today), started_at, duration_ms, status, detail))
+                conn.commit()
+                result = {'job': job, 'status': status, 'duration_ms': duration_ms, 'detail': detail}
+                results.append(result)
+                if log:
+                    log(f"{job}: {status} in {duration_ms:,.0f}ms ({detail})")
+        return results
+
+    def _run_rollups(self, managers: Dict, today: dt.date) -> str:
+        # Reconcile yesterday's (now final) and today's quiz columns against quiz_log; new_known is kept
+        since = str(today - dt.timedelta(days=1))
+        return f"{managers['analytics'].reconcile_daily_stats(since)} rows reconciled since {since}"
+
+    def _run_challenges(self, managers: Dict, today: dt.date) -> str:
+        gamification = managers['gamification']
+        completed = gamification.evaluate_challenge_completions(str(today - dt.timedelta(days=1)))
+        generated = gamification.pregenerate_challenges()
+        return f"{completed} late completions, {generated} challenges generated"
+
+    def _run_streaks(self, managers: Dict, today: dt.date) -> str:
+        report = StreakRepair(managers['db']).repair(today)
+        return (f"{report['users_updated']} users repaired: {report['quiz_drift']} quiz and "
+                f"{report['study_drift']} study streaks drifted, max {report['max_quiz_drift']} days")
+
+    def _run_leagues(self, managers: Dict, today: dt.date) -> str:
+        return managers['leagues'].run(today)
+
+    def _run_word_of_the_day(self, managers: Dict, today: dt.date) -> str:
+        return f"{managers['word'].pregenerate_word_of_the_day()} days pinned"
+
+    def _run_tiering(self, managers: Dict, today: dt.date) -> str:
+        moved = QuizLogTiering(managers['db']).archive()
+        return f"{moved} quiz_log rows moved to the cold tier"
+
+    def _run_percentiles(self, managers: Dict, today: dt.date) -> str:
+        learners = managers['percentiles'].rebuild()
+        if self.percentiles:
+            self.percentiles.invalidate()
+        return f"{learners} learners in the percentile sketches"
+
+    def _run_feed(self, managers: Dict, today: dt.date) -> str:
+        feed_rows, activities = managers['social'].trim()
+        return f"{feed_rows} feed rows and {activities} activities trimmed"
+
+    def _run_optimize(self, managers: Dict, today: dt.date) -> str:
+        db = managers['db']
+        details = []
+        for name, conn in (("users", db.conn_u), ("words", db.conn_w)):
+            conn.execute("PRAGMA optimize")
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.commit()
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                # executescript steps the pragma to completion; execute() frees a single page
+                conn.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+            freed = freelist - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            details.append(f"{name}: {freed} pages freed, checkpoint {checkpointed}/{wal_pages}"
+                           + (" (busy)" if busy else ""))
+        return "; ".join(details)
+
+    def _run_backup(self, managers: Dict, today: dt.date) -> str:
+        stamp = self.backups.backup()
+        return f"snapshot {stamp}, {len(self.backups.snapshots())} kept"
+
+    def last_runs(self, limit: int = 20) -> List[Dict]:
+        rows = self._jobs()['db'].conn_u.execute("""
+            SELECT job, run_date, started_at, duration_ms, status, detail
+            FROM maintenance_runs ORDER BY id DESC LIMIT ?
+        """, (limit,)).fetchall()
+        columns = ('job', 'run_date', 'started_at', 'duration_ms', 'status', 'detail')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def start(self):
+        """Start the daemon thread: catch up now, then run after every IST midnight"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Error running maintenance: {e}")
+            self._stop.wait(self.clock.seconds_until_rollover() + self.delay)
+
+# ---------- MANAGER FACTORY ----------
+def create_managers(users_path: pathlib.Path = DB_U, words_path: pathlib.Path = DB_W,
+                    start_services: bool = True, archive_dir: pathlib.Path = ARCHIVE_DIR,
+                    seed: Optional[int] = RNG_SEED) -> Dict:
+    """
+    Build the manager graph over the given databases. start_services also pre-generates
+    challenges, backfills the daily rollup, starts the quiz pool producer, the maintenance
+    scheduler and the metrics exporters, and enables span tracing and call capture; batch
+    jobs leave it off and call only what they need. Every random choice goes through one
+    random.Random seeded with `seed` (the maintenance jobs through their own, seeded the
+    same way), so a replayed call sequence reproduces its quizzes.
+    """
+    rng = random.Random(seed)
+    db_manager = DatabaseManager(users_path, words_path, archive_dir)
+    auth_manager = AuthManager(db_manager)
+    neighbor_index = NeighborIndexManager(db_manager, rng=rng)
+    word_manager = WordManager(db_manager, neighbor_index)
+    gamification_manager = GamificationManager(db_manager, rng)
+    word_stats_manager = WordStatsManager(db_manager)
+    word_manager.vocabulary.publish(word_manager.vocab_version)
+    word_stats_manager.warm()
+    calibration_manager = CalibrationManager(db_manager, word_stats_manager, archive_dir)
+    calibration_manager.load()
+    percentile_manager = PercentileManager(db_manager)
+    percentile_manager.load()
+    quiz_manager = QuizManager(db_manager, word_manager, gamification_manager,
+                               word_stats_manager, calibration_manager, rng=rng,
+                               percentiles=percentile_manager)
+    quiz_pool = QuizPoolService(quiz_manager)
+    analytics_manager = AnalyticsManager(db_manager)
+    sr_manager = SpacedRepetitionManager(db_manager, gamification_manager)
+    social_manager = SocialManager(db_manager)
+    league_manager = LeagueManager(db_manager)
+    maintenance = MaintenanceScheduler(users_path, words_path, percentiles=percentile_manager,
+                                       archive_dir=archive_dir, seed=seed)
+    sessions = SessionStore()
+    register_cache_metrics("word_details", word_manager.detail_cache.stats)
+    register_cache_metrics("quiz_pool", quiz_pool.stats)
+    register_cache_metrics("single_flight", db_manager.reads.stats)
+    register_single_flight_metrics(db_manager.reads)
+    register_session_metrics(sessions)
+    if start_services:
+        start_metrics_exporters()
+        if TRACE_FILE:
+            configure_tracing(pathlib.Path(TRACE_FILE), TRACE_SAMPLE_RATE, TRACE_SLOW_MS)
+        if CAPTURE_DIR:
+            configure_capture(pathlib.Path(CAPTURE_DIR), today_ist)
+        gamification_manager.pregenerate_challenges()
+        quiz_pool.prime()
+        # Backfill the daily rollup for databases that predate it
+        analytics_manager.rebuild_daily_stats(only_if_empty=True)
+        maintenance.start()
+    return {
+        'db': db_manager,
+        'auth': auth_manager,
+        'word': word_manager,
+        'vocabulary': word_manager.vocabulary,
+        'quiz': quiz_manager,
+        'quiz_pool': quiz_pool,
+        'gamification': gamification_manager,
+        'analytics': analytics_manager,
+        'spaced_repetition': sr_manager,
+        'word_stats': word_stats_manager,
+        'calibration': calibration_manager,
+        'percentiles': percentile_manager,
+        'social': social_manager,
+        'leagues': league_manager,
+        'neighbors': neighbor_index,
+        'maintenance': maintenance,
+        'sessions': sessions,
+        'rng': rng
+    }
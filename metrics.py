@@ -0,0 +1,256 @@
+# metrics.py – Minimal Prometheus-style metrics registry with text exposition
+import bisect
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# A collected sample: (metric name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Holds metrics plus collector callbacks that are evaluated at scrape time"""
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[Family]]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> "_Metric":
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, key: str, collector: Callable[[], Iterable[Family]]):
+        """Add (or replace) a scrape-time callback returning metric families"""
+        with self._lock:
+            self._collectors[key] = collector
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        families: Dict[str, Family] = {}
+        for metric in metrics:
+            families[metric.name] = metric.collect()
+        for collector in collectors:
+            try:
+                for name, kind, documentation, samples in collector():
+                    if name in families:
+                        families[name][3].extend(samples)
+                    else:
+                        families[name] = (name, kind, documentation, list(samples))
+            except Exception as e:
+                logger.error(f"Error in metrics collector: {e}")
+        lines = []
+        for name, kind, documentation, samples in families.values():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                sample_name = labels.pop("__name__", name)
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> Family:
+        with self._lock:
+            return (self.name, self.kind, self.documentation,
+                    [(self._labels(key), value) for key, value in self._values.items()])
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def collect(self) -> Family:
+        with self._lock:
+            return (self.name, self.kind, self.documentation,
+                    [(self._labels(key), value) for key, value in self._values.items()])
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def collect(self) -> Family:
+        samples = []
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        for key, counts, total, count in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append(({**labels, "le": _format_value(bound), "__name__": f"{self.name}_bucket"},
+                                cumulative))
+            samples.append(({**labels, "__name__": f"{self.name}_sum"}, total))
+            samples.append(({**labels, "__name__": f"{self.name}_count"}, count))
+        return (self.name, self.kind, self.documentation, samples)
+
+
+def instrument_methods(histogram: Histogram) -> Callable[[type], type]:
+    """
+    Class decorator timing every public method into `histogram`, labelled with the
+    class and method name. Static/class methods, properties and generators are left alone.
+    """
+    def decorate(cls: type) -> type:
+        for name, attribute in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.isfunction(attribute) or inspect.isgeneratorfunction(attribute):
+                continue
+            setattr(cls, name, _timed(histogram, cls.__name__, name, attribute))
+        return cls
+    return decorate
+
+
+def _timed(histogram: Histogram, owner: str, name: str, function: Callable) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started, manager=owner, method=name)
+    return wrapper
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_started: Dict[str, object] = {}
+
+
+def serve_http(port: int, addr: str = "127.0.0.1", registry: Registry = REGISTRY) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics from a daemon thread (once per process and port)"""
+    key = f"http:{addr}:{port}"
+    if key in _started:
+        return _started[key]
+    try:
+        handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+        server = ThreadingHTTPServer((addr, port), handler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    _started[key] = server
+    logger.info(f"Serving metrics on http://{addr}:{port}/metrics")
+    return server
+
+
+def write_textfile(path: str, interval: float = 15.0, registry: Registry = REGISTRY):
+    """Periodically write the registry for node_exporter's textfile collector (atomic rename)"""
+    key = f"file:{path}"
+    if key in _started:
+        return
+
+    def loop():
+        while True:
+            try:
+                temporary = f"{path}.{os.getpid()}.tmp"
+                with open(temporary, "w", encoding="utf-8") as f:
+                    f.write(registry.render())
+                os.replace(temporary, path)
+            except OSError as e:
+                logger.error(f"Error writing metrics file {path}: {e}")
+            time.sleep(interval)
+
+    _started[key] = threading.Thread(target=loop, name="metrics-file", daemon=True)
+    _started[key].start()
@@ -0,0 +1,117 @@
+# neighbors.py – TF-IDF vectors and blocked top-k nearest neighbours for word definitions
+import re
+import numpy as np
+from array import array
+from collections import Counter
+from typing import Dict, List, Tuple
+
+TOKEN_RE = re.compile(r"[a-z]+")
+# Part-of-speech labels added by WordManager.add_word plus common function words
+STOPWORDS = frozenset("""
+    noun verb adjective adverb the and for with that which who whom this these those
+    its from into than then such not any some something someone especially usually
+    often very more most are been being
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall((text or "").lower())
+            if len(token) > 2 and token not in STOPWORDS]
+
+
+class TfidfModel:
+    """Vocabulary and IDF weights; vectors are dense float32 rows with unit L2 norm"""
+    def __init__(self, terms: Dict[str, int], idf: np.ndarray):
+        self.terms = terms
+        self.idf = idf.astype(np.float32)
+
+    @classmethod
+    def fit(cls, documents: List[str], max_features: int = 2048, min_df: int = 2) -> "TfidfModel":
+        doc_freq = Counter()
+        for document in documents:
+            doc_freq.update(set(tokenize(document)))
+        candidates = [(term, df) for term, df in doc_freq.items() if df >= min_df] or list(doc_freq.items())
+        candidates.sort(key=lambda item: (-item[1], item[0]))
+        kept = candidates[:max_features]
+        terms = {term: position for position, (term, _) in enumerate(kept)}
+        n_docs = max(len(documents), 1)
+        idf = np.array([np.log((1 + n_docs) / (1 + df)) + 1 for _, df in kept], dtype=np.float32)
+        return cls(terms, idf)
+
+    def transform(self, documents: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(documents), len(self.terms)), dtype=np.float32)
+        for row, document in enumerate(documents):
+            for term, count in Counter(tokenize(document)).items():
+                position = self.terms.get(term)
+                if position is not None:
+                    matrix[row, position] = count
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def sparse_vector(self, document: str) -> Dict[int, float]:
+        """One document's unit-norm row as {position: weight}, without a dense vocabulary-wide row"""
+        weights = {position: count * float(self.idf[position])
+                   for position, count in Counter(self.terms[term] for term in tokenize(document)
+                                                  if term in self.terms).items()}
+        norm = float(np.sqrt(sum(weight * weight for weight in weights.values())))
+        return {position: weight / norm for position, weight in weights.items()} if norm > 0 else {}
+
+
+class PostingsIndex:
+    """
+    Inverted index (term position -> rows, weights) of unit-norm TF-IDF rows, so one new
+    document is scored against every indexed row by touching only the postings of its own
+    terms. Memory is proportional to the non-zero weights, not rows x vocabulary.
+    """
+    def __init__(self, model: TfidfModel):
+        self.model = model
+        self.keys: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self._postings: Dict[int, Tuple[array, array]] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, document: str):
+        row = len(self.keys)
+        self.keys.append(key)
+        self.rows[key] = row
+        for position, weight in self.model.sparse_vector(document).items():
+            rows, weights = self._postings.setdefault(position, (array("q"), array("f")))
+            rows.append(row)
+            weights.append(weight)
+
+    def scores(self, document: str) -> np.ndarray:
+        """Cosine similarity of `document` to every indexed row, in insertion order"""
+        sims = np.zeros(len(self.keys), dtype=np.float32)
+        for position, weight in self.model.sparse_vector(document).items():
+            if position in self._postings:
+                rows, weights = self._postings[position]
+                sims[np.frombuffer(rows, dtype=np.int64)] += weight * np.frombuffer(weights, dtype=np.float32)
+        return sims
+
+
+def top_k_neighbors(vectors: np.ndarray, k: int = 10, block_size: int = 512) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cosine top-k neighbours of every row (excluding itself), computed one block of rows
+    at a time so peak memory is block_size x n similarities.
+    Returns (indices, scores), each n x k, sorted by descending score.
+    """
+    n = vectors.shape[0]
+    k = min(k, max(n - 1, 0))
+    indices = np.zeros((n, k), dtype=np.int64)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        sims = vectors[start:end] @ vectors.T
+        sims[np.arange(end - start), np.arange(start, end)] = -np.inf
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start:end] = np.take_along_axis(top, order, axis=1)
+        scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
@@ -0,0 +1,234 @@
+# tracing.py – Nested span tracing per Streamlit rerun, written to sampled, rotating JSONL
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import pathlib
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Span records go through their own logger so RotatingFileHandler does the rotation
+_trace_log = logging.getLogger("vocab.trace")
+_trace_log.propagate = False
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+# Independent of the global random module so sampling never perturbs seeded quiz generation
+_sampler = random.Random()
+_settings = {'enabled': False, 'sample_rate': 0.0, 'slow_ms': float("inf")}
+
+
+class Span:
+    """One timed region; statements counts DB calls made while this span was innermost"""
+    __slots__ = ("trace", "span_id", "parent", "name", "attrs", "start", "duration",
+                 "statements", "total_statements", "error")
+
+    def __init__(self, trace: "Trace", span_id: int, parent: Optional["Span"], name: str, attrs: Dict):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.statements = 0
+        self.total_statements = 0
+        self.error: Optional[str] = None
+
+
+class Trace:
+    """All spans of one rerun; kept in memory and written at the end only if sampled or slow"""
+    __slots__ = ("trace_id", "started_at", "sampled", "spans", "_next_id")
+
+    def __init__(self, sampled: bool):
+        self.trace_id = os.urandom(8).hex()
+        self.started_at = time.time()
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self._next_id = 0
+
+    def open(self, parent: Optional[Span], name: str, attrs: Dict) -> Span:
+        self._next_id += 1
+        span = Span(self, self._next_id, parent, name, attrs)
+        self.spans.append(span)
+        return span
+
+    def records(self) -> Iterator[Dict]:
+        root = self.spans[0]
+        for span in self.spans:
+            record = {
+                'trace': self.trace_id,
+                'span': span.span_id,
+                'parent': span.parent.span_id if span.parent else None,
+                'name': span.name,
+                'start_ms': round((span.start - root.start) * 1000, 3),
+                'ms': round(span.duration * 1000, 3),
+                'db': span.statements,
+                'db_total': span.total_statements
+            }
+            if span is root:
+                record['ts'] = round(self.started_at, 3)
+            if span.attrs:
+                record['attrs'] = span.attrs
+            if span.error:
+                record['error'] = span.error
+            yield record
+
+
+def configure_tracing(path: pathlib.Path, sample_rate: float = 0.05, slow_ms: float = 500.0,
+                      max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+    """Enable tracing; each rerun is kept with probability sample_rate, or always if slower than slow_ms"""
+    if _settings['enabled']:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                       encoding="utf-8")
+    except OSError as e:
+        logger.error(f"Error opening trace file {path}: {e}")
+        return
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _trace_log.addHandler(handler)
+    _trace_log.setLevel(logging.INFO)
+    _settings.update(enabled=True, sample_rate=sample_rate, slow_ms=slow_ms)
+    logger.info(f"Tracing {sample_rate:.0%} of reruns (and all over {slow_ms:.0f}ms) to {path}")
+
+
+@contextmanager
+def trace_rerun(name: str = "rerun", **attrs) -> Iterator[Optional[Span]]:
+    """Root span for one script run; spans opened outside a root are no-ops"""
+    if not _settings['enabled'] or _current.get() is not None:
+        yield None
+        return
+    trace = Trace(_sampler.random() < _settings['sample_rate'])
+    try:
+        with span(name, _trace=trace, **attrs) as root:
+            yield root
+    finally:
+        if trace.sampled or trace.spans[0].duration * 1000 >= _settings['slow_ms']:
+            _write(trace)
+
+
+def _write(trace: Trace):
+    try:
+        for record in trace.records():
+            _trace_log.info(json.dumps(record, default=str, ensure_ascii=False))
+    except Exception as e:
+        logger.error(f"Error writing trace: {e}")
+
+
+@contextmanager
+def span(name: str, _trace: Optional[Trace] = None, **attrs) -> Iterator[Optional[Span]]:
+    """Time a nested region of the current rerun"""
+    parent = _current.get()
+    trace = _trace or (parent.trace if parent else None)
+    if trace is None:
+        yield None
+        return
+    current = trace.open(parent, name, attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        # Streamlit's st.rerun()/st.stop() also arrive here as exceptions
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        current.total_statements += current.statements
+        if parent is not None:
+            parent.total_statements += current.total_statements
+        _current.reset(token)
+
+
+def annotate(**attrs):
+    """Attach attributes to the root span of the current rerun (e.g. the page picked in the sidebar)"""
+    current = _current.get()
+    if current is not None:
+        current.trace.spans[0].attrs.update(attrs)
+
+
+def count_statement(n: int = 1):
+    """Called by the instrumented SQLite connection for every statement it runs"""
+    current = _current.get()
+    if current is not None:
+        current.statements += n
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """Decorator opening a span around each call"""
+    def decorate(function: Callable) -> Callable:
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return function(*args, **kwargs)
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def trace_methods(cls: type) -> type:
+    """Class decorator tracing every public method as '<Class>.<method>'"""
+    for name, attribute in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(attribute) or inspect.isgeneratorfunction(attribute):
+            continue
+        setattr(cls, name, traced(f"{cls.__name__}.{name}")(attribute))
+    return cls
+
+# ---------- OFFLINE ANALYSIS ----------
+def read_spans(path: pathlib.Path) -> Iterator[Dict]:
+    """Spans from the trace file and its rotated siblings (spans.jsonl.1, ...), oldest first"""
+    files = sorted(path.parent.glob(f"{path.name}*"),
+                   key=lambda p: -int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0)
+    for file in files:
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def flame_summary(records: Iterable[Dict]) -> Dict[str, Dict]:
+    """
+    Group spans by page and call path. For every page returns the number of traced reruns,
+    their durations, and {path tuple: {calls, ms, self_ms, db}} where self_ms excludes children.
+    """
+    traces: Dict[str, List[Dict]] = defaultdict(list)
+    for record in records:
+        traces[record['trace']].append(record)
+    pages: Dict[str, Dict] = {}
+    for spans in traces.values():
+        by_id = {record['span']: record for record in spans}
+        root = next((record for record in spans if record['parent'] is None), None)
+        if root is None:
+            continue
+        page = (root.get('attrs') or {}).get('page', root['name'])
+        summary = pages.setdefault(page, {'reruns': 0, 'durations': [], 'paths': {}})
+        summary['reruns'] += 1
+        summary['durations'].append(root['ms'])
+        child_ms: Dict[int, float] = defaultdict(float)
+        for record in spans:
+            if record['parent'] in by_id:
+                child_ms[record['parent']] += record['ms']
+        for record in spans:
+            path, node = [], record
+            while node is not None:
+                path.append(node['name'])
+                node = by_id.get(node['parent'])
+            entry = summary['paths'].setdefault(tuple(reversed(path)),
+                                                {'calls': 0, 'ms': 0.0, 'self_ms': 0.0, 'db': 0})
+            entry['calls'] += 1
+            entry['ms'] += record['ms']
+            entry['self_ms'] += max(0.0, record['ms'] - child_ms[record['span']])
+            entry['db'] += record['db']
+    return pages
@@ -0,0 +1,159 @@
+# workload.py – Capture of the UI's manager calls per rerun, and their replay against a database copy
+import contextvars
+import datetime as dt
+import functools
+import inspect
+import json
+import logging
+import pathlib
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Session id of the rerun being captured; None outside a rerun and inside a captured call,
+# so only the UI's entry points are recorded, not the calls they make in turn
+_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("capture_session", default=None)
+
+
+class CaptureWriter:
+    """Appends call records to <directory>/calls-<day>.jsonl, switching files when the day changes"""
+    def __init__(self, directory: pathlib.Path, day: Callable[[], dt.date]):
+        self.directory = directory
+        self.day = day
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_day: Optional[dt.date] = None
+
+    def path(self, day: dt.date) -> pathlib.Path:
+        return self.directory / f"calls-{day}.jsonl"
+
+    def write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            day = self.day()
+            if day != self._file_day:
+                if self._file:
+                    self._file.close()
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path(day), "a", encoding="utf-8")
+                self._file_day = day
+            self._file.write(line)
+            self._file.flush()
+
+
+_writer: Optional[CaptureWriter] = None
+
+
+def configure_capture(directory: pathlib.Path, day: Callable[[], dt.date]):
+    """Start recording manager calls made inside capture_rerun()"""
+    global _writer
+    if _writer is None:
+        _writer = CaptureWriter(directory, day)
+        logger.info(f"Capturing manager calls to {directory}")
+
+
+@contextmanager
+def capture_rerun(session: str) -> Iterator[None]:
+    if _writer is None:
+        yield
+        return
+    token = _session.set(session)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def capture_methods(cls: type) -> type:
+    """
+    Class decorator recording public method calls as {manager, method, args, kwargs, ms}.
+    Classes setting capture_calls = False (credentials) are left alone.
+    """
+    if not getattr(cls, "capture_calls", True):
+        return cls
+    for name, attribute in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(attribute) or inspect.isgeneratorfunction(attribute):
+            continue
+        setattr(cls, name, _captured(cls.__name__, name, attribute))
+    return cls
+
+
+def _captured(owner: str, name: str, function: Callable) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        session = _session.get()
+        if session is None:
+            return function(*args, **kwargs)
+        record = {'t': round(time.time(), 3), 'session': session, 'manager': owner, 'method': name}
+        # Serialize before the call: some arguments (the adaptive quiz state) are mutated by it
+        try:
+            record['args'] = json.loads(json.dumps(list(args[1:])))
+            record['kwargs'] = json.loads(json.dumps(kwargs))
+        except (TypeError, ValueError):
+            record['args'] = record['kwargs'] = None
+        token = _session.set(None)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record['ms'] = round((time.perf_counter() - started) * 1000, 3)
+            _session.reset(token)
+            try:
+                _writer.write(record)
+            except Exception as e:
+                logger.error(f"Error writing captured call: {e}")
+    return wrapper
+
+# ---------- REPLAY ----------
+def read_calls(paths: Iterable[pathlib.Path]) -> Iterator[Dict]:
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def replay(calls: Iterable[Dict], targets: Dict[str, object],
+           progress: Optional[Callable[[int], None]] = None) -> Dict:
+    """
+    Re-issue captured calls back to back on `targets` (manager class name -> instance).
+    Returns wall time, per-method replay latencies and the latencies seen at capture time.
+    """
+    samples: Dict[str, List[float]] = defaultdict(list)
+    captured: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    skipped = 0
+    done = 0
+    started = time.perf_counter()
+    for call in calls:
+        target = targets.get(call.get('manager'))
+        method = getattr(target, call.get('method', ''), None) if target is not None else None
+        if method is None or call.get('args') is None:
+            skipped += 1
+            continue
+        key = f"{call['manager']}.{call['method']}"
+        begin = time.perf_counter()
+        try:
+            method(*call['args'], **call['kwargs'])
+        except Exception as e:
+            errors[key] += 1
+            logger.error(f"Error replaying {key}: {e}")
+        samples[key].append(time.perf_counter() - begin)
+        captured[key].append(call.get('ms', 0.0) / 1000)
+        done += 1
+        if progress:
+            progress(done)
+    return {
+        'calls': done,
+        'skipped': skipped,
+        'seconds': time.perf_counter() - started,
+        'samples': dict(samples),
+        'captured': dict(captured),
+        'errors': dict(errors)
+    }